@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Fallback ante un bloque rechazado: reintento fila a fila (camino
+anterior) contra bisección (ingest_common.insert_bisect).
+El cliente falso rechaza cualquier bloque que contenga una fila
+marcada como mala y cuenta idas y vueltas y partes creadas (cada
+INSERT aceptado crea una parte en MergeTree).
+
+  python bench/bench_fallback.py --rows 100000 --bad 5 --rtt-ms 2
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import ingest_common as common  # noqa: E402
+
+MALO = 1e300
+
+
+class ClienteFalso:
+    """Rechaza bloques con `fexp == MALO`; cuenta round trips y partes."""
+
+    def __init__(self):
+        self.round_trips = 0
+        self.parts = 0
+
+    def execute(self, query, data=None, columnar=False, settings=None):
+        self.round_trips += 1
+        rows = data if not columnar else list(zip(*data))
+        if any(r[0] == MALO for r in rows):
+            raise ValueError("Cannot parse fexp")
+        self.parts += 1
+
+
+def bloque(n: int, malas: int, seed: int = 3):
+    rng = np.random.default_rng(seed)
+    fexp = (rng.random(n) * 500).tolist()
+    for i in rng.choice(n, malas, replace=False):
+        fexp[i] = MALO
+    ids = list(range(n))
+    return [fexp, ids]
+
+
+def fila_a_fila(client, columns, on_failed_row):
+    # Camino anterior: un INSERT por fila del bloque rechazado
+    for values in zip(*columns):
+        try:
+            client.execute("INSERT INTO t VALUES", [values])
+        except Exception:
+            on_failed_row(list(values))
+
+
+def bisection(client, columns, on_failed_row):
+    res = common.IngestResult()
+    common.log = lambda msg: None  # sin ruido en la salida
+    common.insert_bisect(client, 'db', 't', ['fexp', 'id'], columns, 'bench', 0,
+                         on_failed_row, False, res, ValueError("bloque"))
+
+
+def medir(nombre, fn, columns, rtt_ms):
+    client, fallidas = ClienteFalso(), []
+    t0 = time.perf_counter()
+    fn(client, columns, fallidas.append)
+    cpu = time.perf_counter() - t0
+    red = client.round_trips * rtt_ms / 1000
+    print(f"  {nombre:<12} round trips={client.round_trips:>8,}  partes={client.parts:>8,}  "
+          f"fallidas={len(fallidas):>3}  cpu={cpu:7.3f}s  red≈{red:8.1f}s")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('--rows', type=int, default=100000)
+    ap.add_argument('--bad', type=int, default=5)
+    ap.add_argument('--rtt-ms', type=float, default=2.0, help="latencia por INSERT")
+    args = ap.parse_args()
+
+    columns = bloque(args.rows, args.bad)
+    print(f"bloque de {args.rows:,} filas con {args.bad} malas (red a {args.rtt_ms} ms/INSERT)")
+    medir('fila a fila', fila_a_fila, columns, args.rtt_ms)
+    medir('bisección', bisection, columns, args.rtt_ms)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Suite de throughput de la ingesta por etapas, sin ClickHouse:
+  lectura   read_csv_chunks
+  coercion  coerce_frame sobre cada trozo (solo el tiempo de coerción)
+  insercion ingest_csv completo contra un cliente que acepta todo
+  fallback  ingest_csv con un cliente que rechaza, como ClickHouse, los
+            bloques con nulos en columnas no Nullable; mide el tiempo
+            dentro de insert_bisect
+Cada etapa corre en su propio proceso: el pico de memoria (ru_maxrss)
+es de esa etapa. Con --json se guarda el resultado y con --comparar se
+muestra la variación contra una corrida anterior.
+
+  python bench/bench_ingesta.py persona --rows 500000 --sucias 0.0005 \
+      --json /tmp/bench_antes.json
+  python bench/bench_ingesta.py persona --rows 500000 --sucias 0.0005 \
+      --comparar /tmp/bench_antes.json
+"""
+import argparse
+import json
+import multiprocessing as mp
+import re
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import ingest_common as common  # noqa: E402
+from generar_enemdu import NO_NULOS, columnas, generar_csv  # noqa: E402
+
+ETAPAS = ('lectura', 'coercion', 'insercion', 'fallback')
+_COLS_RX = re.compile(r"\((.*)\)\s*VALUES")
+
+
+class ClienteGrabador:
+    """
+    Doble de clickhouse_driver.Client: cuenta idas y vueltas, bloques y
+    filas. Con `no_nulos`, rechaza un bloque si alguna de esas columnas trae
+    None (el driver lo haría al serializar una columna String).
+    """
+
+    def __init__(self, no_nulos=()):
+        self.no_nulos = set(no_nulos)
+        self.round_trips = 0
+        self.blocks = 0
+        self.rows = 0
+        self.rejected = 0
+
+    def execute(self, query, data=None, columnar=False, settings=None):
+        self.round_trips += 1
+        if data is None:
+            return []
+        if self.no_nulos:
+            names = [c.strip() for c in _COLS_RX.search(query).group(1).split(',')]
+            for name, col in zip(names, data):
+                if name in self.no_nulos and any(v is None for v in col):
+                    self.rejected += 1
+                    raise TypeError(f"Invalid None value for String column {name}")
+        self.blocks += 1
+        self.rows += len(data[0]) if data else 0
+        return []
+
+
+def _modulo(tabla: str):
+    if tabla == 'persona':
+        import ingest_persona as mod
+    else:
+        import ingest_vivienda as mod
+    return mod
+
+
+def _rss_mb() -> float:
+    # Linux reporta KB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _etapa(nombre: str, path: Path, tabla: str, chunk_rows: int, queue_depth: int) -> dict:
+    mod = _modulo(tabla)
+    common.log = lambda msg: None  # sin ruido en la salida
+    int_cols, float_cols, string_cols = columnas(tabla)
+    col_names = int_cols + float_cols + string_cols
+    base = _rss_mb()
+    out = {'rows': 0, 'failed': 0, 'round_trips': 0, 'blocks': 0}
+
+    t0 = time.perf_counter()
+    if nombre == 'lectura':
+        for df in common.read_csv_chunks(path, chunk_rows, encoding='utf-8'):
+            out['rows'] += len(df)
+        secs = time.perf_counter() - t0
+    elif nombre == 'coercion':
+        secs = 0.0
+        for df in common.read_csv_chunks(path, chunk_rows, encoding='utf-8'):
+            t = time.perf_counter()
+            mod.coerce_frame(df, col_names)
+            secs += time.perf_counter() - t
+            out['rows'] += len(df)
+    else:
+        client = ClienteGrabador(NO_NULOS[tabla] if nombre == 'fallback' else ())
+        en_bisect = [0.0, 0]
+        original = common.insert_bisect
+
+        def cronometrado(*a, **kw):
+            # Solo la llamada externa: la recursión no suma dos veces
+            en_bisect[1] += 1
+            t = time.perf_counter()
+            try:
+                return original(*a, **kw)
+            finally:
+                en_bisect[1] -= 1
+                if en_bisect[1] == 0:
+                    en_bisect[0] += time.perf_counter() - t
+
+        common.insert_bisect = cronometrado
+        res = common.ingest_csv(
+            client, path, 'bench', f"enemdu_{tabla}", col_names,
+            coerce=lambda df: mod.coerce_frame(df, col_names),
+            on_failed_row=lambda values: None,
+            chunk_rows=chunk_rows, queue_depth=queue_depth, encoding='utf-8',
+        )
+        secs = time.perf_counter() - t0
+        out.update(rows=res.ok + res.failed, failed=res.failed,
+                   round_trips=client.round_trips, blocks=client.blocks)
+        if nombre == 'fallback':
+            out['secs_fallback'] = en_bisect[0]
+            out['rejected'] = client.rejected
+
+    out['secs'] = secs
+    out['rows_s'] = out['rows'] / secs if secs else 0.0
+    out['peak_mb'] = _rss_mb()
+    out['delta_mb'] = out['peak_mb'] - base
+    return out
+
+
+def _hijo(q, *args):
+    try:
+        q.put(_etapa(*args))
+    except BaseException as e:  # se informa en el padre
+        q.put({'error': repr(e)})
+
+
+def correr(nombre: str, *args) -> dict:
+    ctx = mp.get_context('fork')
+    q = ctx.Queue()
+    p = ctx.Process(target=_hijo, args=(q, nombre) + args)
+    p.start()
+    out = q.get()
+    p.join()
+    return out
+
+
+def _variacion(actual: float, previo: float) -> str:
+    if not previo:
+        return ''
+    return f" ({(actual - previo) * 100 / previo:+.1f}%)"
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('tabla', choices=['persona', 'vivienda'])
+    ap.add_argument('--rows', type=int, default=100000)
+    ap.add_argument('--sucias', type=float, default=0.0005, help="fracción de celdas sucias")
+    ap.add_argument('--archivo', type=Path, help="CSV existente (si no, se genera uno)")
+    ap.add_argument('--chunk-rows', type=int, default=common.CHUNK_ROWS)
+    ap.add_argument('--queue-depth', type=int, default=common.QUEUE_DEPTH)
+    ap.add_argument('--etapas', default=','.join(ETAPAS))
+    ap.add_argument('--json', type=Path, help="guarda el resultado")
+    ap.add_argument('--comparar', type=Path, help="resultado de una corrida anterior")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.archivo
+        if path is None:
+            path = Path(tmp) / f"bench_{args.tabla}.csv"
+            t0 = time.perf_counter()
+            generar_csv(path, args.tabla, args.rows, args.sucias)
+            print(f"CSV sintético: {args.rows:,} filas, {path.stat().st_size / 1e6:,.1f} MB "
+                  f"({time.perf_counter() - t0:.1f}s)")
+
+        previo = json.loads(args.comparar.read_text())['etapas'] if args.comparar else {}
+        resultado = {
+            'tabla': args.tabla, 'rows': args.rows, 'sucias': args.sucias,
+            'chunk_rows': args.chunk_rows, 'queue_depth': args.queue_depth,
+            'bytes': path.stat().st_size, 'etapas': {},
+        }
+        print(f"{'etapa':<10} {'filas/s':>12} {'segundos':>9} {'pico MB':>9} {'Δ MB':>8} "
+              f"{'round trips':>12} {'fallidas':>9}")
+        for nombre in args.etapas.split(','):
+            r = correr(nombre, path, args.tabla, args.chunk_rows, args.queue_depth)
+            resultado['etapas'][nombre] = r
+            if 'error' in r:
+                print(f"{nombre:<10} ERROR {r['error']}")
+                continue
+            p = previo.get(nombre, {})
+            print(f"{nombre:<10} {r['rows_s']:>12,.0f} {r['secs']:>9.2f} {r['peak_mb']:>9.0f} "
+                  f"{r['delta_mb']:>8.0f} {r['round_trips']:>12,} {r['failed']:>9,}"
+                  f"{_variacion(r['rows_s'], p.get('rows_s'))}")
+            if nombre == 'fallback':
+                print(f"{'':<10} {r['rejected']} bloques rechazados, "
+                      f"{r['secs_fallback']:.2f}s en bisección")
+
+    if args.json:
+        args.json.write_text(json.dumps(resultado, indent=2))
+        print(f"→ {args.json}")
+
+
+if __name__ == '__main__':
+    main()
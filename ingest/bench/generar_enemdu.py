@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Generador de CSVs sintéticos de ENEMDU (persona o vivienda) con
+las columnas reales de los cargadores: delimitador ';', coma
+decimal, ~5 % de vacíos y una fracción configurable de valores
+sucios (texto en enteros, decimales mal formados, `periodo` o
+`ciudad` vacíos, que ClickHouse rechaza). Escribe por trozos,
+así que sirve igual para 10 mil que para varios millones de filas.
+
+  python bench/generar_enemdu.py persona --rows 1000000 --sucias 0.001 \
+      --out /tmp/2023_12_enemdu_persona.csv
+
+`paridad` genera el fixture chico de persona que usa
+`calcular_indicadores.py --paridad` (fixtures/paridad_persona.csv):
+valores con sentido para los indicadores, pocas ciudades, `secemp`
+vacío en parte de las filas e ingresos 999999 (sin dato).
+
+  python bench/generar_enemdu.py paridad --rows 400 --seed 16 \
+      --out fixtures/paridad_persona.csv
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Valores sucios por tipo de columna (los vacíos de texto los rechaza ClickHouse
+# solo en columnas no Nullable, ver NO_NULOS)
+SUCIOS_INT    = np.array(['abc', '1,5', '12.0', 'N/D', '--', '9 9'], dtype=object)
+SUCIOS_FLOAT  = np.array(['x', '1.2.3', 'n/d', '12,5,1', '--'], dtype=object)
+SUCIOS_STRING = np.array(['', ' '], dtype=object)
+VACIOS        = 0.05
+GEN_CHUNK     = 100000
+
+# Columnas String (no Nullable) en create_table.sql
+NO_NULOS = {
+    'persona':  {'ciudad', 'periodo'},
+    'vivienda': {'periodo'},
+}
+
+
+def columnas(tabla: str):
+    """(int_cols, float_cols, string_cols) del cargador de `tabla`."""
+    if tabla == 'persona':
+        import ingest_persona as mod
+    else:
+        import ingest_vivienda as mod
+    return sorted(mod.INT_COLS), sorted(mod.FLOAT_COLS), sorted(mod.STRING_COLS)
+
+
+def _ensuciar(rng, vals: np.ndarray, sucias: float, pool: np.ndarray):
+    if sucias > 0:
+        m = rng.random(len(vals)) < sucias
+        if m.any():
+            vals[m] = rng.choice(pool, int(m.sum()))
+    return vals
+
+
+def trozo(tabla: str, n: int, rng, sucias: float, periodo: str) -> pd.DataFrame:
+    """`n` filas de texto, como las deja el INEC (antes de read_csv)."""
+    int_cols, float_cols, string_cols = columnas(tabla)
+    data = {}
+    for col in int_cols:
+        if col.startswith('id_') or col == 'upm':
+            # Identificadores largos (Int128 en destino)
+            vals = (rng.integers(10**11, 10**12, n).astype(str).astype(object)
+                    + rng.integers(10**6, 10**7, n).astype(str).astype(object))
+        else:
+            vals = rng.integers(0, 100, n).astype(str).astype(object)
+        vals[rng.random(n) < VACIOS] = ''
+        data[col] = _ensuciar(rng, vals, sucias, SUCIOS_INT)
+    for col in float_cols:
+        vals = np.char.replace(np.round(rng.random(n) * 1000, 4).astype(str), '.', ',').astype(object)
+        vals[rng.random(n) < VACIOS] = ''
+        data[col] = _ensuciar(rng, vals, sucias, SUCIOS_FLOAT)
+    for col in string_cols:
+        if col == 'periodo':
+            vals = np.full(n, periodo, dtype=object)
+        elif col == 'ciudad':
+            # Sin ceros a la izquierda, como en algunas bases del INEC
+            vals = rng.integers(10150, 240150, n).astype(str).astype(object)
+        else:
+            vals = rng.integers(1, 9, n).astype(str).astype(object)
+            vals[rng.random(n) < VACIOS] = ''
+        if col in NO_NULOS[tabla]:
+            vals = _ensuciar(rng, vals, sucias, SUCIOS_STRING)
+        data[col] = vals
+    return pd.DataFrame(data)
+
+
+def _texto(rng, vals: np.ndarray, vacios: float) -> np.ndarray:
+    vals = vals.astype(str).astype(object)
+    vals[rng.random(len(vals)) < vacios] = ''
+    return vals
+
+
+def fixture_paridad(n: int, rng, periodo: str = '202312') -> pd.DataFrame:
+    """
+    Persona con códigos en los rangos de ENEMDU sobre las columnas que leen
+    los indicadores, para comparar el SQL del modo servidor con pandas.
+    """
+    df = trozo('persona', n, rng, 0.0, periodo)
+    entero = lambda lo, hi, vacios=0.0: _texto(rng, rng.integers(lo, hi + 1, n), vacios)
+    # Cuatro ciudades; una sin cero a la izquierda, como en algunas bases
+    df['ciudad'] = rng.choice(np.array(['170150', '90150', '010150', '230150'], dtype=object), n)
+    df['area'] = entero(1, 2)
+    df['p02'] = entero(1, 2)
+    df['p03'] = entero(0, 95, 0.01)
+    df['condact'] = entero(0, 9, 0.03)
+    df['p07'] = entero(1, 2, 0.2)
+    df['p24'] = entero(0, 60, 0.3)
+    df['rama1'] = entero(1, 21, 0.3)
+    df['nnivins'] = entero(1, 10, 0.02)
+    # secemp falta en parte de las filas (→ 4); sin la columna entera,
+    # paridad() prueba compute_sector con p47a, p49 y p42
+    df['secemp'] = entero(1, 4, 0.1)
+    df['p47a'] = entero(1, 2, 0.1)
+    df['p49'] = entero(1, 2, 0.1)
+    df['p42'] = entero(1, 10, 0.1)
+    fexp = np.round(rng.uniform(20, 900, n), 4)
+    df['fexp'] = np.char.replace(fexp.astype(str), '.', ',').astype(object)
+    ingreso = np.round(rng.lognormal(6, 0.8, n), 2)
+    ingrl = np.char.replace(ingreso.astype(str), '.', ',').astype(object)
+    u = rng.random(n)
+    ingrl[u < 0.3] = ''
+    ingrl[(u >= 0.3) & (u < 0.35)] = '0'
+    ingrl[(u >= 0.35) & (u < 0.40)] = '999999'
+    ingrl[(u >= 0.40) & (u < 0.42)] = '1200000'
+    df['ingrl'] = ingrl
+    return df
+
+
+def generar_paridad(path: Path, rows: int = 400, seed: int = 16, periodo: str = '202312') -> Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open('w', encoding='utf-8', newline='') as f:
+        fixture_paridad(rows, np.random.default_rng(seed), periodo).to_csv(f, sep=';', index=False)
+    return path
+
+
+def generar_csv(path: Path, tabla: str, rows: int, sucias: float = 0.0,
+                seed: int = 11, periodo: str = '202312') -> Path:
+    rng = np.random.default_rng(seed)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open('w', encoding='utf-8', newline='') as f:
+        hechas = 0
+        while hechas < rows:
+            n = min(GEN_CHUNK, rows - hechas)
+            trozo(tabla, n, rng, sucias, periodo).to_csv(f, sep=';', index=False, header=hechas == 0)
+            hechas += n
+    return path
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('tabla', choices=['persona', 'vivienda', 'paridad'])
+    ap.add_argument('--rows', type=int, default=10000)
+    ap.add_argument('--sucias', type=float, default=0.0, help="fracción de celdas sucias")
+    ap.add_argument('--seed', type=int, default=11)
+    ap.add_argument('--periodo', default='202312')
+    ap.add_argument('--out', type=Path, required=True)
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    if args.tabla == 'paridad':
+        generar_paridad(args.out, args.rows, args.seed, args.periodo)
+    else:
+        generar_csv(args.out, args.tabla, args.rows, args.sucias, args.seed, args.periodo)
+    mb = args.out.stat().st_size / 1e6
+    print(f"{args.out}: {args.rows:,} filas, {mb:,.1f} MB en {time.perf_counter() - t0:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
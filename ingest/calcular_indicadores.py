@@ -4,30 +4,202 @@
 # ClickHouse (nacional + por ciudad)
 # =========================================================
 from pathlib import Path
-import re, warnings, csv
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import hashlib, json, os, re, shutil, warnings, csv
 import pandas as pd
 import numpy as np
 
 # ---------- rutas ----------
 ROOT    = Path("/data/enemdu_persona/processed")
 OUT_DIR = Path("/data/resultados")
-OUT_DIR.mkdir(parents=True, exist_ok=True)
+# Persona sintética para --paridad (bench/generar_enemdu.py paridad)
+FIXTURE_PARIDAD = Path(__file__).resolve().parent / "fixtures" / "paridad_persona.csv"
 
 # ---------- constantes ----------
 MONTH = {f"{m:02}": n for m, n in enumerate(
     ["Enero","Febrero","Marzo","Abril","Mayo","Junio",
      "Julio","Agosto","Septiembre","Octubre","Noviembre","Diciembre"], 1)}
 
+# Caché de resultados por archivo, bajo OUT_DIR
+CACHE_SUBDIR = "cache_indicadores"
+
+# Modo --servidor: las sumas se calculan en ClickHouse sobre enemdu_persona
+CH_HOST     = os.getenv("CH_HOST", "clickhouse")
+CH_PORT     = int(os.getenv("CH_PORT", 9000))
+CH_USER     = os.getenv("CH_USER", "admin")
+CH_PASSWORD = os.getenv("CH_PASSWORD", "secret_pw")
+CH_DATABASE = os.getenv("CH_DATABASE", "indicadores")
+CH_TABLE    = os.getenv("CH_TABLE", "enemdu_persona")
+
+# Cubo de sumas ponderadas: claves de agrupación (vacío = sin cubo)
+CUBO_CLAVES  = [c for c in os.getenv("CUBO_CLAVES", "ciudad,area,sexo,grupo_edad").split(",") if c]
+CUBO_ARCHIVO = "indicadores_cubo.parquet"
+
+# Bootstrap de Rao-Wu: réplicas (0 = sin errores estándar), réplicas por
+# bloque (acota la memoria) y semilla
+BOOT_REPLICAS = int(os.getenv("BOOT_REPLICAS", 0))
+BOOT_BLOQUE   = int(os.getenv("BOOT_BLOQUE", 50))
+BOOT_SEMILLA  = int(os.getenv("BOOT_SEMILLA", 2024))
+Z_95          = 1.959964
+
+# Procesos para recorrer los archivos (1 = en el mismo proceso)
+CALC_WORKERS = int(os.getenv("CALC_WORKERS", os.cpu_count() or 1))
+
 YEAR_RX = re.compile(r"(\d{4})\D?(\d{2})")
 _safe_pct = lambda n,d: (n*100/d).round(2) if d>0 else np.nan
 
-# Configuración de lectura de CSV
-CSV_READ_KW = dict(encoding="latin1", low_memory=False)
+# Configuración de lectura de CSV: solo la cabecera decide qué columnas se leen
+CSV_HEAD_BYTES = 64 * 1024
+CSV_ENCODING   = "latin1"
+try:
+    import pyarrow  # noqa: F401
+    CSV_ENGINE = "pyarrow"
+except ImportError:
+    CSV_ENGINE = "c"
+
+# Prefijos de todas las columnas que `indicadores` puede pedir con pick();
+# del CSV o del Parquet de staging solo se leen esas
+COLUMNAS_USADAS = ("p03","edad","p02","sexo","condact","fexp","peso","factor_expansion",
+                   "ingrl","p07","asiste","horas","p24","rama1","ramacciu",
+                   "ciudad","ciuc","secemp","p47a","p49","p42","area","nnivins",
+                   "upm","estrato")
+# Quedan como categorías de texto (alias de estudio, rama, ciudad y la UPM,
+# que no entra en un entero chico); el ingreso pasa a float64, el peso a
+# float32 si no pierde decimales y el resto a enteros Int8/Int16/Int32 con
+# nulos (<NA> = vacío)
+COLUMNAS_TEXTO   = ("p07","asiste","rama1","ramacciu","ciudad","ciuc","upm")
+COLUMNAS_DECIMAL = ("fexp","peso","factor_expansion","ingrl")
 
 # ---------- utilidades ----------
+def leer_cabecera(path):
+    """(delimitador, nombres de columna) leyendo solo el inicio del archivo."""
+    with open(path, "rb") as f:
+        head = f.read(CSV_HEAD_BYTES).decode(CSV_ENCODING, errors="ignore")
+    sample = head.splitlines()[:3]
+    delim = csv.Sniffer().sniff("\n".join(sample), delimiters=";,").delimiter
+    return delim, next(csv.reader(sample[:1], delimiter=delim))
+
 def detect_delim(path):
-    sample = path.read_text(encoding="latin1", errors="ignore").splitlines()[:3]
-    return csv.Sniffer().sniff("\n".join(sample), delimiters=";,").delimiter
+    return leer_cabecera(path)[0]
+
+def decimal_float32(x32):
+    """
+    float32 → float64 con el decimal más corto que vuelve al mismo float32
+    (lo que da su repr), sin pasar por texto: prueba 0, 1, … decimales.
+    """
+    x32 = np.asarray(x32, dtype="float32")
+    x64 = x32.astype("float64")
+    out = x64.copy()
+    pendiente = np.isfinite(x64)
+    for d in range(16):
+        if not pendiente.any():
+            break
+        cand = np.round(x64[pendiente], d)
+        ok = cand.astype("float32") == x32[pendiente]
+        idx = np.flatnonzero(pendiente)[ok]
+        out[idx] = cand[ok]
+        pendiente[idx] = False
+    return out
+
+def num_peso(col):
+    """Factor de expansión: coma decimal y sin signo, como lo deja el INEC."""
+    if pd.api.types.is_numeric_dtype(col):
+        if col.dtype == "float32":
+            # Peso compacto (ver `peso_compacto`): vuelve al decimal original
+            col = pd.Series(decimal_float32(col.to_numpy()), index=col.index, name=col.name)
+        x = col.astype(float).abs()
+        return x.where(np.isfinite(x))
+    return (col.astype(str)
+               .str.replace(",",".",regex=False)
+               .str.extract(r"([\d\.]+)")[0]
+               .astype(float))
+
+def num_ingreso(col):
+    if pd.api.types.is_numeric_dtype(col):
+        return col.astype(float)
+    return pd.to_numeric(col.astype(str).str.replace(",",".",regex=False), errors="coerce")
+
+def codigo(col):
+    """Código numérico para comparar: float32 con NaN, venga como venga la columna."""
+    return pd.to_numeric(col, errors="coerce").astype("float32")
+
+def entero_compacto(x):
+    """El entero con nulos más chico que contiene a `x`; float32 si trae decimales."""
+    vals = x.to_numpy(dtype="float64", na_value=np.nan)
+    vals = vals[~np.isnan(vals)]
+    if len(vals) and not np.array_equal(vals, np.round(vals)):
+        return x.astype("float32")
+    lo, hi = (vals.min(), vals.max()) if len(vals) else (0, 0)
+    for tipo, info in (("Int8", np.iinfo(np.int8)), ("Int16", np.iinfo(np.int16)),
+                       ("Int32", np.iinfo(np.int32))):
+        if info.min <= lo and hi <= info.max:
+            return x.astype(tipo)
+    return x.astype("Int64")
+
+def peso_compacto(x):
+    """float32 solo si cada peso vuelve a su mismo decimal (ver `num_peso`)."""
+    x32 = x.astype("float32")
+    vuelta = decimal_float32(x32.to_numpy())
+    return x32 if np.array_equal(vuelta, x.to_numpy(dtype="float64"), equal_nan=True) else x
+
+def compactar(df):
+    """Códigos a enteros chicos, texto a categoría y decimales a float."""
+    for c in df.columns:
+        low = c.strip().lower()
+        if low.startswith(COLUMNAS_TEXTO):
+            df[c] = df[c].astype("category")
+        elif low.startswith("ingrl"):
+            df[c] = num_ingreso(df[c])
+        elif low.startswith(COLUMNAS_DECIMAL):
+            df[c] = peso_compacto(num_peso(df[c]))
+        else:
+            df[c] = entero_compacto(pd.to_numeric(df[c], errors="coerce"))
+    return df
+
+def tipo_arrow(low):
+    import pyarrow as pa
+    if low.startswith(COLUMNAS_TEXTO):
+        return pa.string()
+    return pa.float64() if low.startswith(COLUMNAS_DECIMAL) else pa.float32()
+
+def leer_csv_arrow(path, delim, usadas, decimal):
+    """Lectura tipada con pyarrow; falla (ArrowInvalid) si alguna celda no encaja."""
+    import pyarrow.csv as pv
+    tabla = pv.read_csv(
+        path,
+        read_options=pv.ReadOptions(encoding=CSV_ENCODING),
+        parse_options=pv.ParseOptions(delimiter=delim),
+        convert_options=pv.ConvertOptions(
+            include_columns=usadas, decimal_point=decimal, strings_can_be_null=True,
+            column_types={c: tipo_arrow(c.strip().lower()) for c in usadas}),
+    )
+    return compactar(tabla.to_pandas())
+
+def leer_csv(path):
+    delim, nombres = leer_cabecera(path)
+    usadas = [c for c in nombres if c.strip().lower().startswith(COLUMNAS_USADAS)]
+    if CSV_ENGINE == "pyarrow":
+        import pyarrow as pa
+        # Con ';' el INEC usa coma decimal
+        try:
+            return leer_csv_arrow(path, delim, usadas, "," if delim == ";" else ".")
+        except pa.ArrowInvalid:
+            pass  # celdas sucias: se leen como texto y se limpian abajo
+    df = pd.read_csv(path, sep=delim, usecols=usadas, dtype=str,
+                     encoding=CSV_ENCODING, low_memory=False)
+    return compactar(df)
+
+def leer_parquet(path):
+    import pyarrow.parquet as pq
+    nombres = pq.ParquetFile(path).schema_arrow.names
+    usadas = [c for c in nombres if c.strip().lower().startswith(COLUMNAS_USADAS)]
+    return compactar(pq.read_table(path, columns=usadas).to_pandas())
+
+def leer_archivo(path):
+    if path.suffix.lower() == ".parquet":
+        return leer_parquet(path)
+    return leer_csv(path)
 
 def pick(cols_lower, cands):
     for c in cands:
@@ -39,11 +211,15 @@ def pick(cols_lower, cands):
 
 # Vectorización de `_secemp`
 def compute_sector(df, size_col, ruc_col, dom_col):
-    s = pd.to_numeric(df[size_col], errors="coerce")
-    r = pd.to_numeric(df[ruc_col], errors="coerce")
-    d = pd.to_numeric(df[dom_col], errors="coerce")
+    return sector_desde(df[size_col], df[ruc_col], df[dom_col])
+
+def sector_desde(size, ruc, dom):
+    """`compute_sector` sobre las tres columnas sueltas (p47a, p49, p42)."""
+    s = codigo(size)
+    r = codigo(ruc)
+    d = codigo(dom)
     # Precrea serie con default=4
-    sec = pd.Series(4, index=df.index)
+    sec = pd.Series(4, index=size.index)
     sec[d==10] = 3
     mask_size2 = (s==2)
     sec[mask_size2] = 1
@@ -53,6 +229,40 @@ def compute_sector(df, size_col, ruc_col, dom_col):
     sec[mask_size1_r0] = 2
     return sec.astype(int)
 
+# Comparan por código y por texto: no dependen de si la columna se leyó como
+# número o como texto (antes "3.0" != "3" si la columna traía vacíos)
+def no_estudia(codigo, col):
+    texto = col.astype(str).str.strip().str.lower()
+    return ((codigo == 2) | (codigo == 0) | texto.isin({"no","0","n","ninguno"})).fillna(False)
+
+def es_manufactura(col):
+    codigo = pd.to_numeric(col, errors="coerce")
+    return ((codigo == 3) | (col.astype(str).str.strip() == "3")).fillna(False)
+
+def con_datos(df, cols, nombres):
+    """
+    Columna opcional (secemp, p07, rama1…) solo si trae algún valor: una
+    columna presente pero vacía cuenta como ausente, igual que en el modo
+    servidor (countIf(x IS NOT NULL) > 0 por periodo).
+    """
+    c = next((cols[k] for k in nombres if k in cols), None)
+    if c is None:
+        return None
+    col = df[c]
+    if pd.api.types.is_numeric_dtype(col):
+        hay = col.notna().any()
+    else:
+        hay = col.dropna().astype(str).str.strip().ne("").any()
+    return c if hay else None
+
+def clave_ciudad(col):
+    """Código de ciudad de 6 dígitos como texto (NaN si falta)."""
+    if pd.api.types.is_numeric_dtype(col):
+        x = col.astype(float)
+        col = x.fillna(0).astype("int64").astype(str).where(x.notna())
+    t = col.astype(str).str.strip()
+    return t.where(col.notna() & (t != "")).str.zfill(6)
+
 def indicadores(df_orig):
     # Lowercase cols y detect cols clave
     df = df_orig.rename(columns=lambda c: c.strip().lower())
@@ -63,151 +273,907 @@ def indicadores(df_orig):
     peso_col = pick(cols, ["fexp","peso","factor_expansion","peso_2020"])
     ingreso_col = pick(cols, ["ingrl"])
     # opcionales
-    estud_col = pick(cols, ["p07","asiste"],) if any(k in cols for k in ["p07","asiste"]) else None
+    estud_col = con_datos(df, cols, ["p07","asiste"])
     horas_col = pick(cols, ["horas","p24"])        if any(k in cols for k in ["horas","p24"]) else None
-    act1_col  = pick(cols, ["rama1","ramacciu"])  if any(k in cols for k in ["rama1","ramacciu"]) else None
+    act1_col  = con_datos(df, cols, ["rama1","ramacciu"])
     city_col  = pick(cols, ["ciudad","ciuc"])     if any(k in cols for k in ["ciudad","ciuc"]) else None
 
-    # Casting y limpieza
-    df[edad_col] = pd.to_numeric(df[edad_col], errors="coerce")
-    df[sexo_col] = pd.to_numeric(df[sexo_col], errors="coerce")
-    df[stat_col] = pd.to_numeric(df[stat_col], errors="coerce")
-    df[peso_col] = (df[peso_col].astype(str)
-                        .str.replace(",",".",False)
-                        .str.extract(r"([\d\.]+)")[0]
-                        .astype(float))
-    df[ingreso_col] = pd.to_numeric(df[ingreso_col], errors="coerce")
-    df.loc[df[ingreso_col]>=999999, ingreso_col] = np.nan
-    df.loc[df[ingreso_col]<=0,      ingreso_col] = np.nan
-    if estud_col:
-        df["_estu_cod"] = pd.to_numeric(df[estud_col], errors="coerce")
-    if horas_col:
-        df[horas_col] = pd.to_numeric(df[horas_col], errors="coerce")
+    # Casting y limpieza en series aparte: el frame no se copia ni se castea
+    edad = codigo(df[edad_col])
+    sexo = codigo(df[sexo_col])
+    stat = codigo(df[stat_col])
+    peso = num_peso(df[peso_col])
+    # Coma decimal, igual que el peso (en CSV llega como texto "637,67")
+    ingreso = num_ingreso(df[ingreso_col])
+    ingreso = ingreso.where((ingreso < 999999) & (ingreso > 0))
 
-    # Máscaras
-    pet_m  = (df[edad_col]>=15) & (df[peso_col]>0)
-    pea_m  = pet_m & df[stat_col].between(1,8)
-    occ_m  = pea_m & df[stat_col].between(1,6)
+    # Máscaras: pet, pea y ocupados son filtros sobre el mismo frame
+    pet_m  = (edad>=15) & (peso>0)
+    pea_m  = pet_m & stat.between(1,8)
+    occ_m  = pea_m & stat.between(1,6)
 
-    pet  = df[pet_m]
-    pea  = df[pea_m]
-    ocup = df[occ_m].copy()
-
-    # Sector empleo
-    if "secemp" in df.columns:
-        sec_col = pick(cols, ["secemp"])
-        ocup["_s"] = pd.to_numeric(ocup[sec_col], errors="coerce").fillna(4).astype(int)
+    # Sector empleo (fila a fila; solo cuenta donde occ_m)
+    secemp_col = con_datos(df, cols, ["secemp"])
+    if secemp_col:
+        sec = codigo(df[secemp_col]).fillna(4).astype(int)
     else:
         size_col = pick(cols, ["p47a"])
         ruc_col  = pick(cols, ["p49"])
         dom_col  = pick(cols, ["p42"])
-        ocup["_s"] = compute_sector(ocup, size_col, ruc_col, dom_col)
+        sec = compute_sector(df, size_col, ruc_col, dom_col)
 
     # Pesos totales
-    Wpop = df[peso_col].sum()
-    Wpet = pet[peso_col].sum()
-    Wpea = pea[peso_col].sum()
-    Wocc = ocup[peso_col].sum()
+    suma = lambda mask: peso[mask].sum()
+    Wpop = peso.sum()
+    Wpet = suma(pet_m)
+    Wpea = suma(pea_m)
+    Wocc = suma(occ_m)
 
     # Agregados por máscara
-    suma = lambda mask: (ocup.loc[mask, peso_col].sum())
-    formal_w   = suma(ocup["_s"]==1)
-    informal_w = suma(ocup["_s"]==2)
+    formal_w   = suma(occ_m & (sec==1))
+    informal_w = suma(occ_m & (sec==2))
 
     # Diccionario de resultados
     out = {
         "TPG (%)":          _safe_pct(Wpea, Wpet),
         "TPB (%)":          _safe_pct(Wpea, Wpop),
-        "TD (%)":           _safe_pct(pea.loc[pea[stat_col].isin([7,8]), peso_col].sum(), Wpea),
+        "TD (%)":           _safe_pct(suma(pea_m & stat.isin([7,8])), Wpea),
         "Empleo Total (%)": _safe_pct(Wocc, Wpea),
         "Formal (%)":       _safe_pct(formal_w, Wocc),
         "Informal (%)":     _safe_pct(informal_w, Wocc),
-        "Adecuado (%)":     _safe_pct(suma(ocup[stat_col]==1), Wpea),
-        "Subempleo (%)":    _safe_pct(suma(ocup[stat_col].isin([2,3])), Wpea),
-        "No Remun. (%)":    _safe_pct(suma(ocup[stat_col]==5), Wpea),
-        "Otro No Pleno (%)":_safe_pct(suma(ocup[stat_col]==4), Wpea),
+        "Adecuado (%)":     _safe_pct(suma(occ_m & (stat==1)), Wpea),
+        "Subempleo (%)":    _safe_pct(suma(occ_m & stat.isin([2,3])), Wpea),
+        "No Remun. (%)":    _safe_pct(suma(occ_m & (stat==5)), Wpea),
+        "Otro No Pleno (%)":_safe_pct(suma(occ_m & (stat==4)), Wpea),
     }
 
         # --- Brecha Adecuado H-M (%)
-    pea_h = pea.loc[pea[sexo_col] == 1, peso_col].sum()
-    pea_m = pea.loc[pea[sexo_col] == 2, peso_col].sum()
-    ade_h = ocup.loc[(ocup[sexo_col] == 1) & (ocup[stat_col] == 1), peso_col].sum()
-    ade_m = ocup.loc[(ocup[sexo_col] == 2) & (ocup[stat_col] == 1), peso_col].sum()
-    if pea_h > 0 and pea_m > 0:
-        brecha_ade = (ade_h / pea_h) - (ade_m / pea_m)
+    pea_h = suma(pea_m & (sexo == 1))
+    pea_mu = suma(pea_m & (sexo == 2))
+    ade_h = suma(occ_m & (sexo == 1) & (stat == 1))
+    ade_m = suma(occ_m & (sexo == 2) & (stat == 1))
+    if pea_h > 0 and pea_mu > 0:
+        brecha_ade = (ade_h / pea_h) - (ade_m / pea_mu)
         out["Brecha Adecuado H-M (%)"] = _safe_pct(brecha_ade, ade_h / pea_h)
     else:
         out["Brecha Adecuado H-M (%)"] = np.nan
 
     # --- Brecha Salarial H-M (%)
-    occ_h = ocup.loc[(ocup[sexo_col] == 1) & ocup[ingreso_col].notna()]
-    occ_m = ocup.loc[(ocup[sexo_col] == 2) & ocup[ingreso_col].notna()]
-    if not occ_h.empty and not occ_m.empty:
-        mean_h = (occ_h[ingreso_col] * occ_h[peso_col]).sum() / occ_h[peso_col].sum()
-        mean_m = (occ_m[ingreso_col] * occ_m[peso_col]).sum() / occ_m[peso_col].sum()
+    occ_h  = occ_m & (sexo == 1) & ingreso.notna()
+    occ_mu = occ_m & (sexo == 2) & ingreso.notna()
+    if occ_h.any() and occ_mu.any():
+        mean_h = (ingreso[occ_h] * peso[occ_h]).sum() / peso[occ_h].sum()
+        mean_m = (ingreso[occ_mu] * peso[occ_mu]).sum() / peso[occ_mu].sum()
         out["Brecha Salarial H-M (%)"] = _safe_pct(mean_h - mean_m, mean_h)
     else:
         out["Brecha Salarial H-M (%)"] = np.nan
 
     # --- NiNi juvenil (%)
     if estud_col:
-        juv = df[df[edad_col].between(15, 24)]
-        no_est = (juv["_estu_cod"] == 2) | juv[estud_col].astype(str).str.lower().isin({"no","0","n","ninguno",""})
-        no_trab = juv[stat_col].isin([7, 8, 9])
-        out["NiNi (%)"] = _safe_pct(juv.loc[no_est & no_trab, peso_col].sum(), juv[peso_col].sum())
+        juv = edad.between(15, 24)
+        no_est = no_estudia(codigo(df[estud_col]), df[estud_col])
+        no_trab = stat.isin([7, 8, 9])
+        out["NiNi (%)"] = _safe_pct(suma(juv & no_est & no_trab), suma(juv))
     else:
         out["NiNi (%)"] = np.nan
 
     # --- Desempleo Juvenil (%)
-    juv_pea = pea[pea[edad_col].between(18, 29)]
-    juv_des = juv_pea.loc[juv_pea[stat_col].isin([7, 8]), peso_col].sum()
-    out["Desempleo Juvenil (%)"] = _safe_pct(juv_des, juv_pea[peso_col].sum())
+    juv_pea = pea_m & edad.between(18, 29)
+    juv_des = suma(juv_pea & stat.isin([7, 8]))
+    out["Desempleo Juvenil (%)"] = _safe_pct(juv_des, suma(juv_pea))
 
     # --- Trabajo Infantil (%)
-    niños = df[df[edad_col].between(5, 14)]
-    ti_mask = niños[stat_col].between(1, 6)
+    niños = edad.between(5, 14)
+    ti_mask = stat.between(1, 6)
     if horas_col:
-        ti_mask |= (niños[horas_col].fillna(0) > 0)
-    out["Trabajo Infantil (%)"] = _safe_pct(niños.loc[ti_mask, peso_col].sum(), niños[peso_col].sum())
+        ti_mask |= (codigo(df[horas_col]).fillna(0) > 0)
+    out["Trabajo Infantil (%)"] = _safe_pct(suma(niños & ti_mask), suma(niños))
 
     # --- Manufactura / Empleo (%)
     if act1_col:
-        manu_mask = ocup[act1_col].astype(str).str.strip() == "3"
-        out["Manufactura / Empleo (%)"] = _safe_pct(ocup.loc[manu_mask, peso_col].sum(), Wocc)
+        manu_mask = es_manufactura(df[act1_col])
+        out["Manufactura / Empleo (%)"] = _safe_pct(suma(occ_m & manu_mask), Wocc)
     else:
         out["Manufactura / Empleo (%)"] = np.nan
 
     return out
 
+# ───────────── Motor agrupado (una pasada por archivo) ─────────────
+# Cada indicador es un cociente de sumas ponderadas. `preparar` castea el
+# archivo una sola vez, cada TERMINO es una columna por fila (peso, peso x
+# ingreso o 1 donde se cumple su máscara) y un único groupby-sum da los
+# numeradores y denominadores de todas las ciudades a la vez; el nacional
+# sale de sumar esas mismas sumas. `indicadores()` queda como referencia
+# (ver --verificar).
+ORDEN_INDICADORES = [
+    "TPG (%)", "TPB (%)", "TD (%)", "Empleo Total (%)", "Formal (%)", "Informal (%)",
+    "Adecuado (%)", "Subempleo (%)", "No Remun. (%)", "Otro No Pleno (%)",
+    "Brecha Adecuado H-M (%)", "Brecha Salarial H-M (%)", "NiNi (%)",
+    "Desempleo Juvenil (%)", "Trabajo Infantil (%)", "Manufactura / Empleo (%)",
+]
+
+def preparar(df_orig):
+    """Mismos alias y casteos que `indicadores`, una vez para todo el archivo."""
+    df = df_orig.rename(columns=lambda c: c.strip().lower())
+    cols = {c: c for c in df.columns}
+    edad_col = pick(cols, ["p03","edad"])
+    sexo_col = pick(cols, ["p02","sexo"])
+    stat_col = pick(cols, ["condact","condact3"])
+    peso_col = pick(cols, ["fexp","peso","factor_expansion","peso_2020"])
+    ingreso_col = pick(cols, ["ingrl"])
+    estud_col = con_datos(df, cols, ["p07","asiste"])
+    horas_col = pick(cols, ["horas","p24"])        if any(k in cols for k in ["horas","p24"]) else None
+    act1_col  = con_datos(df, cols, ["rama1","ramacciu"])
+
+    v = pd.DataFrame(index=df.index)
+    v["edad"] = codigo(df[edad_col])
+    v["sexo"] = codigo(df[sexo_col])
+    v["stat"] = codigo(df[stat_col])
+    v["peso"] = num_peso(df[peso_col])
+    ing = num_ingreso(df[ingreso_col])
+    v["ingreso"] = ing.where((ing < 999999) & (ing > 0) | ing.isna(), np.nan)
+    v["con_ingreso"] = v["ingreso"].notna()
+
+    v["pet"] = (v["edad"]>=15) & (v["peso"]>0)
+    v["pea"] = v["pet"] & v["stat"].between(1,8)
+    v["occ"] = v["pea"] & v["stat"].between(1,6)
+
+    # Sector: solo sobre ocupados, como en `indicadores` (0 para el resto).
+    # Se filtran las columnas que usa, no todo el archivo
+    occ = v["occ"].to_numpy()
+    secemp_col = con_datos(df, cols, ["secemp"])
+    if secemp_col:
+        sec = codigo(df[secemp_col][occ]).fillna(4).astype(int)
+    else:
+        sec = sector_desde(*(df[pick(cols, [c])][occ] for c in ("p47a", "p49", "p42")))
+    v["s"] = sec.reindex(df.index, fill_value=0)
+
+    if estud_col:
+        v["no_est"] = no_estudia(codigo(df[estud_col]), df[estud_col])
+    else:
+        v["no_est"] = False
+    v["ti"] = v["stat"].between(1, 6)
+    if horas_col:
+        v["ti"] |= (codigo(df[horas_col]).fillna(0) > 0)
+    v["manu"] = es_manufactura(df[act1_col]) if act1_col else False
+
+    opciones = {"estud": bool(estud_col), "act1": bool(act1_col)}
+    return v, opciones
+
+# (nombre, máscara, valor): valor "peso" | "ingreso_peso" | "uno". La máscara
+# es una expresión sobre las columnas de `preparar`: pandas la evalúa con
+# DataFrame.eval y `mascara_sql` la traduce a la condición de un sumIf
+# (modo --servidor). Solo &, |, comparaciones e `in [...]`, sin negaciones:
+# así un NULL de ClickHouse se comporta como el False de pandas.
+TERMINOS = [
+    ("w_pop",       "True",                                               "peso"),
+    ("w_pet",       "pet",                                                "peso"),
+    ("w_pea",       "pea",                                                "peso"),
+    ("w_occ",       "occ",                                                "peso"),
+    ("w_des",       "pea & stat in [7, 8]",                               "peso"),
+    ("w_formal",    "occ & s == 1",                                       "peso"),
+    ("w_informal",  "occ & s == 2",                                       "peso"),
+    ("w_adecuado",  "occ & stat == 1",                                    "peso"),
+    ("w_subempleo", "occ & stat in [2, 3]",                               "peso"),
+    ("w_noremun",   "occ & stat == 5",                                    "peso"),
+    ("w_otro",      "occ & stat == 4",                                    "peso"),
+    ("w_pea_h",     "pea & sexo == 1",                                    "peso"),
+    ("w_pea_m",     "pea & sexo == 2",                                    "peso"),
+    ("w_ade_h",     "occ & sexo == 1 & stat == 1",                        "peso"),
+    ("w_ade_m",     "occ & sexo == 2 & stat == 1",                        "peso"),
+    ("w_ing_h",     "occ & sexo == 1 & con_ingreso",                      "peso"),
+    ("w_ing_m",     "occ & sexo == 2 & con_ingreso",                      "peso"),
+    ("wi_ing_h",    "occ & sexo == 1 & con_ingreso",                      "ingreso_peso"),
+    ("wi_ing_m",    "occ & sexo == 2 & con_ingreso",                      "ingreso_peso"),
+    ("n_ing_h",     "occ & sexo == 1 & con_ingreso",                      "uno"),
+    ("n_ing_m",     "occ & sexo == 2 & con_ingreso",                      "uno"),
+    ("w_juv",       "edad >= 15 & edad <= 24",                            "peso"),
+    ("w_nini",      "edad >= 15 & edad <= 24 & no_est & stat in [7, 8, 9]", "peso"),
+    ("w_juv_pea",   "pea & edad >= 18 & edad <= 29",                      "peso"),
+    ("w_juv_des",   "pea & edad >= 18 & edad <= 29 & stat in [7, 8]",     "peso"),
+    ("w_ninos",     "edad >= 5 & edad <= 14",                             "peso"),
+    ("w_ti",        "edad >= 5 & edad <= 14 & ti",                        "peso"),
+    ("w_manu",      "occ & manu",                                         "peso"),
+]
+
+def mascara(v, expr):
+    m = v.eval(expr, engine="python")
+    if np.isscalar(m):
+        m = pd.Series(bool(m), index=v.index)
+    return m.fillna(False).astype(bool)
+
+def terminos(v):
+    """Una columna por término; las filas sin peso quedan NaN (sum las salta)."""
+    valores = {"peso": v.peso, "ingreso_peso": v.ingreso * v.peso,
+               "uno": pd.Series(1.0, index=v.index)}
+    return pd.DataFrame({
+        nombre: valores[valor].where(mascara(v, expr), 0.0)
+        for nombre, expr, valor in TERMINOS
+    }, index=v.index)
+
+def _pct(n, d):
+    # Igual que _safe_pct, por elemento
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(d > 0, np.round(n*100/d, 2), np.nan)
+
+def derivar(S, opciones):
+    """Sumas por grupo (una fila por grupo) → indicadores, como `indicadores()`."""
+    g = lambda c: S[c].to_numpy(dtype=float)
+    out = pd.DataFrame(index=S.index)
+    out["TPG (%)"]           = _pct(g("w_pea"), g("w_pet"))
+    out["TPB (%)"]           = _pct(g("w_pea"), g("w_pop"))
+    out["TD (%)"]            = _pct(g("w_des"), g("w_pea"))
+    out["Empleo Total (%)"]  = _pct(g("w_occ"), g("w_pea"))
+    out["Formal (%)"]        = _pct(g("w_formal"), g("w_occ"))
+    out["Informal (%)"]      = _pct(g("w_informal"), g("w_occ"))
+    out["Adecuado (%)"]      = _pct(g("w_adecuado"), g("w_pea"))
+    out["Subempleo (%)"]     = _pct(g("w_subempleo"), g("w_pea"))
+    out["No Remun. (%)"]     = _pct(g("w_noremun"), g("w_pea"))
+    out["Otro No Pleno (%)"] = _pct(g("w_otro"), g("w_pea"))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        tasa_h = g("w_ade_h") / g("w_pea_h")
+        brecha = tasa_h - g("w_ade_m") / g("w_pea_m")
+        ok = (g("w_pea_h") > 0) & (g("w_pea_m") > 0)
+        out["Brecha Adecuado H-M (%)"] = np.where(ok, _pct(brecha, tasa_h), np.nan)
+        media_h = g("wi_ing_h") / g("w_ing_h")
+        media_m = g("wi_ing_m") / g("w_ing_m")
+        ok = (g("n_ing_h") > 0) & (g("n_ing_m") > 0)
+        out["Brecha Salarial H-M (%)"] = np.where(ok, _pct(media_h - media_m, media_h), np.nan)
+    out["NiNi (%)"] = _pct(g("w_nini"), g("w_juv")) if opciones["estud"] else np.nan
+    out["Desempleo Juvenil (%)"]  = _pct(g("w_juv_des"), g("w_juv_pea"))
+    out["Trabajo Infantil (%)"]   = _pct(g("w_ti"), g("w_ninos"))
+    out["Manufactura / Empleo (%)"] = _pct(g("w_manu"), g("w_occ")) if opciones["act1"] else np.nan
+    return out[ORDEN_INDICADORES]
+
+def indicadores_agrupados(df):
+    """
+    (indicadores nacionales, [(ciudad, indicadores), ...]) con un solo
+    groupby-sum. Sin columna de ciudad, la lista va vacía.
+    """
+    nac, por_ciudad, _ = calcular_archivo(df)
+    return nac, por_ciudad
+
+def calcular_archivo(df, claves_cubo=(), al_preparar=None):
+    """
+    Como `indicadores_agrupados`, más el cubo de sumas por `claves_cubo`.
+    `al_preparar(v, T, opciones)` recibe las columnas y términos ya
+    calculados (el bootstrap los reutiliza).
+    """
+    v, opciones = preparar(df)
+    T = terminos(v)
+    if al_preparar:
+        al_preparar(v, T, opciones)
+    cubo = sumas_cubo(df, v, T, claves_cubo, opciones) if claves_cubo else None
+    try:
+        city_col = pick({c:c for c in df.columns}, ["ciudad","ciuc"])
+    except KeyError:
+        S = T.sum().to_frame().T
+        return derivar(S, opciones).iloc[0].to_dict(), [], cubo
+    S = T.groupby(clave_ciudad(df[city_col]), dropna=False, sort=True).sum()
+    nac = derivar(S.sum().to_frame().T, opciones).iloc[0].to_dict()
+    por_ciudad = derivar(S[S.index.notna()], opciones)
+    return nac, list(zip(por_ciudad.index, por_ciudad.to_dict("records"))), cubo
+
+# ───────────── Cubo de estadísticos suficientes ─────────────
+# Las sumas de TERMINOS son aditivas: agrupadas por claves finas (ciudad,
+# área, sexo, grupo de edad) se pueden volver a sumar a cualquier desglose
+# más grueso o a varios periodos, y `derivar` da los indicadores sin leer
+# otra vez los microdatos. Los grupos de edad cortan en los límites que usan
+# los indicadores (5, 15, 18, 25, 30) para que los juveniles se reconstruyan.
+BANDAS_EDAD = [0, 5, 15, 18, 25, 30, 45, 65, np.inf]
+ETIQUETAS_EDAD = ["0-4", "5-14", "15-17", "18-24", "25-29", "30-44", "45-64", "65+"]
+
+def _columna(df, cands):
+    try:
+        return codigo(df[pick({c:c for c in df.columns}, cands)])
+    except KeyError:
+        return pd.Series(np.nan, index=df.index)
+
+def _ciudad(df):
+    try:
+        return clave_ciudad(df[pick({c:c for c in df.columns}, ["ciudad","ciuc"])])
+    except KeyError:
+        return pd.Series(np.nan, index=df.index, dtype=object)
+
+DIMENSIONES = {
+    "ciudad":     lambda df, v: _ciudad(df),
+    "provincia":  lambda df, v: _ciudad(df).str[:2],
+    "area":       lambda df, v: _columna(df, ["area"]),
+    "sexo":       lambda df, v: v.sexo,
+    "grupo_edad": lambda df, v: pd.cut(v.edad, BANDAS_EDAD, right=False,
+                                       labels=ETIQUETAS_EDAD).astype(object),
+    "nnivins":    lambda df, v: _columna(df, ["nnivins"]),
+}
+# Claves que el cubo no trae pero salen de otra que sí
+DERIVADAS = {"provincia": ("ciudad", lambda s: s.str[:2])}
+
+def sumas_cubo(df, v, T, claves, opciones):
+    """Una fila por combinación de `claves` con las sumas de cada término."""
+    desconocidas = set(claves) - set(DIMENSIONES)
+    if desconocidas:
+        raise KeyError(f"Claves de cubo desconocidas: {sorted(desconocidas)}")
+    low = df.rename(columns=lambda c: c.strip().lower())
+    grupos = [DIMENSIONES[k](low, v).rename(k) for k in claves]
+    cubo = T.groupby(grupos, dropna=False, sort=True, observed=True).sum().reset_index()
+    cubo["con_estud"] = opciones["estud"]
+    cubo["con_act1"] = opciones["act1"]
+    return cubo
+
+def derivar_cubo(cubo, por):
+    """Indicadores por `por` (columnas del cubo o DERIVADAS) desde las sumas."""
+    cubo = cubo.copy()
+    for k in por:
+        if k not in cubo.columns and k in DERIVADAS:
+            origen, f = DERIVADAS[k]
+            cubo[k] = f(cubo[origen])
+    sumas = [nombre for nombre, _, _ in TERMINOS]
+    g = cubo.groupby(list(por), dropna=False, sort=True)
+    S = g[sumas].sum()
+    flags = g[["con_estud", "con_act1"]].all()
+    out = derivar(S, {"estud": True, "act1": True})
+    # Un grupo con periodos sin la columna de estudio o de rama no tiene el indicador
+    out.loc[~flags["con_estud"].to_numpy(), "NiNi (%)"] = np.nan
+    out.loc[~flags["con_act1"].to_numpy(), "Manufactura / Empleo (%)"] = np.nan
+    return out.reset_index()
+
+# ───────────── Errores estándar por bootstrap (Rao-Wu) ─────────────
+# Cada réplica remuestrea con reposición n_h - 1 UPM dentro de cada estrato
+# y reescala: multiplicador = veces elegida * n_h / (n_h - 1). Como los
+# multiplicadores son por UPM, basta con las sumas de TERMINOS por
+# (UPM, ciudad): las sumas nacionales de un bloque de réplicas son un solo
+# producto matricial A.T @ M, y las de ciudad, uno por ciudad sobre sus UPM.
+# Solo un bloque de réplicas vive en memoria; de cada indicador se
+# acumulan suma, suma de cuadrados y réplicas válidas. Los estratos con una
+# sola UPM y las filas sin upm/estrato quedan con multiplicador 1.
+def multiplicadores_rao_wu(estrato_upm, replicas, rng):
+    """Matriz (UPM x réplicas) de multiplicadores; `estrato_upm` es el código de estrato de cada UPM."""
+    P = len(estrato_upm)
+    orden = np.argsort(estrato_upm, kind="stable")
+    _, inicio, n_h = np.unique(estrato_upm[orden], return_index=True, return_counts=True)
+    # Una casilla de sorteo por cada una de las n_h - 1 UPM elegidas del estrato
+    sorteables = n_h > 1
+    casillas = np.repeat(np.flatnonzero(sorteables), n_h[sorteables] - 1)
+    u = rng.random((len(casillas), replicas))
+    elegida = orden[inicio[casillas, None] + (u * n_h[casillas, None]).astype(np.int64)]
+    plano = (elegida + P * np.arange(replicas)).ravel()
+    veces = np.bincount(plano, minlength=P * replicas).reshape(replicas, P).T
+    escala = np.ones(P)
+    escala[orden] = np.repeat(np.where(sorteables, n_h / np.maximum(n_h - 1, 1), 1.0), n_h)
+    fijas = np.zeros(P, dtype=bool)
+    fijas[orden] = np.repeat(~sorteables, n_h)
+    M = veces * escala[:, None]
+    M[fijas] = 1.0
+    return M
+
+def bootstrap(df, v, T, opciones, replicas, bloque, rng):
+    """
+    (nacional, {ciudad: ...}) con, por indicador, (error estándar, réplicas
+    válidas). Sin columna de ciudad el diccionario va vacío.
+    """
+    cols = {c: c for c in df.columns}
+    upm = df[pick(cols, ["upm"])].astype(str).str.strip()
+    estrato = codigo(df[pick(cols, ["estrato"])]).astype(float)
+    valida = upm.notna() & (upm != "") & (upm != "nan") & estrato.notna()
+    # La UPM es el par (estrato, upm): así queda anidada en su estrato
+    psu, claves = pd.factorize(pd.MultiIndex.from_arrays([estrato.where(valida), upm.where(valida)]))
+    psu = np.where(valida.to_numpy(), psu, -1)
+    estrato_upm = np.asarray(claves.get_level_values(0), dtype=float)
+    try:
+        ciudad = clave_ciudad(df[pick(cols, ["ciudad","ciuc"])])
+    except KeyError:
+        ciudad = pd.Series(np.nan, index=df.index, dtype=object)
+    codigo_ciudad, ciudades = pd.factorize(ciudad, sort=True)  # NaN → -1
+
+    # Sumas por (UPM, ciudad); las filas sin UPM forman su propio grupo fijo
+    A = T.groupby([psu, codigo_ciudad], sort=True).sum()
+    par_psu = A.index.get_level_values(0).to_numpy()
+    par_ciudad = A.index.get_level_values(1).to_numpy()
+    A = A.to_numpy(dtype=float)
+    orden = np.argsort(par_ciudad, kind="stable")
+    A, par_psu, par_ciudad = A[orden], par_psu[orden], par_ciudad[orden]
+    # Pares ordenados por ciudad: cada ciudad es un tramo contiguo [inicio, fin)
+    inicio = np.searchsorted(par_ciudad, np.arange(len(ciudades)), side="left")
+    fin = np.searchsorted(par_ciudad, np.arange(len(ciudades)), side="right")
+    C, K = len(ciudades), len(ORDEN_INDICADORES)
+    nombres = list(T.columns)
+
+    acum = {k: np.zeros((1 + C, K)) for k in ("n", "s1", "s2")}
+    for r0 in range(0, replicas, bloque):
+        rb = min(bloque, replicas - r0)
+        M = multiplicadores_rao_wu(estrato_upm, rb, rng) if len(estrato_upm) else np.ones((0, rb))
+        Mp = np.ones((len(par_psu), rb))
+        Mp[par_psu >= 0] = M[par_psu[par_psu >= 0]]
+        S = [A.T @ Mp]                                    # términos x réplicas
+        if C:
+            # Un producto por ciudad sobre su tramo de pares (BLAS), no por réplica
+            Y = np.empty((C, A.shape[1], rb))
+            for i in range(C):
+                Y[i] = A[inicio[i]:fin[i]].T @ Mp[inicio[i]:fin[i]]
+            S.append(Y.transpose(1, 0, 2).reshape(A.shape[1], C * rb))
+        S = np.concatenate(S, axis=1).T                   # (1 + C) * réplicas x términos
+        theta = derivar(pd.DataFrame(S, columns=nombres), opciones).to_numpy(dtype=float)
+        # Fila 0..rb-1: nacional; luego rb réplicas por ciudad
+        theta = np.concatenate([theta[:rb][None], theta[rb:].reshape(C, rb, K)], axis=0)
+        ok = ~np.isnan(theta)
+        acum["n"] += ok.sum(axis=1)
+        acum["s1"] += np.where(ok, theta, 0).sum(axis=1)
+        acum["s2"] += np.where(ok, theta**2, 0).sum(axis=1)
+
+    n = acum["n"]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        media = acum["s1"] / n
+        var = np.maximum(acum["s2"] - n * media**2, 0) / (n - 1)
+    ee = np.where(n > 1, np.sqrt(var), np.nan)
+    salida = [{k: (ee[i, j], int(n[i, j])) for j, k in enumerate(ORDEN_INDICADORES)}
+              for i in range(1 + C)]
+    return salida[0], dict(zip(ciudades, salida[1:]))
+
+def filas_ee(base, indicadores, errores, extra=None):
+    """Formato largo: una fila por indicador con valor, EE e IC 95 %."""
+    filas = []
+    for k in ORDEN_INDICADORES:
+        valor = indicadores[k]
+        ee, n = errores[k]
+        filas.append({**base, **(extra or {}), "Indicador": k, "Valor": valor, "EE": round(ee, 4),
+                      "IC95 inf": round(valor - Z_95 * ee, 4), "IC95 sup": round(valor + Z_95 * ee, 4),
+                      "Réplicas": n})
+    return filas
+
+# ───────────── Modo servidor (push-down a ClickHouse) ─────────────
+# Las mismas sumas de TERMINOS, calculadas por ClickHouse sobre
+# enemdu_persona por (periodo, ciudad); solo vuelven esas sumas y el
+# nacional sale de sumarlas, como en `indicadores_agrupados`. Las columnas
+# de `preparar`, en SQL (los alias se reutilizan dentro del mismo SELECT).
+# `{sector}` es ifNull(secemp, 4), o `compute_sector` en los periodos
+# sin ningún secemp (la misma regla que `con_datos` en pandas).
+VARIABLES_SQL = [
+    ("edad",        "p03"),
+    ("sexo",        "p02"),
+    ("stat",        "condact"),
+    ("peso",        "abs(fexp)"),
+    ("ingreso",     "if(ingrl > 0 AND ingrl < 999999, ingrl, NULL)"),
+    ("con_ingreso", "isNotNull(ingreso)"),
+    ("pet",         "(edad >= 15 AND peso > 0)"),
+    ("pea",         "(pet AND stat BETWEEN 1 AND 8)"),
+    ("occ",         "(pea AND stat BETWEEN 1 AND 6)"),
+    ("s",           "{sector}"),
+    ("no_est",      "(p07 IN (0, 2))"),
+    ("ti",          "(stat BETWEEN 1 AND 6 OR ifNull(p24, 0) > 0)"),
+    ("manu",        "(rama1 = 3)"),
+]
+# compute_sector: la última asignación gana, y un p49 vacío cuenta como != 1
+SECTOR_SQL = ("multiIf(p47a = 1 AND (p49 IS NULL OR p49 != 1), 2, "
+              "p47a = 1 AND p49 = 1, 1, p47a = 2, 1, p42 = 10, 3, 4)")
+
+def mascara_sql(expr):
+    """Máscara de TERMINOS → condición de ClickHouse."""
+    expr = re.sub(r"\bin \[([^\]]*)\]", r"IN (\1)", expr)
+    return (expr.replace("==", "=").replace("&", "AND").replace("|", "OR")
+                .replace("True", "1"))
+
+def _literal(x):
+    return "'" + str(x).replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+def sql_periodos(tabla):
+    """Por periodo: si trae secemp, estudio (p07) y rama (rama1)."""
+    return (f"SELECT periodo, countIf(secemp IS NOT NULL) > 0, countIf(p07 IS NOT NULL) > 0, "
+            f"countIf(rama1 IS NOT NULL) > 0 FROM {tabla} GROUP BY periodo ORDER BY periodo")
+
+def sql_sumas(tabla, sin_secemp=()):
+    """Sumas de TERMINOS por (periodo, ciudad) sobre `tabla`."""
+    sector = "ifNull(secemp, 4)"
+    if sin_secemp:
+        lista = ", ".join(_literal(p) for p in sorted(sin_secemp))
+        sector = f"if(periodo IN ({lista}), {SECTOR_SQL}, {sector})"
+    variables = ",\n        ".join(f"{expr.format(sector=sector)} AS {nombre}"
+                                   for nombre, expr in VARIABLES_SQL)
+    valores = {"peso": "peso", "ingreso_peso": "ingreso * peso", "uno": None}
+    # Sobre columnas Nullable, sumIf sin filas da NULL; pandas da 0
+    sumas = ",\n    ".join(
+        (f"countIf({mascara_sql(expr)})" if valores[valor] is None
+         else f"ifNull(sumIf({valores[valor]}, {mascara_sql(expr)}), 0)") + f" AS {nombre}"
+        for nombre, expr, valor in TERMINOS)
+    return (f"SELECT\n    periodo,\n    nullIf(ciudad, '') AS ciudad,\n    {sumas}\n"
+            f"FROM (\n    SELECT\n        periodo, ciudad,\n        {variables}\n    FROM {tabla}\n)\n"
+            f"GROUP BY periodo, ciudad\nORDER BY periodo, ciudad")
+
+# ───────────── Series entre periodos ─────────────
+# Sobre las filas ya calculadas (nacional o por ciudad): variación anual y
+# trimestral en puntos porcentuales y promedio móvil de 12 meses. Los
+# periodos van a una grilla mensual completa por grupo, así un desfase de
+# 12 o 3 posiciones es siempre 12 o 3 meses, haya archivos mensuales,
+# trimestrales o solo anuales; si falta el periodo de comparación queda NaN.
+SERIES = {"Var. anual (pp)": 12, "Var. trimestral (pp)": 3}
+VENTANA_MESES = 12
+PROMEDIO = "Prom. 12m"
+PERIODOS_VENTANA = "Periodos 12m"
+
+def con_series(filas, por=()):
+    """`filas` con las columnas de SERIES y PROMEDIO por indicador, en una pasada."""
+    df = pd.DataFrame(filas)
+    if df.empty:
+        return filas
+    por = list(por)
+    ind = [c for c in ORDEN_INDICADORES if c in df.columns]
+    df["_mes"] = df["Año"].astype(int) * 12 + df["Periodo"].astype(int) - 1
+    obs = df.drop_duplicates([*por, "_mes"], keep="last")[[*por, "_mes", *ind]].assign(_obs=1)
+    claves = obs[por].drop_duplicates() if por else pd.DataFrame(index=[0])
+    meses = pd.DataFrame({"_mes": np.arange(obs["_mes"].min(), obs["_mes"].max() + 1)})
+    grilla = (claves.merge(meses, how="cross")
+                    .merge(obs, on=[*por, "_mes"], how="left")
+                    .sort_values([*por, "_mes"], ignore_index=True))
+    g = grilla.groupby(por if por else np.zeros(len(grilla)), sort=False)
+    nuevas = {}
+    for nombre, desfase in SERIES.items():
+        previo = g[ind].shift(desfase)
+        nuevas.update({f"{c} {nombre}": (grilla[c] - previo[c]).round(2) for c in ind})
+    movil = g[[*ind, "_obs"]].rolling(VENTANA_MESES, min_periods=1)
+    prom = movil[ind].mean().reset_index(drop=True)
+    nuevas.update({f"{c} {PROMEDIO}": prom[c].round(2) for c in ind})
+    nuevas[PERIODOS_VENTANA] = movil["_obs"].sum().reset_index(drop=True).astype(int)
+    grilla = pd.concat([grilla[[*por, "_mes", "_obs"]], pd.DataFrame(nuevas)], axis=1)
+    grilla = grilla[grilla["_obs"] == 1].drop(columns="_obs")
+    return df.merge(grilla, on=[*por, "_mes"], how="left").drop(columns="_mes").to_dict("records")
+
+def cliente_clickhouse():
+    from clickhouse_driver import Client
+    return Client(host=CH_HOST, port=CH_PORT, user=CH_USER, password=CH_PASSWORD,
+                  database=CH_DATABASE)
+
+def indicadores_servidor(client, tabla=None):
+    """(rows_nac, rows_city) como `main`, con las sumas hechas en ClickHouse."""
+    tabla = tabla or f"{CH_DATABASE}.{CH_TABLE}"
+    periodos = client.execute(sql_periodos(tabla))
+    sin_secemp = [p for p, con_secemp, _, _ in periodos if not con_secemp]
+    filas = client.execute(sql_sumas(tabla, sin_secemp))
+    nombres = [nombre for nombre, _, _ in TERMINOS]
+    S = pd.DataFrame(filas, columns=["periodo", "ciudad", *nombres])
+    rows_nac, rows_city = [], []
+    for periodo, con_secemp, con_estud, con_act1 in periodos:
+        m = YEAR_RX.search(periodo)
+        if not m:
+            warnings.warn(f"periodo {periodo!r} sin formato AAAAMM")
+            continue
+        year, period = m.groups()
+        opciones = {"estud": bool(con_estud), "act1": bool(con_act1)}
+        Sp = S[S["periodo"] == periodo].set_index("ciudad")[nombres]
+        base = {"Año":int(year), "Periodo":int(period), "Mes":MONTH[period]}
+        rows_nac.append({**base, **derivar(Sp.sum().to_frame().T, opciones).iloc[0].to_dict()})
+        por_ciudad = derivar(Sp[Sp.index.notna()], opciones)
+        rows_city += [{**base, "Ciudad":city, **ind}
+                      for city, ind in zip(por_ciudad.index, por_ciudad.to_dict("records"))]
+    return rows_nac, rows_city
+
+def paridad(client, fixture):
+    """
+    Carga `fixture` (un CSV de persona con `periodo`) en una tabla Memory con
+    el esquema de enemdu_persona, por el mismo camino que ingest_persona, y
+    compara el modo servidor contra pandas. Se prueba con secemp, sin la
+    columna y con la columna vacía (las dos últimas por `compute_sector`).
+    Devuelve la lista de diferencias.
+    """
+    import tempfile
+    import ingest_persona as ip
+    from ingest_common import SOLO_INSERTABLES, ingest_csv
+
+    tabla = f"{CH_DATABASE}._paridad_persona"
+    diferencias = []
+    with tempfile.TemporaryDirectory() as tmp:
+        sin_secemp = Path(tmp) / fixture.name.replace(".csv", "_sin_secemp.csv")
+        secemp_vacio = Path(tmp) / fixture.name.replace(".csv", "_secemp_vacio.csv")
+        df_csv = pd.read_csv(fixture, sep=detect_delim(fixture), dtype=str, encoding=CSV_ENCODING,
+                             keep_default_na=False)
+        secemp = [c for c in df_csv.columns if c.strip().lower() == "secemp"]
+        df_csv.drop(columns=secemp).to_csv(sin_secemp, sep=";", index=False, encoding="utf-8")
+        df_csv.assign(**{c: "" for c in secemp}) \
+              .to_csv(secemp_vacio, sep=";", index=False, encoding="utf-8")
+        for caso in (fixture, sin_secemp, secemp_vacio):
+            client.execute(f"DROP TABLE IF EXISTS {tabla}")
+            client.execute(f"CREATE TABLE {tabla} AS {CH_DATABASE}.{CH_TABLE} ENGINE = Memory")
+            try:
+                cols = [c for c, in client.execute(
+                    f"SELECT name FROM system.columns WHERE database = '{CH_DATABASE}' "
+                    f"AND table = '_paridad_persona' AND {SOLO_INSERTABLES} ORDER BY position")]
+                res = ingest_csv(client, caso, CH_DATABASE, "_paridad_persona", cols,
+                                 coerce=lambda df: ip.coerce_frame(df, cols),
+                                 on_failed_row=lambda values: None,
+                                 encoding=CSV_ENCODING if caso == fixture else "utf-8")
+                if res.failed:
+                    diferencias.append(f"{caso.name}: {res.failed} filas rechazadas al cargar")
+                srv_nac, srv_city = indicadores_servidor(client, tabla)
+            finally:
+                client.execute(f"DROP TABLE IF EXISTS {tabla}")
+            nac, por_ciudad = indicadores_agrupados(leer_archivo(caso))
+            ref = {None: nac, **dict(por_ciudad)}
+            obtenidos = {None: srv_nac[0] if srv_nac else {}, **{r["Ciudad"]: r for r in srv_city}}
+            if set(ref) != set(obtenidos):
+                diferencias.append(f"{caso.name}: {len(ref)} grupos en pandas, {len(obtenidos)} en SQL")
+            for grupo in set(ref) & set(obtenidos):
+                for k in ORDEN_INDICADORES:
+                    a, b = ref[grupo][k], obtenidos[grupo][k]
+                    # Las sumas en otro orden pueden mover el redondeo a 2 decimales
+                    if not ((pd.isna(a) and pd.isna(b)) or abs(a - b) <= 0.011):
+                        diferencias.append(f"{caso.name} {grupo or 'nacional'} {k}: pandas {a}, SQL {b}")
+    return diferencias
+
 # ───────────── 5. Recorre CSV y compila resultados ────────────
-rows_nac, rows_city = [], []
+def archivos_persona(root=ROOT):
+    for f in sorted(root.rglob("*")):
+        if f.suffix.lower() not in (".csv", ".parquet"): continue
+        if "persona" not in f.stem.lower(): continue
+        m = YEAR_RX.search(f.stem)
+        if not m: continue
+        yield f, m.groups()
+
+def verificar(df, nac, por_ciudad):
+    """Compara el motor agrupado contra `indicadores()` grupo a grupo."""
+    iguales = lambda a, b: all(
+        (pd.isna(a[k]) and pd.isna(b[k])) or a[k] == b[k] for k in ORDEN_INDICADORES)
+    malos = [] if iguales(nac, indicadores(df)) else ["nacional"]
+    if por_ciudad:
+        city_col = pick({c:c for c in df.columns}, ["ciudad","ciuc"])
+        ref = {city: indicadores(sub) for city, sub in df.groupby(clave_ciudad(df[city_col]))}
+        malos += [str(c) for c, ind in por_ciudad if not iguales(ind, ref[c])]
+        if len(ref) != len(por_ciudad):
+            malos.append("cantidad de ciudades")
+    return malos
+
+# ───────────── Pico de memoria por archivo ─────────────
+# VmHWM es el pico de memoria residente del proceso; en Linux se vuelve a
+# cero escribiendo "5" en clear_refs, así cada archivo mide el suyo aunque
+# el proceso del pool ya haya calculado otros.
+def reiniciar_pico():
+    try:
+        Path("/proc/self/clear_refs").write_text("5")
+    except OSError:
+        pass
 
-for f in ROOT.rglob("*.csv"):
-    if "persona" not in f.stem.lower(): continue
-    m = YEAR_RX.search(f.stem)
-    if not m: continue
-    year, period = m.groups()
+def pico_mb():
+    """Pico de memoria residente en MB desde el último `reiniciar_pico()`."""
     try:
-        delim = detect_delim(f)
-        df = pd.read_csv(f, sep=delim, **CSV_READ_KW)
-        ind_nac = indicadores(df)
-        rows_nac.append({"Año":int(year), "Periodo":int(period), "Mes":MONTH[period], **ind_nac})
+        for linea in Path("/proc/self/status").read_text().splitlines():
+            if linea.startswith("VmHWM:"):
+                return int(linea.split()[1]) / 1024
+    except OSError:
+        pass
+    # Sin /proc: ru_maxrss (KB en Linux), el pico del proceso desde que arrancó
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
 
-        # Por ciudad
+def procesar_archivo(f, year, period, con_verificacion=False, config=None):
+    """
+    Un archivo completo: filas nacional y por ciudad, cubo, errores
+    estándar, avisos, pico de memoria y, con verificación, la línea de resultado. `config`
+    trae las claves del cubo y los parámetros del bootstrap. Nunca lanza:
+    los errores vuelven como avisos para que el resto de la corrida siga.
+    """
+    config = config or {}
+    out = {"nac": None, "ciudades": [], "cubo": [], "ee_nac": [], "ee_ciudades": [],
+           "avisos": [], "verificacion": None, "pico_mb": None}
+    reiniciar_pico()
+    with warnings.catch_warnings(record=True) as avisos:
+        warnings.simplefilter("always")
         try:
-            city_col = pick({c:c for c in df.columns}, ["ciudad","ciuc"])
-            for city, sub in df.groupby(city_col):
-                rows_city.append({
-                    "Año":int(year),"Periodo":int(period),"Mes":MONTH[period],
-                    "Ciudad":str(city).zfill(6),
-                    **indicadores(sub)
-                })
-        except KeyError:
-            pass
-
-    except Exception as e:
-        warnings.warn(f"{f.name}: {e}")
-
-# ───────────── Guarda CSV ─────────────
-pd.DataFrame(rows_nac).to_csv(OUT_DIR/"indicadores_nac.csv", index=False)
-pd.DataFrame(rows_city).to_csv(OUT_DIR/"indicadores_ciudad.csv", index=False)
\ No newline at end of file
+            df = leer_archivo(f)
+            preparado = {}
+            ind_nac, por_ciudad, cubo = calcular_archivo(
+                df, config.get("cubo", ()),
+                al_preparar=lambda v, T, opciones: preparado.update(v=v, T=T, opciones=opciones))
+            base = {"Año":int(year), "Periodo":int(period), "Mes":MONTH[period]}
+            out["nac"] = {**base, **ind_nac}
+            out["ciudades"] = [{**base, "Ciudad":str(city).zfill(6), **ind} for city, ind in por_ciudad]
+            if cubo is not None:
+                out["cubo"] = cubo.assign(Año=int(year), Periodo=int(period)).to_dict("records")
+            if config.get("replicas"):
+                # Semilla por periodo: el resultado no depende del orden ni del proceso
+                rng = np.random.default_rng([config["semilla"], int(year), int(period)])
+                try:
+                    ee_nac, ee_ciudad = bootstrap(df, preparado["v"], preparado["T"], preparado["opciones"],
+                                                  config["replicas"], config["bloque"], rng)
+                    out["ee_nac"] = filas_ee(base, ind_nac, ee_nac)
+                    out["ee_ciudades"] = [fila for city, ind in por_ciudad
+                                          for fila in filas_ee(base, ind, ee_ciudad[city],
+                                                               {"Ciudad": str(city).zfill(6)})]
+                except KeyError as e:
+                    out["avisos"].append(f"sin errores estándar: {e}")
+            if con_verificacion:
+                malos = verificar(df, ind_nac, por_ciudad)
+                out["verificacion"] = f"{f.name}: {'OK' if not malos else 'DIFERENCIAS en ' + ', '.join(malos[:10])}"
+        except Exception as e:
+            out["avisos"].append(str(e))
+    out["avisos"] = [str(w.message) for w in avisos] + out["avisos"]
+    out["pico_mb"] = round(pico_mb(), 1)
+    return out
+
+def _en_pool(tareas, workers, con_verificacion, config=None):
+    """
+    Reparte `tareas` entre `workers` procesos. Si un proceso muere (segfault,
+    OOM), lo pendiente se reintenta de a uno para aislar al archivo culpable,
+    que queda como aviso.
+    """
+    resultados, pendientes = {}, list(tareas)
+    while pendientes:
+        rotos = []
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futuros = {pool.submit(procesar_archivo, f, y, p, con_verificacion, config): (f, y, p)
+                       for f, y, p in pendientes}
+            for fut, tarea in futuros.items():
+                try:
+                    resultados[tarea] = fut.result()
+                except BrokenProcessPool:
+                    rotos.append(tarea)
+        if rotos and workers == 1:
+            # De a uno, el primero en romper el pool es el culpable
+            resultados[rotos[0]] = {"nac": None, "ciudades": [], "cubo": [], "ee_nac": [],
+                                    "ee_ciudades": [], "verificacion": None, "pico_mb": None,
+                                    "avisos": ["el proceso que lo calculaba terminó abruptamente"]}
+            rotos = rotos[1:]
+        pendientes, workers = rotos, 1
+    return resultados
+
+# ───────────── Caché incremental por archivo ─────────────
+# Una entrada JSON por archivo de entrada con su huella (ruta, tamaño, mtime,
+# configuración del cubo y del bootstrap, y versión de las definiciones). La versión es el hash de este módulo:
+# cualquier cambio en los indicadores invalida todo lo calculado antes.
+VERSION_DEFINICIONES = hashlib.blake2b(Path(__file__).read_bytes(), digest_size=8).hexdigest()
+
+def cache_dir():
+    return OUT_DIR / CACHE_SUBDIR
+
+def _entrada_cache(f):
+    return cache_dir() / (hashlib.blake2b(str(f.resolve()).encode(), digest_size=8).hexdigest() + ".json")
+
+def huella(f, config=None):
+    st = f.stat()
+    return {"path": str(f.resolve()), "size": st.st_size, "mtime_ns": st.st_mtime_ns,
+            "config": config or {}, "version": VERSION_DEFINICIONES}
+
+def leer_cache(f, config=None):
+    """Resultado guardado de `f`, o None si no hay o ya no corresponde."""
+    try:
+        entrada = json.loads(_entrada_cache(f).read_text())
+        if entrada["huella"] == huella(f, config):
+            return entrada["resultado"]
+    except (OSError, ValueError, KeyError):
+        pass
+    return None
+
+def guardar_cache(f, resultado, config=None):
+    destino = _entrada_cache(f)
+    destino.parent.mkdir(parents=True, exist_ok=True)
+    tmp = destino.with_suffix(".tmp")
+    tmp.write_text(json.dumps({"huella": huella(f, config), "resultado": {**resultado, "verificacion": None}}))
+    os.replace(tmp, destino)
+
+def podar_cache(archivos):
+    """Borra las entradas de archivos que ya no están en `archivos`."""
+    vigentes = {_entrada_cache(f).name for f in archivos}
+    borradas = 0
+    for entrada in cache_dir().glob("*.json"):
+        if entrada.name not in vigentes:
+            entrada.unlink(missing_ok=True)
+            borradas += 1
+    return borradas
+
+def subir(rows_nac, rows_city):
+    """Entrega las filas en memoria a ingest_indicadores (inserción columnar)."""
+    import ingest_indicadores
+    ingest_indicadores.cargar(cliente_clickhouse(), rows_nac, rows_city)
+
+def main():
+    import argparse
+    ap = argparse.ArgumentParser(description="Indicadores ENEMDU nacionales y por ciudad")
+    ap.add_argument("--verificar", action="store_true",
+                    help="compara el motor agrupado con indicadores() (lento)")
+    ap.add_argument("--workers", type=int, default=CALC_WORKERS,
+                    help="procesos en paralelo, uno por archivo (1 = sin pool)")
+    ap.add_argument("--sin-cache", action="store_true",
+                    help="recalcula todo sin leer la caché (igual la actualiza)")
+    ap.add_argument("--limpiar-cache", action="store_true",
+                    help="borra la caché de resultados antes de calcular")
+    ap.add_argument("--cubo", default=",".join(CUBO_CLAVES),
+                    help=f"claves del cubo de sumas, entre {sorted(DIMENSIONES)} ('' = sin cubo)")
+    ap.add_argument("--bootstrap", type=int, default=BOOT_REPLICAS, metavar="REPLICAS",
+                    help="errores estándar e IC 95 %% con REPLICAS réplicas Rao-Wu (0 = no)")
+    ap.add_argument("--bootstrap-bloque", type=int, default=BOOT_BLOQUE,
+                    help="réplicas por bloque (memoria ~ pares UPM-ciudad x 28 x bloque x 8 B)")
+    ap.add_argument("--servidor", action="store_true",
+                    help=f"calcula las sumas en ClickHouse ({CH_DATABASE}.{CH_TABLE}) en vez de leer archivos")
+    ap.add_argument("--paridad", type=Path, metavar="CSV", nargs="?", const=FIXTURE_PARIDAD,
+                    help="compara el modo servidor con pandas sobre un CSV de persona de prueba "
+                         f"(sin CSV, {FIXTURE_PARIDAD.relative_to(FIXTURE_PARIDAD.parent.parent)})")
+    ap.add_argument("--desde-cubo", metavar="CLAVES",
+                    help="solo deriva indicadores por CLAVES (p. ej. Año,provincia) desde el cubo ya guardado")
+    ap.add_argument("--subir", action="store_true",
+                    help="sube nacional y por ciudad a ClickHouse sin pasar por CSV, reemplazando cada periodo")
+    args = ap.parse_args()
+
+    OUT_DIR.mkdir(parents=True, exist_ok=True)
+    if args.desde_cubo:
+        por = [c for c in args.desde_cubo.split(",") if c]
+        out = derivar_cubo(pd.read_parquet(OUT_DIR/CUBO_ARCHIVO), por)
+        destino = OUT_DIR/f"indicadores_por_{'_'.join(por).lower()}.csv"
+        out.to_csv(destino, index=False)
+        print(f"{len(out)} filas → {destino}")
+        return
+    if args.paridad:
+        diferencias = paridad(cliente_clickhouse(), args.paridad)
+        for d in diferencias[:50]:
+            print(d)
+        print("Paridad OK" if not diferencias else f"{len(diferencias)} diferencias")
+        raise SystemExit(1 if diferencias else 0)
+    if args.servidor:
+        rows_nac, rows_city = indicadores_servidor(cliente_clickhouse())
+        rows_nac, rows_city = con_series(rows_nac), con_series(rows_city, ["Ciudad"])
+        pd.DataFrame(rows_nac).to_csv(OUT_DIR/"indicadores_nac.csv", index=False)
+        pd.DataFrame(rows_city).to_csv(OUT_DIR/"indicadores_ciudad.csv", index=False)
+        print(f"{len(rows_nac)} periodos, {len(rows_city)} filas por ciudad (ClickHouse)")
+        if args.subir:
+            subir(rows_nac, rows_city)
+        return
+    claves_cubo = tuple(c for c in args.cubo.split(",") if c)
+    desconocidas = set(claves_cubo) - set(DIMENSIONES)
+    if desconocidas:
+        ap.error(f"claves de cubo desconocidas: {sorted(desconocidas)}")
+    config = {"cubo": list(claves_cubo)}
+    if args.bootstrap:
+        config.update(replicas=args.bootstrap, bloque=max(1, args.bootstrap_bloque), semilla=BOOT_SEMILLA)
+    if args.limpiar_cache:
+        shutil.rmtree(cache_dir(), ignore_errors=True)
+    # Orden de salida: (Año, Periodo) y luego nombre, sin importar quién termina primero
+    tareas = sorted(((f, y, p) for f, (y, p) in archivos_persona()),
+                    key=lambda t: (int(t[1]), int(t[2]), t[0].name))
+
+    # --verificar necesita los datos: no se sirve nada desde la caché
+    usar_cache = not (args.sin_cache or args.verificar)
+    resultados = {}
+    for t in tareas:
+        r = leer_cache(t[0], config) if usar_cache else None
+        if r is not None:
+            resultados[t] = r
+    faltan = [t for t in tareas if t not in resultados]
+    print(f"{len(tareas) - len(faltan)} archivos desde la caché, {len(faltan)} por calcular")
+    if args.workers > 1 and len(faltan) > 1:
+        calculados = _en_pool(faltan, min(args.workers, len(faltan)), args.verificar, config)
+    else:
+        calculados = {t: procesar_archivo(*t, args.verificar, config) for t in faltan}
+    for t, r in sorted(calculados.items(), key=lambda kv: tareas.index(kv[0])):
+        if r["pico_mb"] is not None:
+            print(f"{t[0].name}: pico de memoria {r['pico_mb']:.1f} MB")
+        # Los archivos que fallaron se reintentan en la próxima corrida
+        if r["nac"] is not None:
+            guardar_cache(t[0], r, config)
+    resultados.update(calculados)
+    podar_cache([t[0] for t in tareas])
+
+    rows_nac, rows_city, rows_cubo, rows_ee_nac, rows_ee_city = [], [], [], [], []
+    for tarea in tareas:
+        r = resultados[tarea]
+        for aviso in r["avisos"]:
+            warnings.warn(f"{tarea[0].name}: {aviso}")
+        if r["verificacion"]:
+            print(r["verificacion"])
+        if r["nac"] is not None:
+            rows_nac.append(r["nac"])
+            rows_city.extend(r["ciudades"])
+            rows_cubo.extend(r.get("cubo", []))
+            rows_ee_nac.extend(r.get("ee_nac", []))
+            rows_ee_city.extend(r.get("ee_ciudades", []))
+
+    rows_nac, rows_city = con_series(rows_nac), con_series(rows_city, ["Ciudad"])
+
+    # ───────────── Guarda CSV ─────────────
+    pd.DataFrame(rows_nac).to_csv(OUT_DIR/"indicadores_nac.csv", index=False)
+    pd.DataFrame(rows_city).to_csv(OUT_DIR/"indicadores_ciudad.csv", index=False)
+    if args.bootstrap:
+        pd.DataFrame(rows_ee_nac).to_csv(OUT_DIR/"indicadores_nac_ee.csv", index=False)
+        pd.DataFrame(rows_ee_city).to_csv(OUT_DIR/"indicadores_ciudad_ee.csv", index=False)
+    if claves_cubo:
+        cubo = pd.DataFrame(rows_cubo)
+        cols = ["Año", "Periodo", *claves_cubo]
+        cubo[cols + [c for c in cubo.columns if c not in cols]].to_parquet(OUT_DIR/CUBO_ARCHIVO, index=False)
+    if args.subir:
+        subir(rows_nac, rows_city)
+
+if __name__ == "__main__":
+    main()
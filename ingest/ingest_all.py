@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+# ──────────────────────────────────────────────────────────────
+# Orquesta la ingesta completa:
+#   1) ingest_codigos.py  (carga diccionario_provincias y recarga el
+#      diccionario diccionario_geo que usan las vistas de cantones)
+#   2) ingest_vivienda.py e ingest_persona.py en paralelo
+# Cada cargador reparte además sus archivos entre INGEST_WORKERS
+# procesos. Sale con error si algún paso falla.
+# ──────────────────────────────────────────────────────────────
+import subprocess
+import sys
+from datetime import datetime
+
+PRIMERO   = ['ingest_codigos.py']
+PARALELOS = ['ingest_vivienda.py', 'ingest_persona.py']
+
+def log(msg: str):
+    ts = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+    print(f"[{ts} UTC] {msg}", flush=True)
+
+def lanzar(script: str) -> subprocess.Popen:
+    log(f"▶ {script}")
+    return subprocess.Popen([sys.executable, '-u', script])
+
+def main() -> int:
+    for script in PRIMERO:
+        rc = lanzar(script).wait()
+        if rc != 0:
+            log(f"[ERROR] {script} terminó con código {rc}")
+            return rc
+
+    procs = {script: lanzar(script) for script in PARALELOS}
+    rc_final = 0
+    for script, proc in procs.items():
+        rc = proc.wait()
+        if rc != 0:
+            log(f"[ERROR] {script} terminó con código {rc}")
+            rc_final = rc_final or rc
+    log("Ingesta completa." if rc_final == 0 else "Ingesta terminó con errores.")
+    return rc_final
+
+if __name__ == '__main__':
+    sys.exit(main())
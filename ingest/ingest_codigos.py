@@ -1,11 +1,13 @@
 #!/usr/bin/env python3
 import os
 import time
-import shutil
-import pandas as pd
 from pathlib import Path
 from clickhouse_driver import Client, errors
 from datetime import datetime
+from ingest_common import (
+    INGEST_WORKERS, append_csv_row, atomic_move, coerce_columns, ingest_csv, open_manifest,
+    run_workers, write_metrics
+)
 
 # ========= Parámetros generales =========
 MAX_RETRIES     = int(os.getenv('MAX_RETRIES', 12))
@@ -19,6 +21,8 @@ DATA_DIR        = os.getenv('CODIGOS_DIR', '/data/diccionario/unprocessed')
 PROCESSED_DIR   = os.getenv('PROCESSED_DIR_CODIGOS', '/data/diccionario/processed')
 DATABASE        = os.getenv('CH_DATABASE', 'indicadores')
 TABLE           = os.getenv('CH_TABLE', 'diccionario_provincias')
+# Diccionario de ClickHouse que sirve los nombres a las vistas (dictGet)
+DICCIONARIO     = os.getenv('CH_DICCIONARIO', 'diccionario_geo')
 
 def ensure_dirs():
     for d in (LOG_DIR, ERR_DIR, PROCESSED_DIR):
@@ -50,19 +54,76 @@ def get_ch_client():
 
 def write_failed_row(base, header, values):
     out = Path(ERR_DIR) / f"{base}_failed.csv"
-    write_header = not out.exists()
-    import csv
-    with out.open('a', newline='', encoding='utf-8') as f:
-        w = csv.writer(f, delimiter=';')
-        if write_header:
-            w.writerow(header)
-        w.writerow(values)
+    append_csv_row(out, header, values)
 
 def move_to_processed(path: Path):
-    dest = Path(PROCESSED_DIR) / path.name
-    shutil.move(str(path), str(dest))
+    atomic_move(path, Path(PROCESSED_DIR))
     log(f"→ Movido '{path.name}' a processed")
 
+def process_files(files, col_names, client=None, stop=None, manifest=None) -> bool:
+    """
+    Ingesta secuencial de `files`; devuelve False si STOP_ON_ERROR cortó.
+    `manifest` lo pasa quien ya lo tiene (el demonio); si falta se abre aquí.
+    """
+    if client is None:
+        client = get_ch_client()
+    # Hash de contenido + tokens de deduplicación: reintentos sin duplicar filas
+    if manifest is None:
+        manifest = open_manifest(client, DATABASE, TABLE)
+    for csvf in files:
+        if stop is not None and stop.is_set():
+            return False
+        log(f"Procesando {csvf.name}...")
+        # Todas las columnas del diccionario son texto
+        res = ingest_csv(
+            client, csvf, DATABASE, TABLE, col_names,
+            coerce=lambda df: coerce_columns(df, col_names),
+            on_failed_row=lambda vals: write_failed_row(f"{TABLE}_{csvf.stem}", col_names, vals),
+            stop_on_error=STOP_ON_ERROR, manifest=manifest,
+        )
+        # Tiempos por etapa, filas y round trips → LOG_DIR (JSONL + textfile de Prometheus)
+        write_metrics(LOG_DIR, TABLE, csvf, res)
+        if res.stopped:
+            if stop is not None:
+                stop.set()
+            return False
+
+        # Archivamos solo si todos los trozos se confirmaron (o si el CSV es
+        # ilegible desde el inicio, para no reintentarlo ciegamente)
+        if res.complete or res.unreadable:
+            move_to_processed(csvf)
+    return True
+
+def recargar_diccionario(client) -> bool:
+    """
+    Recarga DICCIONARIO para que las vistas lean los nombres recién cargados.
+    Devuelve False si no carga (p. ej. credenciales de fuente_diccionarios que
+    no coinciden con el servidor): indicadores_persona_canton fallaría en cada
+    dictGet, así que es mejor que la ingesta termine con error.
+    """
+    params = {'db': DATABASE, 'dic': DICCIONARIO}
+    existe = client.execute(
+        "SELECT 1 FROM system.dictionaries WHERE database=%(db)s AND name=%(dic)s", params
+    )
+    if not existe:
+        log(f"[WARN] No existe el diccionario {DATABASE}.{DICCIONARIO} "
+            "(¿falta migraciones/002_diccionario_geo.sql?)")
+        return True
+    try:
+        client.execute(f"SYSTEM RELOAD DICTIONARY {DATABASE}.{DICCIONARIO}")
+    except errors.ServerException as e:
+        log(f"[ERROR] No se pudo recargar {DATABASE}.{DICCIONARIO}: {e}")
+        return False
+    estado, n, error = client.execute(
+        "SELECT toString(status), element_count, last_exception FROM system.dictionaries "
+        "WHERE database=%(db)s AND name=%(dic)s", params
+    )[0]
+    if estado != 'LOADED':
+        log(f"[ERROR] Diccionario {DICCIONARIO} en estado {estado}: {error}")
+        return False
+    log(f"[OK] Diccionario {DICCIONARIO} recargado ({n} códigos)")
+    return True
+
 def main():
     ensure_dirs()
     client = get_ch_client()
@@ -79,53 +140,16 @@ def main():
     col_names = [r[0] for r in cols_meta]
     log(f"Columnas destino {TABLE}: {col_names}")
 
-    for csvf in Path(DATA_DIR).glob('*.csv'):
-        log(f"Procesando {csvf.name}...")
-        try:
-            df = pd.read_csv(csvf, sep=';', dtype={c: str for c in col_names}, low_memory=False)
-        except Exception as e:
-            log(f"[ERROR] Lectura {csvf.name}: {e}")
-            # Movemos incluso los que fallan en lectura para no reintentarlos ciegamente
-            move_to_processed(csvf)
-            continue
-
-        df = df.where(pd.notnull(df), None)
-        batch = [[row.get(c) for c in col_names] for _, row in df.iterrows()]
-        success = False
-
-        try:
-            client.execute(
-                f"INSERT INTO {DATABASE}.{TABLE} ({','.join(col_names)}) VALUES",
-                batch
-            )
-            log(f"→ Insertadas {len(batch)} filas.")
-            success = True
-
-        except Exception as e:
-            log(f"[FAIL BATCH] {e}")
-            ok = 0
-            fail = 0
-            for i, vals in enumerate(batch, 1):
-                try:
-                    client.execute(
-                        f"INSERT INTO {DATABASE}.{TABLE} ({','.join(col_names)}) VALUES",
-                        [vals]
-                    )
-                    ok += 1
-                except Exception as ex:
-                    fail += 1
-                    log(f"[FAIL fila {i}] {ex}")
-                    write_failed_row(f"{TABLE}_{csvf.stem}", col_names, vals)
-                    if STOP_ON_ERROR:
-                        return
-            log(f"→ {ok} OK, {fail} fallidas.")
-            # Considerar éxito parcial como motivo para archivar
-            success = True
-
-        # Si todo ok (o parcial), movemos el CSV para no reprocesarlo
-        if success:
-            move_to_processed(csvf)
+    files = sorted(Path(DATA_DIR).glob('*.csv'))
+    if INGEST_WORKERS > 1:
+        # Cada proceso abre su propia conexión con get_ch_client()
+        if not run_workers(process_files, files, INGEST_WORKERS, col_names):
+            return
+    elif not process_files(files, col_names, client):
+        return
 
+    if not recargar_diccionario(client):
+        raise SystemExit(1)
     log("Proceso completado codigos_vivienda_inec.")
 
 if __name__ == '__main__':
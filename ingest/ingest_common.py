@@ -0,0 +1,800 @@
+#!/usr/bin/env python3
+# ──────────────────────────────────────────────────────────────
+# Utilidades compartidas por los cargadores (persona, vivienda y
+# códigos): coerción de tipos por columnas completas e inserción
+# en ClickHouse como bloques columnares. La lectura es por trozos
+# (CHUNK_ROWS) y se solapa con la inserción del trozo anterior.
+# ──────────────────────────────────────────────────────────────
+import csv
+import fcntl
+import hashlib
+import multiprocessing as mp
+import os
+import json
+import queue
+import resource
+import shutil
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from clickhouse_driver import errors as ch_errors
+
+# Filas por trozo al leer un CSV (0 = archivo completo en un solo bloque)
+CHUNK_ROWS  = int(os.getenv('CHUNK_ROWS', 100000))
+# Trozos ya convertidos que pueden esperar en cola a ser insertados
+QUEUE_DEPTH = int(os.getenv('QUEUE_DEPTH', 2))
+# Procesos por cargador; cada uno abre su propia conexión a ClickHouse
+INGEST_WORKERS = int(os.getenv('INGEST_WORKERS', 1))
+
+# Sentinelas (mismos valores que usan los cargadores)
+SENTINEL_INT    = -404
+SENTINEL_FLOAT  = -404.0
+SENTINEL_STRING = "-404"
+
+# Fallas de conexión: no dicen nada de los datos, no se bisecan
+TRANSIENT_ERRORS = (ch_errors.NetworkError, ch_errors.SocketTimeoutError,
+                    ConnectionError, TimeoutError, EOFError)
+
+# Enteros con más dígitos que esto pueden desbordar int64 (Int128 en destino)
+_MAX_INT64_DIGITS = 18
+
+
+def _fill(values: np.ndarray, valid: np.ndarray, null_value) -> list:
+    """Devuelve una lista Python con `null_value` donde `valid` es False."""
+    out = values.astype(object)
+    out[~valid] = null_value
+    return out.tolist()
+
+
+def _as_text(s: pd.Series) -> pd.Series:
+    # Garantiza acceso .str aunque la columna venga con otro dtype
+    if s.dtype != object and not pd.api.types.is_string_dtype(s):
+        s = s.astype(object).where(s.notna(), None)
+        s = s.map(lambda v: v if v is None else str(v))
+    return s
+
+
+def coerce_float_column(s: pd.Series, use_sentinels: bool) -> list:
+    null = SENTINEL_FLOAT if use_sentinels else None
+    if pd.api.types.is_numeric_dtype(s) and not pd.api.types.is_bool_dtype(s):
+        # Columna ya tipada (Parquet): sin pasar por texto
+        num = s.to_numpy(dtype='float64', na_value=np.nan)
+        return _fill(num, ~np.isnan(num), null)
+    txt = _as_text(s).str.replace(' ', '', regex=False).str.replace(',', '.', regex=False)
+    num = pd.to_numeric(txt, errors='coerce').astype('float64').to_numpy()
+    return _fill(num, ~np.isnan(num), null)
+
+
+def coerce_int_column(s: pd.Series, use_sentinels: bool) -> list:
+    null = SENTINEL_INT if use_sentinels else None
+    if pd.api.types.is_integer_dtype(s):
+        # Columna ya tipada (Parquet, enteros con nulos como Int32/Int64)
+        valid = s.notna().to_numpy(dtype=bool)
+        return _fill(s.to_numpy(dtype='int64', na_value=0), valid, null)
+    txt = _as_text(s).str.strip()
+    valid = txt.str.fullmatch(r'-?[0-9]+').fillna(False).to_numpy(dtype=bool)
+    out = np.full(len(txt), null, dtype=object)
+    if not valid.any():
+        return out.tolist()
+    long_ = valid & (txt.str.len().fillna(0).to_numpy() > _MAX_INT64_DIGITS)
+    short = valid & ~long_
+    if short.any():
+        # Ya validados por la regex: conversión directa, sin to_numeric
+        out[short] = txt[short].to_numpy(dtype=object).astype(np.int64).astype(object)
+    if long_.any():
+        # Identificadores largos (Int128): conversión exacta con int()
+        out[long_] = [int(v) for v in txt[long_]]
+    return out.tolist()
+
+
+def coerce_string_column(s: pd.Series, use_sentinels: bool,
+                         zfill: int = 0, strip: bool = False) -> list:
+    null = SENTINEL_STRING if use_sentinels else None
+    txt = _as_text(s)
+    stripped = txt.str.strip()
+    valid = (stripped.fillna('') != '').to_numpy(dtype=bool)
+    if zfill:
+        txt = stripped.str.zfill(zfill)
+    elif strip:
+        txt = stripped
+    return _fill(txt.to_numpy(dtype=object), valid, null)
+
+
+def coerce_columns(df: pd.DataFrame, col_names, float_cols=(), int_cols=(),
+                   use_sentinels=False, strip_strings=False):
+    """
+    Convierte `df` (leído como texto) a una lista de columnas en el orden de
+    `col_names`, con las mismas reglas que `coerce_value` aplica celda a celda:
+    coma decimal en flotantes, `ciudad` rellena a 6 dígitos y sentinelas
+    opcionales para valores vacíos o inválidos. Toda columna que no sea
+    flotante ni entera se trata como texto.
+    """
+    n = len(df)
+    columns = []
+    for col in col_names:
+        s = df[col] if col in df.columns else pd.Series([None] * n, index=df.index, dtype=object)
+        if col in float_cols:
+            columns.append(coerce_float_column(s, use_sentinels))
+        elif col in int_cols:
+            columns.append(coerce_int_column(s, use_sentinels))
+        else:
+            zfill = 6 if col == 'ciudad' else 0
+            columns.append(coerce_string_column(s, use_sentinels, zfill=zfill, strip=strip_strings))
+    return columns
+
+
+def insert_columns(client, database: str, table: str, col_names, columns,
+                   settings=None, dedup_token=None):
+    # Con token, ClickHouse descarta el bloque si ya lo recibió antes
+    # (requiere non_replicated_deduplication_window > 0 en la tabla)
+    if dedup_token:
+        settings = dict(settings or {}, insert_deduplication_token=dedup_token)
+    client.execute(
+        f"INSERT INTO {database}.{table} ({', '.join(col_names)}) VALUES",
+        columns,
+        columnar=True,
+        settings=settings,
+    )
+
+
+def log(msg: str):
+    ts = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+    print(f"[{ts} UTC] {msg}", flush=True)
+
+
+# ========= Archivos compartidos entre procesos =========
+def append_csv_row(out_path: Path, header, values):
+    """Agrega una fila a un CSV de errores bajo flock (varios procesos escriben)."""
+    with out_path.open('a', newline='', encoding='utf-8') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            w = csv.writer(f, delimiter=';')
+            if f.tell() == 0:
+                w.writerow(header)
+            w.writerow(values)
+            f.flush()
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def atomic_move(path: Path, dest_dir: Path) -> Path:
+    """
+    Mueve `path` a `dest_dir` sin que aparezca a medio copiar: unprocessed y
+    processed son volúmenes distintos, así que se copia a un temporal en el
+    destino, se renombra (atómico) y recién entonces se borra el original.
+    """
+    dest = Path(dest_dir) / path.name
+    try:
+        os.replace(path, dest)
+        return dest
+    except OSError:
+        pass
+    tmp = dest.with_name(f".{dest.name}.{os.getpid()}.part")
+    shutil.copy2(str(path), str(tmp))
+    os.replace(tmp, dest)
+    path.unlink()
+    return dest
+
+
+# ========= Esquema destino =========
+# Columnas MATERIALIZED/ALIAS (anio, provincia, ...) las calcula el servidor
+SOLO_INSERTABLES = "default_kind NOT IN ('MATERIALIZED', 'ALIAS')"
+
+
+class SchemaCache:
+    """
+    Columnas de inserción por tabla (nombre y tipo), cacheadas. Solo se
+    vuelve a leer system.columns cuando cambia metadata_modification_time
+    de la tabla.
+    """
+
+    def __init__(self):
+        self._cache = {}
+
+    def columns(self, client, database: str, table: str):
+        return list(self._types(client, database, table))
+
+    def column_types(self, client, database: str, table: str) -> dict:
+        """nombre → tipo ClickHouse, como ingest_directo.fetch_column_types."""
+        return dict(self._types(client, database, table))
+
+    def _types(self, client, database: str, table: str) -> dict:
+        mtime = client.execute(
+            "SELECT metadata_modification_time FROM system.tables "
+            "WHERE database=%(db)s AND name=%(tbl)s",
+            {'db': database, 'tbl': table}
+        )
+        mtime = mtime[0][0] if mtime else None
+        cached = self._cache.get((database, table))
+        if cached and cached[0] == mtime:
+            return cached[1]
+        rows = client.execute(
+            "SELECT name, type FROM system.columns "
+            "WHERE database=%(db)s AND table=%(tbl)s "
+            f"AND {SOLO_INSERTABLES} "
+            "ORDER BY position",
+            {'db': database, 'tbl': table}
+        )
+        types = dict(rows)
+        self._cache[(database, table)] = (mtime, types)
+        log(f"Esquema {database}.{table} ({'actualizado' if cached else 'cargado'}): {len(types)} columnas")
+        return types
+
+
+# ========= Manifiesto de ingesta =========
+USE_MANIFEST   = os.getenv('USE_MANIFEST', 'true').lower() in ('1', 'true', 'yes')
+MANIFEST_TABLE = os.getenv('MANIFEST_TABLE', 'ingest_manifest')
+DEDUP_WINDOW   = int(os.getenv('DEDUP_WINDOW', 10000))
+
+
+def file_hash(path: Path, block: int = 1 << 20) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    with path.open('rb') as f:
+        for buf in iter(lambda: f.read(block), b''):
+            h.update(buf)
+    return h.hexdigest()
+
+
+class Manifest:
+    """
+    Registro en ClickHouse de cada archivo ingerido: hash de contenido, tabla
+    destino, filas, trozos confirmados y estado ('en_curso' | 'completo').
+    Permite saltar archivos ya cargados y retomar uno a medias sin duplicar.
+    """
+
+    def __init__(self, client, database: str):
+        self.client = client
+        self.database = database
+        self.table = f"{database}.{MANIFEST_TABLE}"
+        client.execute(f"""
+            CREATE TABLE IF NOT EXISTS {self.table} (
+                file_name     String,
+                content_hash  String,
+                target_table  String,
+                row_count     UInt64,
+                chunk_rows    UInt32,
+                chunks_done   UInt32,
+                status        LowCardinality(String),
+                updated_at    DateTime64(3)
+            )
+            ENGINE = ReplacingMergeTree(updated_at)
+            ORDER BY (target_table, content_hash)
+        """)
+
+    def ensure_dedup_window(self, table: str):
+        """Activa la deduplicación de bloques en una tabla MergeTree no replicada."""
+        engine = self.client.execute(
+            "SELECT engine_full FROM system.tables WHERE database=%(db)s AND name=%(tbl)s",
+            {'db': self.database, 'tbl': table}
+        )
+        if engine and 'non_replicated_deduplication_window' not in engine[0][0]:
+            self.client.execute(
+                f"ALTER TABLE {self.database}.{table} "
+                f"MODIFY SETTING non_replicated_deduplication_window = {DEDUP_WINDOW}"
+            )
+
+    def lookup(self, target_table: str, content_hash: str):
+        rows = self.client.execute(
+            f"SELECT status, chunks_done, chunk_rows, row_count FROM {self.table} FINAL "
+            "WHERE target_table=%(t)s AND content_hash=%(h)s",
+            {'t': target_table, 'h': content_hash}
+        )
+        return rows[0] if rows else None
+
+    def record(self, file_name, target_table, content_hash, row_count,
+               chunk_rows, chunks_done, status):
+        self.client.execute(
+            f"INSERT INTO {self.table} VALUES",
+            [(file_name, content_hash, target_table, row_count, chunk_rows,
+              chunks_done, status, datetime.utcnow())]
+        )
+
+
+def open_manifest(client, database: str, table: str):
+    """Manifiesto listo para `table` (o None si USE_MANIFEST está desactivado)."""
+    if not USE_MANIFEST:
+        return None
+    manifest = Manifest(client, database)
+    manifest.ensure_dedup_window(table)
+    return manifest
+
+
+# ========= Procesos en paralelo =========
+def split_files(files, workers: int):
+    """Reparte archivos entre `workers` listas equilibradas por tamaño en disco."""
+    buckets = [[] for _ in range(max(1, workers))]
+    loads = [0] * len(buckets)
+    for f in sorted(files, key=lambda p: p.stat().st_size, reverse=True):
+        i = loads.index(min(loads))
+        buckets[i].append(f)
+        loads[i] += f.stat().st_size
+    # Dentro de cada proceso se respeta el orden por nombre (periodo)
+    return [sorted(b) for b in buckets if b]
+
+
+def _worker_main(target, files, stop, args):
+    ok = target(files, *args, stop=stop)
+    raise SystemExit(0 if ok else 2)
+
+
+def run_workers(target, files, workers: int, *args) -> bool:
+    """
+    Ejecuta `target(files, *args, stop=Event)` en hasta `workers` procesos,
+    cada uno dueño de un subconjunto de archivos. `target` devuelve False si
+    tuvo que parar (STOP_ON_ERROR); entonces marca `stop` y los demás procesos
+    terminan tras su archivo en curso. Devuelve True si todos terminaron bien.
+    """
+    groups = split_files(files, workers)
+    if len(groups) <= 1:
+        return target(groups[0] if groups else [], *args, stop=None)
+
+    stop = mp.Event()
+    procs = [
+        mp.Process(target=_worker_main, args=(target, g, stop, args), name=f"ingest-{i}")
+        for i, g in enumerate(groups)
+    ]
+    log(f"Ingesta paralela: {len(procs)} procesos para {len(files)} archivos")
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    failed = [p.name for p in procs if p.exitcode != 0]
+    if failed:
+        log(f"[WARN] Procesos con error o detenidos: {', '.join(failed)}")
+    return not failed
+
+
+# ========= Lectura por trozos =========
+# Formatos que dejan las limpiezas en unprocessed (STAGING_FORMAT)
+STAGED_SUFFIXES = ('.csv', '.parquet')
+
+
+def staged_files(data_dir) -> list:
+    """Archivos pendientes de `data_dir` (CSV o Parquet), en orden de nombre."""
+    if not Path(data_dir).is_dir():
+        return []
+    return sorted(p for p in Path(data_dir).iterdir() if p.suffix.lower() in STAGED_SUFFIXES)
+
+
+def _nullable_int(dtype):
+    # Enteros Arrow con nulos → enteros pandas con nulos (no float64)
+    import pyarrow as pa
+    if pa.types.is_integer(dtype):
+        return pd.api.types.pandas_dtype(dtype.to_pandas_dtype().__name__.capitalize()
+                                         .replace('Uint', 'UInt'))
+    return None
+
+
+def read_parquet_chunks(path: Path, chunk_rows: int = CHUNK_ROWS, columns=None):
+    """
+    Iterador de DataFrames tipados desde un Parquet de staging, leyendo solo
+    las `columns` que existen en el archivo (las demás quedan nulas en
+    coerce_columns). Con chunk_rows=0 entrega el archivo entero.
+    """
+    import pyarrow.parquet as pq
+    pf = pq.ParquetFile(path)
+    names = set(pf.schema_arrow.names)
+    cols = [c for c in columns if c in names] if columns is not None else None
+    if chunk_rows and chunk_rows > 0:
+        return (b.to_pandas(types_mapper=_nullable_int)
+                for b in pf.iter_batches(batch_size=chunk_rows, columns=cols))
+    return iter([pf.read(columns=cols).to_pandas(types_mapper=_nullable_int)])
+
+
+def read_csv_chunks(path: Path, chunk_rows: int = CHUNK_ROWS, **read_kw):
+    """Iterador de DataFrames de texto; con chunk_rows=0 entrega el archivo entero."""
+    kw = dict(sep=';', dtype=str, header=0)
+    kw.update(read_kw)
+    if chunk_rows and chunk_rows > 0:
+        return pd.read_csv(path, chunksize=chunk_rows, **kw)
+    return iter([pd.read_csv(path, low_memory=False, **kw)])
+
+
+class _ProducerError:
+    def __init__(self, exc: BaseException):
+        self.exc = exc
+
+
+_END = object()
+
+
+def iter_coerced_chunks(chunks, coerce, queue_depth: int = QUEUE_DEPTH, skip: int = 0,
+                        stats=None):
+    """
+    Productor/consumidor: un hilo lee y convierte los trozos mientras el
+    llamador inserta el anterior. La cola acotada limita cuántos bloques
+    conviven en memoria. Entrega (n_trozo, n_filas, columnas); los primeros
+    `skip` trozos (ya confirmados) llegan sin convertir, con columnas None.
+    Con `stats` (un IngestResult) acumula los segundos de lectura y de
+    conversión.
+    """
+    q = queue.Queue(maxsize=max(1, queue_depth))
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def producer():
+        try:
+            it, idx = iter(chunks), 0
+            while True:
+                t0 = time.perf_counter()
+                try:
+                    df = next(it)
+                except StopIteration:
+                    break
+                t1 = time.perf_counter()
+                n = len(df)
+                columns = coerce(df) if idx >= skip else None
+                del df
+                if stats is not None:
+                    stats.secs_read += t1 - t0
+                    stats.secs_coerce += time.perf_counter() - t1
+                if not put((idx, n, columns)):
+                    return
+                idx += 1
+            put(_END)
+        except BaseException as e:  # se re-lanza en el consumidor
+            put(_ProducerError(e))
+        finally:
+            close = getattr(chunks, 'close', None)
+            if close:
+                close()
+
+    t = threading.Thread(target=producer, name='csv-reader', daemon=True)
+    t.start()
+    try:
+        while True:
+            item = q.get()
+            if item is _END:
+                break
+            if isinstance(item, _ProducerError):
+                raise item.exc
+            yield item
+    finally:
+        stop.set()
+        t.join()
+
+
+# ========= Ingesta de un archivo =========
+@dataclass
+class IngestResult:
+    ok: int = 0            # filas insertadas
+    failed: int = 0        # filas rechazadas (van a write_failed_row)
+    blocks: int = 0        # trozos procesados
+    skipped: bool = False  # ya estaba completo según el manifiesto
+    complete: bool = False # todos los trozos confirmados
+    unreadable: bool = False  # no se pudo leer ni un trozo
+    stopped: bool = False  # STOP_ON_ERROR cortó el archivo
+    # Métricas por etapa (ver write_metrics)
+    secs_read: float = 0.0
+    secs_coerce: float = 0.0
+    secs_insert: float = 0.0
+    secs_fallback: float = 0.0
+    secs_total: float = 0.0
+    bytes_read: int = 0
+    round_trips: int = 0
+    peak_rss_mb: float = 0.0
+
+
+class _CountingClient:
+    """Envoltorio del cliente que cuenta idas y vueltas a ClickHouse en `res`."""
+
+    def __init__(self, client, res: IngestResult):
+        self._client = client
+        self._res = res
+
+    def execute(self, *args, **kwargs):
+        self._res.round_trips += 1
+        return self._client.execute(*args, **kwargs)
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss viene en KB en Linux: pico del proceso hasta ahora
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _finish(res: IngestResult, t_start: float) -> IngestResult:
+    res.secs_total = time.perf_counter() - t_start
+    res.peak_rss_mb = peak_rss_mb()
+    return res
+
+
+def block_token(token_base, start: int, end: int):
+    """Token determinista para las filas [start, end) de un archivo."""
+    return f"{token_base}:{start}-{end}" if token_base else None
+
+
+def insert_bisect(client, database, table, col_names, columns, name, offset,
+                  on_failed_row, stop_on_error, res: IngestResult, error=None,
+                  token_base=None):
+    """
+    Bloque rechazado: lo parte a la mitad y reintenta cada mitad, recursivamente,
+    hasta aislar las filas culpables. Las mitades sanas entran como un solo
+    bloque; solo las filas que fallan solas van a `on_failed_row`.
+    Devuelve False si STOP_ON_ERROR pide parar. Con `token_base`, cada
+    sub-bloque lleva un token de deduplicación según su rango de filas.
+    """
+    n = len(columns[0]) if columns else 0
+    if n == 1:
+        res.failed += 1
+        log(f"[FAIL] {name} fila {offset + 1}: {error}")
+        on_failed_row([c[0] for c in columns])
+        return not stop_on_error
+
+    mid = n // 2
+    for lo, hi in ((0, mid), (mid, n)):
+        part = [c[lo:hi] for c in columns]
+        try:
+            insert_columns(client, database, table, col_names, part,
+                           dedup_token=block_token(token_base, offset + lo, offset + hi))
+            res.ok += hi - lo
+        except TRANSIENT_ERRORS:
+            raise
+        except Exception as e:
+            if not insert_bisect(client, database, table, col_names, part, name,
+                                 offset + lo, on_failed_row, stop_on_error, res, e,
+                                 token_base):
+                return False
+    return True
+
+
+def insert_block(client, database, table, col_names, columns, name, idx, offset,
+                 on_failed_row, stop_on_error, res: IngestResult, token_base=None) -> bool:
+    """Inserta un trozo; si ClickHouse lo rechaza, aísla las filas malas por bisección."""
+    n = len(columns[0]) if columns else 0
+    t0 = time.perf_counter()
+    try:
+        insert_columns(client, database, table, col_names, columns,
+                       dedup_token=block_token(token_base, offset, offset + n))
+        res.ok += n
+        return True
+    except TRANSIENT_ERRORS:
+        raise
+    except Exception as e:
+        error = e
+    finally:
+        res.secs_insert += time.perf_counter() - t0
+
+    log(f"[FAIL- BATCH] {name} trozo {idx}: {error}")
+    t0 = time.perf_counter()
+    try:
+        return insert_bisect(client, database, table, col_names, columns, name, offset,
+                             on_failed_row, stop_on_error, res, error, token_base)
+    finally:
+        res.secs_fallback += time.perf_counter() - t0
+
+
+def ingest_csv(client, path: Path, database: str, table: str, col_names, coerce,
+               on_failed_row, stop_on_error=False, chunk_rows=CHUNK_ROWS,
+               queue_depth=QUEUE_DEPTH, manifest: Manifest = None, direct=None,
+               **read_kw) -> IngestResult:
+    """
+    Lee `path` por trozos, convierte cada trozo con `coerce(df)` en un hilo
+    aparte e inserta cada bloque columnar. `complete` solo queda en True
+    cuando todos los trozos se confirmaron en ClickHouse.
+
+    Con `manifest`, el archivo se identifica por su hash: si ya está completo
+    no se vuelve a insertar, y si quedó a medias se retoma desde el primer
+    trozo sin confirmar. Cada bloque lleva un token de deduplicación derivado
+    del hash y su rango de filas, así un reintento nunca duplica filas.
+    Sin manifiesto el token es único por corrida: las tablas tienen
+    non_replicated_deduplication_window, y un bloque sin token se
+    deduplicaría por su contenido (dos bloques iguales legítimos, uno perdido).
+
+    Con `direct` (ver ingest_directo.DirectCsv), los trozos viajan como bytes
+    CSV y los convierte el servidor; solo un trozo rechazado pasa por pandas.
+    Un `.parquet` de staging se lee con Arrow, solo con las columnas destino.
+    """
+    t_start = time.perf_counter()
+    res = IngestResult()
+    client = _CountingClient(client, res)
+    content_hash = token_base = None
+    skip = 0
+    if manifest is not None:
+        content_hash = file_hash(path)
+        res.bytes_read += path.stat().st_size
+        token_base = content_hash
+        prev = manifest.lookup(table, content_hash)
+        res.round_trips += 1
+        if prev and prev[0] == 'completo':
+            log(f"→ {path.name} ya ingerido ({prev[3]} filas, hash {content_hash}); se omite.")
+            res.complete = res.skipped = True
+            return _finish(res, t_start)
+        if prev:
+            # Mismo tamaño de trozo que la vez anterior: tokens idénticos
+            skip, chunk_rows = prev[1], prev[2] or chunk_rows
+            log(f"→ Retomando {path.name} desde el trozo {skip} ({chunk_rows} filas/trozo)")
+    else:
+        token_base = f"{path.name}:{uuid.uuid4().hex}"
+
+    try:
+        if path.suffix.lower() == '.parquet':
+            # Staging tipado: ya viene sin texto que parsear, solo las columnas destino
+            chunks, prepare = read_parquet_chunks(path, chunk_rows, col_names), coerce
+            direct = None
+        elif direct is not None:
+            chunks, prepare = direct.segments(path, chunk_rows), direct.prepare
+        else:
+            chunks, prepare = read_csv_chunks(path, chunk_rows, **read_kw), coerce
+        res.bytes_read += path.stat().st_size
+    except Exception as e:
+        log(f"[ERROR] No pude leer {path.name}: {e}")
+        res.unreadable = True
+        return _finish(res, t_start)
+
+    offset = 0
+    try:
+        for idx, n, payload in iter_coerced_chunks(chunks, prepare, queue_depth, skip, res):
+            if payload is None:  # trozo ya confirmado en una ejecución anterior
+                offset += n
+                res.blocks += 1
+                continue
+            columns = payload
+            if direct is not None:
+                columns = None
+                t0 = time.perf_counter()
+                try:
+                    res.round_trips += 1
+                    direct.send(payload, block_token(token_base, offset, offset + n))
+                    res.ok += n
+                except TRANSIENT_ERRORS:
+                    raise
+                except Exception as e:
+                    # El servidor rechazó el trozo: camino Python solo para él
+                    log(f"[WARN] {path.name} trozo {idx} rechazado en modo directo: {e}")
+                    t1 = time.perf_counter()
+                    columns = coerce(direct.to_frame(payload, **read_kw))
+                    res.secs_fallback += time.perf_counter() - t1
+                    t0 += time.perf_counter() - t1
+                finally:
+                    res.secs_insert += time.perf_counter() - t0
+            if columns is not None and not insert_block(
+                    client, database, table, col_names, columns, path.name, idx, offset,
+                    on_failed_row, stop_on_error, res, token_base):
+                res.stopped = True
+                return _finish(res, t_start)
+            offset += n
+            res.blocks += 1
+            if manifest is not None:
+                manifest.record(path.name, table, content_hash, offset,
+                                chunk_rows, res.blocks, 'en_curso')
+                res.round_trips += 1
+    except TRANSIENT_ERRORS as e:
+        # Sin conexión: el archivo queda en unprocessed y se retoma después
+        log(f"[ERROR] Conexión perdida en {path.name} tras {offset} filas: {e}")
+        return _finish(res, t_start)
+    except Exception as e:
+        log(f"[ERROR] Lectura de {path.name} interrumpida tras {offset} filas: {e}")
+        res.unreadable = offset == 0
+        return _finish(res, t_start)
+
+    res.complete = True
+    if manifest is not None:
+        manifest.record(path.name, table, content_hash, offset, chunk_rows, res.blocks, 'completo')
+        res.round_trips += 1
+    log(f"→ {path.name}: {res.ok} filas OK, {res.failed} fallidas en {res.blocks} trozos.")
+    return _finish(res, t_start)
+
+
+# ========= Métricas por archivo =========
+INGEST_METRICS = os.getenv('INGEST_METRICS', 'true').lower() in ('1', 'true', 'yes')
+METRICS_JSONL  = os.getenv('METRICS_JSONL', 'ingest_metrics.jsonl')
+METRICS_PROM   = os.getenv('METRICS_PROM', 'ingest.prom')
+
+_STAGES = ('read', 'coerce', 'insert', 'fallback')
+_PROM = [
+    # (métrica, tipo, ayuda, clave en el estado)
+    ('enemdu_ingest_files_total', 'counter', 'Archivos procesados', 'files'),
+    ('enemdu_ingest_rows_total', 'counter', 'Filas leídas (insertadas + fallidas)', 'rows'),
+    ('enemdu_ingest_rows_failed_total', 'counter', 'Filas rechazadas', 'failed'),
+    ('enemdu_ingest_bytes_read_total', 'counter', 'Bytes leídos de disco', 'bytes'),
+    ('enemdu_ingest_round_trips_total', 'counter', 'Idas y vueltas a ClickHouse', 'round_trips'),
+    ('enemdu_ingest_last_rows_per_second', 'gauge', 'Filas/s del último archivo', 'last_rows_s'),
+    ('enemdu_ingest_last_file_timestamp_seconds', 'gauge', 'Fin del último archivo', 'last_ts'),
+    ('enemdu_ingest_peak_rss_bytes', 'gauge', 'Pico de memoria de un cargador', 'peak_rss'),
+]
+
+
+def file_status(res: IngestResult) -> str:
+    if res.skipped:
+        return 'omitido'
+    if res.stopped:
+        return 'detenido'
+    if res.complete:
+        return 'completo'
+    return 'ilegible' if res.unreadable else 'incompleto'
+
+
+def metrics_record(table: str, path: Path, res: IngestResult) -> dict:
+    rows = res.ok + res.failed
+    return {
+        'ts': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+        'table': table,
+        'file': path.name,
+        'status': file_status(res),
+        'rows_in': rows,
+        'rows_ok': res.ok,
+        'rows_failed': res.failed,
+        'blocks': res.blocks,
+        'bytes_read': res.bytes_read,
+        'round_trips': res.round_trips,
+        **{f'secs_{st}': round(getattr(res, f'secs_{st}'), 4) for st in _STAGES},
+        'secs_total': round(res.secs_total, 4),
+        'rows_per_s': round(rows / res.secs_total, 1) if res.secs_total else 0.0,
+        'peak_rss_mb': round(res.peak_rss_mb, 1),
+        'pid': os.getpid(),
+    }
+
+
+def _render_prom(state: dict) -> str:
+    lines = []
+    for name, kind, help_, key in _PROM:
+        lines += [f"# HELP {name} {help_}.", f"# TYPE {name} {kind}"]
+        lines += [f'{name}{{table="{t}"}} {v[key]}' for t, v in sorted(state.items())]
+    name = 'enemdu_ingest_stage_seconds_total'
+    lines += [f"# HELP {name} Segundos por etapa (read, coerce, insert, fallback).",
+              f"# TYPE {name} counter"]
+    for t, v in sorted(state.items()):
+        lines += [f'{name}{{table="{t}",stage="{st}"}} {v["secs"][st]:.4f}' for st in _STAGES]
+    return '\n'.join(lines) + '\n'
+
+
+def write_metrics(log_dir, table: str, path: Path, res: IngestResult):
+    """
+    Agrega una línea JSON por archivo a LOG_DIR/METRICS_JSONL y actualiza
+    LOG_DIR/METRICS_PROM (formato del textfile collector de node_exporter)
+    con los acumulados por tabla. Varios procesos comparten los archivos
+    bajo flock; una falla aquí solo se registra, nunca corta la ingesta.
+    """
+    if not INGEST_METRICS:
+        return
+    log_dir = Path(log_dir)
+    rec = metrics_record(table, path, res)
+    try:
+        with (log_dir / '.ingest_metrics.lock').open('a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                with (log_dir / METRICS_JSONL).open('a', encoding='utf-8') as f:
+                    f.write(json.dumps(rec, ensure_ascii=False) + '\n')
+
+                # Acumulados persistentes: los contadores no se reinician entre corridas
+                state_path = log_dir / '.ingest_metrics_state.json'
+                state = json.loads(state_path.read_text()) if state_path.exists() else {}
+                t = state.setdefault(table, {
+                    'files': 0, 'rows': 0, 'failed': 0, 'bytes': 0, 'round_trips': 0,
+                    'last_rows_s': 0.0, 'last_ts': 0, 'peak_rss': 0,
+                    'secs': {st: 0.0 for st in _STAGES},
+                })
+                t['files'] += 1
+                t['rows'] += rec['rows_in']
+                t['failed'] += rec['rows_failed']
+                t['bytes'] += rec['bytes_read']
+                t['round_trips'] += rec['round_trips']
+                for st in _STAGES:
+                    t['secs'][st] += rec[f'secs_{st}']
+                if not res.skipped:
+                    t['last_rows_s'] = rec['rows_per_s']
+                    t['last_ts'] = int(time.time())
+                t['peak_rss'] = max(t['peak_rss'], int(res.peak_rss_mb * 1024 * 1024))
+                state_path.write_text(json.dumps(state))
+
+                tmp = log_dir / f".{METRICS_PROM}.{os.getpid()}.tmp"
+                tmp.write_text(_render_prom(state))
+                os.replace(tmp, log_dir / METRICS_PROM)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+    except (OSError, ValueError) as e:
+        log(f"[WARN] No pude escribir métricas en {log_dir}: {e}")
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# ──────────────────────────────────────────────────────────────
+# Modo demonio: vigila los directorios unprocessed/ de diccionario,
+# vivienda y persona e ingiere cada CSV (o Parquet) apenas termina de escribirse.
+#   - una sola conexión a ClickHouse durante toda la vida del proceso
+#   - tras cargar códigos se recarga diccionario_geo (LIFETIME(0)) antes de
+#     seguir con persona; si la recarga falla se reintenta en cada ciclo
+#   - esquema de cada tabla cacheado (se relee solo si cambia); el
+#     manifiesto se abre una vez por tabla, no en cada archivo
+#   - notificaciones del sistema de archivos con watchdog si está
+#     instalado; si no, sondeo cada POLL_INTERVAL segundos
+# ──────────────────────────────────────────────────────────────
+import os
+import signal
+import threading
+import time
+from pathlib import Path
+
+import ingest_codigos
+import ingest_persona
+import ingest_vivienda
+from ingest_common import STAGED_SUFFIXES, SchemaCache, log, open_manifest, staged_files
+from ingest_directo import DIRECT_CSV
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # dependencia opcional
+    FileSystemEventHandler = object
+    Observer = None
+
+# ========= Parámetros =========
+POLL_INTERVAL   = float(os.getenv('POLL_INTERVAL', 2))     # segundos entre revisiones
+RESCAN_INTERVAL = float(os.getenv('RESCAN_INTERVAL', 60))  # barrido completo aun con watchdog
+STABLE_SECS     = float(os.getenv('STABLE_SECS', 1))       # sin cambios → archivo completo
+
+# Orden de ingesta en cada ciclo: códigos antes que persona (vista de cantones).
+# El último campo indica si el cargador tiene modo directo (DIRECT_CSV)
+FUENTES = [
+    (ingest_codigos,  ingest_codigos.DATABASE,  ingest_codigos.TABLE,  False),
+    (ingest_vivienda, ingest_vivienda.DATABASE, ingest_vivienda.TABLE, True),
+    (ingest_persona,  ingest_persona.database,  ingest_persona.table,  True),
+]
+
+
+class _Avisos(FileSystemEventHandler):
+    """Despierta el bucle principal cuando aparece o se cierra un CSV o Parquet."""
+
+    def __init__(self, wake: threading.Event):
+        self.wake = wake
+
+    def on_any_event(self, event):
+        if not event.is_directory and str(getattr(event, 'dest_path', '') or event.src_path).endswith(STAGED_SUFFIXES):
+            self.wake.set()
+
+
+def archivos_listos(data_dir: Path, vistos: dict, retenidos: dict):
+    """
+    Archivos completos: mismo tamaño que en la revisión anterior y sin
+    modificaciones en los últimos STABLE_SECS segundos.
+    """
+    ahora = time.time()
+    listos = []
+    for f in staged_files(data_dir):
+        try:
+            st = f.stat()
+        except FileNotFoundError:
+            continue
+        firma = (st.st_size, st.st_mtime_ns)
+        if retenidos.get(f) == firma:
+            continue  # falló antes y no ha cambiado
+        previo = vistos.get(f)
+        vistos[f] = firma
+        if previo == firma and ahora - st.st_mtime >= STABLE_SECS:
+            listos.append(f)
+    for f in list(vistos):
+        if not f.exists():
+            vistos.pop(f, None)
+            retenidos.pop(f, None)
+    return listos
+
+
+def main():
+    for mod, _, _, _ in FUENTES:
+        mod.ensure_dirs()
+
+    client = ingest_persona.get_ch_client()
+    schemas = SchemaCache()
+    manifiestos = {}  # tabla → manifiesto abierto (None con USE_MANIFEST=false)
+
+    stop = threading.Event()
+    wake = threading.Event()
+
+    def detener(*_):
+        stop.set()
+        wake.set()
+
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, detener)
+
+    dirs = [Path(mod.DATA_DIR) for mod, _, _, _ in FUENTES]
+    observer = None
+    if Observer is not None:
+        observer = Observer()
+        for d in dirs:
+            observer.schedule(_Avisos(wake), str(d), recursive=False)
+        observer.start()
+        log(f"Vigilando con watchdog: {', '.join(map(str, dirs))}")
+    else:
+        log(f"watchdog no disponible; sondeo cada {POLL_INTERVAL}s: {', '.join(map(str, dirs))}")
+
+    vistos, retenidos = {}, {}
+    recarga_pendiente = False
+    while not stop.is_set():
+        for mod, db, tbl, directo in FUENTES:
+            for f in archivos_listos(Path(mod.DATA_DIR), vistos, retenidos):
+                if stop.is_set():
+                    break
+                t0 = time.time()
+                try:
+                    cols = schemas.columns(client, db, tbl)
+                    if tbl not in manifiestos:
+                        manifiestos[tbl] = open_manifest(client, db, tbl)
+                    kw = {'manifest': manifiestos[tbl]}
+                    if directo and DIRECT_CSV:
+                        kw['col_types'] = schemas.column_types(client, db, tbl)
+                    mod.process_files([f], cols, client, **kw)
+                except Exception as e:
+                    log(f"[ERROR] {f.name}: {e}")
+                if f.exists():
+                    # Quedó en unprocessed (STOP_ON_ERROR, lectura cortada o error):
+                    # no se reintenta hasta que el archivo cambie
+                    st = f.stat()
+                    retenidos[f] = (st.st_size, st.st_mtime_ns)
+                    log(f"[WARN] {f.name} sigue en unprocessed; se reintentará si cambia")
+                else:
+                    log(f"→ {f.name} ingerido en {time.time() - t0:.1f}s")
+                    recarga_pendiente = recarga_pendiente or mod is ingest_codigos
+            if mod is ingest_codigos and recarga_pendiente and not stop.is_set():
+                # Los códigos ya están en la tabla, pero el diccionario no los
+                # ve hasta recargarlo; el fallo se trata como una carga fallida
+                # (el archivo ya está en processed: lo que se reintenta es la recarga)
+                try:
+                    recarga_pendiente = not ingest_codigos.recargar_diccionario(client)
+                except Exception as e:
+                    log(f"[ERROR] Recarga de {ingest_codigos.DICCIONARIO}: {e}")
+                if recarga_pendiente:
+                    log(f"[WARN] {ingest_codigos.DICCIONARIO} sin recargar; se reintentará en el próximo ciclo")
+
+        # Archivos vistos pero aún no confirmados como completos: revisar pronto.
+        # Con watchdog, el resto del tiempo se duerme hasta el próximo aviso.
+        pendientes = any(f not in retenidos for f in vistos)
+        if pendientes:
+            timeout = min(STABLE_SECS, POLL_INTERVAL)
+        elif observer is not None:
+            timeout = RESCAN_INTERVAL
+        else:
+            timeout = POLL_INTERVAL
+        wake.wait(timeout)
+        wake.clear()
+
+    if observer is not None:
+        observer.stop()
+        observer.join()
+    log("Demonio de ingesta detenido.")
+
+
+if __name__ == '__main__':
+    main()
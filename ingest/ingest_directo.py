@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+# ──────────────────────────────────────────────────────────────
+# Modo directo: los bytes del CSV viajan tal cual (gzip) a ClickHouse
+# por HTTP como
+#   INSERT INTO t (...) SELECT <conversión> FROM input('...')
+#   FORMAT CSVWithNames
+# y es el servidor quien aplica el delimitador ';', los nulos, la
+# coma decimal, el relleno de `ciudad` y las sentinelas. pandas solo
+# entra en juego para un trozo que el servidor rechaza (por ejemplo, un
+# entero fuera del rango de su columna).
+# ──────────────────────────────────────────────────────────────
+import base64
+import gzip
+import http.client
+import io
+import os
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from urllib.parse import urlencode
+
+import pandas as pd
+
+from ingest_common import SENTINEL_FLOAT, SENTINEL_INT, SENTINEL_STRING, SOLO_INSERTABLES
+
+CH_HTTP_HOST    = os.getenv('CH_HOST', 'clickhouse')
+CH_HTTP_PORT    = int(os.getenv('CH_HTTP_PORT', 8123))
+CH_USER         = os.getenv('CH_USER', 'admin')
+CH_PASSWORD     = os.getenv('CH_PASSWORD', 'secret_pw')
+HTTP_TIMEOUT    = float(os.getenv('HTTP_TIMEOUT', 600))
+DIRECT_CSV      = os.getenv('DIRECT_CSV', 'false').lower() in ('1', 'true', 'yes')
+GZIP_LEVEL      = int(os.getenv('GZIP_LEVEL', 1))
+
+# Textos que pandas lee como nulo por defecto; el servidor hace lo mismo
+NA_TOKENS = ['', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan',
+             '1.#IND', '1.#QNAN', '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None',
+             'n/a', 'nan', 'null']
+
+_INNER_RX = re.compile(r'^(?:(?:Nullable|LowCardinality)\()*(\w+)')
+
+
+@dataclass
+class RawSegment:
+    header: bytes   # línea de encabezado (se antepone a cada trozo)
+    data: bytes     # filas del trozo, sin encabezado
+    rows: int
+
+    def __len__(self):
+        return self.rows
+
+
+def _q(name: str) -> str:
+    return '`' + name.replace('`', '\\`') + '`'
+
+
+def _lit(value: str) -> str:
+    return "'" + value.replace('\\', '\\\\').replace("'", "\\'") + "'"
+
+
+def _inner_type(ch_type: str) -> str:
+    m = _INNER_RX.match(ch_type)
+    return m.group(1) if m else 'String'
+
+
+def column_expr(col: str, ch_type: str, present: bool, float_cols, int_cols,
+                use_sentinels: bool, strip_strings: bool) -> str:
+    """Expresión SQL equivalente a coerce_value/coerce_columns para una columna."""
+    if col in float_cols:
+        sentinel = repr(SENTINEL_FLOAT)
+    elif col in int_cols:
+        sentinel = str(SENTINEL_INT)
+    else:
+        sentinel = _lit(SENTINEL_STRING)
+    if not present:
+        return f"{sentinel if use_sentinels else 'NULL'} AS {_q(col)}"
+
+    na = ', '.join(_lit(t) for t in NA_TOKENS)
+    v = f"if({_q(col)} IN ({na}), NULL, {_q(col)})"
+    if col in float_cols:
+        expr = f"toFloat64OrNull(replaceAll(replaceAll({v}, ' ', ''), ',', '.'))"
+    elif col in int_cols:
+        t = f"trimBoth({v})"
+        # Fuera de rango el servidor falla (no NULL ni sentinela, que además
+        # to<T> daría vuelta en silencio): el trozo cae al camino Python, cuyo
+        # insert_bisect manda la fila a errors/ igual que sin DIRECT_CSV
+        # (el cast se evalúa en todas las filas: las no numéricas reciben '0')
+        ok = f"match({t}, '^-?[0-9]+$')"
+        num = f"toDecimal256(if({ok}, assumeNotNull({t}), '0'), 0)"
+        expr = f"if({ok}, accurateCast({num}, {_lit(_inner_type(ch_type))}), NULL)"
+    else:
+        t = f"trimBoth({v})"
+        if col == 'ciudad':
+            body = f"if(length({t}) >= 6, {t}, leftPad({t}, 6, '0'))"
+        else:
+            body = t if strip_strings else v
+        expr = f"if({t} = '', NULL, {body})"
+    if use_sentinels:
+        expr = f"ifNull({expr}, {sentinel})"
+    return f"{expr} AS {_q(col)}"
+
+
+def read_header(path: Path) -> bytes:
+    with path.open('rb') as f:
+        return f.readline()
+
+
+def header_columns(header: bytes):
+    text = header.decode('utf-8', errors='replace').lstrip('\ufeff').rstrip('\r\n')
+    return [c.strip().strip('"') for c in text.split(';')]
+
+
+class DirectCsv:
+    """
+    Emisor de trozos crudos para ingest_common.ingest_csv(direct=...).
+    `col_types` viene de system.columns (nombre → tipo ClickHouse).
+    """
+
+    def __init__(self, database: str, table: str, col_names, col_types: dict,
+                 float_cols=(), int_cols=(), use_sentinels=False, strip_strings=False):
+        self.database = database
+        self.table = table
+        self.col_names = list(col_names)
+        self.col_types = col_types
+        self.float_cols = set(float_cols)
+        self.int_cols = set(int_cols)
+        self.use_sentinels = use_sentinels
+        self.strip_strings = strip_strings
+        self._query = None
+
+    def build_query(self, file_cols) -> str:
+        present = set(file_cols)
+        select = ',\n       '.join(
+            column_expr(c, self.col_types.get(c, 'String'), c in present, self.float_cols,
+                        self.int_cols, self.use_sentinels, self.strip_strings)
+            for c in self.col_names
+        )
+        structure = ', '.join(f"{_q(c)} Nullable(String)" for c in file_cols)
+        return (
+            f"INSERT INTO {self.database}.{self.table} ({', '.join(map(_q, self.col_names))})\n"
+            f"SELECT {select}\nFROM input({_lit(structure)})\nFORMAT CSVWithNames"
+        )
+
+    # --- interfaz usada por ingest_csv ---
+    def segments(self, path: Path, chunk_rows: int):
+        """Trozos de `chunk_rows` líneas, cortados en saltos de línea."""
+        header = read_header(path)
+        self._query = self.build_query(header_columns(header))
+
+        def gen():
+            with path.open('rb') as f:
+                f.readline()
+                buf, n = [], 0
+                for line in f:
+                    if not line.strip():
+                        continue  # pandas también salta líneas vacías
+                    buf.append(line)
+                    n += 1
+                    if chunk_rows and n >= chunk_rows:
+                        yield RawSegment(header, b''.join(buf), n)
+                        buf, n = [], 0
+                if buf:
+                    yield RawSegment(header, b''.join(buf), n)
+
+        return gen()
+
+    @staticmethod
+    def prepare(segment: RawSegment):
+        # Se comprime en el hilo lector mientras se envía el trozo anterior
+        return segment, gzip.compress(segment.header + segment.data, compresslevel=GZIP_LEVEL)
+
+    def send(self, payload, dedup_token=None):
+        """POST del trozo comprimido; lanza RuntimeError si el servidor lo rechaza."""
+        _segment, body = payload
+        params = {
+            'query': self._query,
+            'database': self.database,
+            'format_csv_delimiter': ';',
+            'format_csv_allow_single_quotes': 0,
+            'input_format_with_names_use_header': 1,
+            'input_format_skip_unknown_fields': 1,
+            'input_format_csv_empty_as_default': 1,
+            # pandas conserva los espacios de los campos; el recorte lo
+            # decide column_expr según strip_strings
+            'input_format_csv_trim_whitespaces': 0,
+            # NULL en columna no Nullable (p.ej. ciudad) rechaza el trozo,
+            # igual que en el camino Python
+            'insert_null_as_default': 0,
+        }
+        if dedup_token:
+            params['insert_deduplication_token'] = dedup_token
+        auth = base64.b64encode(f"{CH_USER}:{CH_PASSWORD}".encode()).decode()
+        conn = http.client.HTTPConnection(CH_HTTP_HOST, CH_HTTP_PORT, timeout=HTTP_TIMEOUT)
+        try:
+            conn.request('POST', '/?' + urlencode(params), body=body, headers={
+                'Content-Encoding': 'gzip',
+                'Content-Type': 'text/csv',
+                'Authorization': f'Basic {auth}',
+            })
+            resp = conn.getresponse()
+            msg = resp.read().decode('utf-8', errors='replace')
+        except (OSError, http.client.HTTPException) as e:
+            # Falla de red: ingest_csv la trata como transitoria (sin fallback)
+            raise ConnectionError(f"HTTP {CH_HTTP_HOST}:{CH_HTTP_PORT}: {e}") from e
+        finally:
+            conn.close()
+        if resp.status != 200:
+            raise RuntimeError(f"HTTP {resp.status}: {msg.strip()[:500]}")
+
+    @staticmethod
+    def to_frame(payload, **read_kw) -> pd.DataFrame:
+        """Trozo rechazado → DataFrame de texto para el camino Python."""
+        segment, _body = payload
+        kw = dict(sep=';', dtype=str, header=0, low_memory=False)
+        kw.update(read_kw)
+        return pd.read_csv(io.BytesIO(segment.header + segment.data), **kw)
+
+
+def fetch_column_types(client, database: str, table: str) -> dict:
+    rows = client.execute(
+        "SELECT name, type FROM system.columns "
+        f"WHERE database=%(db)s AND table=%(tbl)s AND {SOLO_INSERTABLES} ORDER BY position",
+        {'db': database, 'tbl': table}
+    )
+    return dict(rows)
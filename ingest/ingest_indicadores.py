@@ -1,25 +1,37 @@
 #!/usr/bin/env python3
 # ──────────────────────────────────────────────────────────────
-# Inserta los indicadores desde los CSV generados a ClickHouse
+# Inserta los indicadores (nacional y por ciudad) en ClickHouse.
+# `cargar` recibe las filas tal como las arma calcular_indicadores.py
+# y las inserta como bloques columnares; cada periodo reemplaza
+# atómicamente su partición, así que volver a correrlo no duplica.
+# Como script, carga los CSV que deja calcular_indicadores.py.
 # ──────────────────────────────────────────────────────────────
 import os
+import uuid
+import numpy as np
 import pandas as pd
 from clickhouse_driver import Client
 from pathlib import Path
 
 # ---------- rutas ----------
-OUT_DIR = Path("/resultados")
-CSV_NACIONAL = OUT_DIR / "indicadores_enemdu_2007_2025.csv"
-CSV_CIUDAD   = OUT_DIR / "indicadores_enemdu_por_ciudad_2007_2025.csv"
+OUT_DIR = Path(os.getenv("RESULTADOS_DIR", "/data/resultados"))
+CSV_NACIONAL = OUT_DIR / "indicadores_nac.csv"
+CSV_CIUDAD   = OUT_DIR / "indicadores_ciudad.csv"
+
+TABLA_NACIONAL = "indicadores_nacionales"
+TABLA_CIUDAD   = "indicadores_por_ciudad"
 
 # ---------- conexión ClickHouse ----------
-client = Client(
-    host=os.getenv("CH_HOST", "clickhouse"),
-    port=int(os.getenv("CH_PORT", 9000)),
-    user=os.getenv("CH_USER", "admin"),              
-    password=os.getenv("CH_PASSWORD", "secret_pw"),  
-    database=os.getenv("CH_DATABASE", "indicadores") 
-)
+CH_DATABASE = os.getenv("CH_DATABASE", "indicadores")
+
+def cliente():
+    return Client(
+        host=os.getenv("CH_HOST", "clickhouse"),
+        port=int(os.getenv("CH_PORT", 9000)),
+        user=os.getenv("CH_USER", "admin"),
+        password=os.getenv("CH_PASSWORD", "secret_pw"),
+        database=CH_DATABASE,
+    )
 
 # ---------- mapeo de columnas ----------
 col_map = {
@@ -44,24 +56,77 @@ col_map = {
     "Trabajo Infantil (%)": "trabajo_infantil",
     "Manufactura / Empleo (%)": "manufactura_empleo"
 }
+# Series de calcular_indicadores.con_series: una columna por indicador y sufijo
+SUFIJOS_SERIES = {
+    "Var. anual (pp)": "var_anual",
+    "Var. trimestral (pp)": "var_trim",
+    "Prom. 12m": "prom_12m",
+}
+col_map.update({f"{k} {suf}": f"{v}_{sc}"
+                for suf, sc in SUFIJOS_SERIES.items()
+                for k, v in list(col_map.items()) if k.endswith("(%)")})
+col_map["Periodos 12m"] = "periodos_12m"
+
+# ---------- conversión ----------
+def columnas(df: pd.DataFrame, tiene_ciudad=False):
+    """(nombres, columnas) de `df` según `col_map`, listas para insertar columnar."""
+    df = df.rename(columns=col_map)
+    nombres = [c for c in col_map.values() if c in df.columns and (tiene_ciudad or c != "ciudad")]
+    cols = []
+    for c in nombres:
+        s = df[c]
+        if c in ("anio", "periodo", "periodos_12m"):
+            cols.append(s.astype("int64").tolist())
+        elif c == "ciudad":
+            cols.append(s.astype(str).str.zfill(6).tolist())
+        elif c == "mes":
+            cols.append(s.astype(str).tolist())
+        else:
+            # NaN (indicador sin denominador) → NULL
+            x = pd.to_numeric(s, errors="coerce").to_numpy(dtype="float64")
+            out = x.astype(object)
+            out[np.isnan(x)] = None
+            cols.append(out.tolist())
+    return nombres, cols
 
 # ---------- función de carga ----------
-def cargar_csv(path: Path, tabla: str, tiene_ciudad=False):
-    print(f"▶ Cargando {path.name} a la tabla {tabla}...")
-    df = pd.read_csv(path, encoding="utf-8-sig")
-    df.rename(columns=col_map, inplace=True)
-    if not tiene_ciudad:
-        df = df[[c for c in col_map.values() if c != "ciudad"]]
-    else:
-        df = df[[c for c in col_map.values() if c in df.columns]]
+def reemplazar_periodos(client, df: pd.DataFrame, tabla: str, tiene_ciudad=False):
+    """
+    Inserta `df` en una tabla de carga con el mismo esquema que `tabla` y
+    mueve cada periodo con REPLACE PARTITION: quien lea `tabla` ve el
+    periodo anterior completo o el nuevo completo, nunca una mezcla.
+    """
+    if df.empty:
+        return 0
+    nombres, cols = columnas(df, tiene_ciudad)
+    # Una tabla de carga por corrida: dos corridas a la vez no se pisan
+    carga = f"{CH_DATABASE}.{tabla}_carga_{uuid.uuid4().hex[:8]}"
+    client.execute(f"CREATE TABLE {carga} AS {CH_DATABASE}.{tabla}")
+    try:
+        client.execute(f"INSERT INTO {carga} ({', '.join(nombres)}) VALUES", cols, columnar=True)
+        periodos = df[["Año", "Periodo"]].astype(int).drop_duplicates().itertuples(index=False)
+        for anio, periodo in periodos:
+            client.execute(f"ALTER TABLE {CH_DATABASE}.{tabla} "
+                           f"REPLACE PARTITION ({anio}, {periodo}) FROM {carga}")
+    finally:
+        client.execute(f"DROP TABLE IF EXISTS {carga}")
+    return len(df)
 
-    client.execute(
-        f"INSERT INTO {tabla} ({', '.join(df.columns)}) VALUES",
-        df.to_dict("records")
-    )
-    print(f"✅ Insertadas {len(df)} filas en {tabla}.")
+def cargar(client, rows_nac, rows_city):
+    """Sube las filas de calcular_indicadores.py sin pasar por CSV."""
+    n = reemplazar_periodos(client, pd.DataFrame(rows_nac), TABLA_NACIONAL)
+    print(f"✅ {n} filas en {TABLA_NACIONAL}.")
+    n = reemplazar_periodos(client, pd.DataFrame(rows_city), TABLA_CIUDAD, tiene_ciudad=True)
+    print(f"✅ {n} filas en {TABLA_CIUDAD}.")
+
+def cargar_csv(client, path: Path, tabla: str, tiene_ciudad=False):
+    print(f"▶ Cargando {path.name} a la tabla {tabla}...")
+    df = pd.read_csv(path, encoding="utf-8-sig", dtype={"Ciudad": str})
+    n = reemplazar_periodos(client, df, tabla, tiene_ciudad)
+    print(f"✅ Insertadas {n} filas en {tabla}.")
 
 # ---------- ejecutar carga ----------
 if __name__ == "__main__":
-    cargar_csv(CSV_NACIONAL, "indicadores_nacionales", tiene_ciudad=False)
-    cargar_csv(CSV_CIUDAD, "indicadores_por_ciudad", tiene_ciudad=True)
\ No newline at end of file
+    client = cliente()
+    cargar_csv(client, CSV_NACIONAL, TABLA_NACIONAL, tiene_ciudad=False)
+    cargar_csv(client, CSV_CIUDAD, TABLA_CIUDAD, tiene_ciudad=True)
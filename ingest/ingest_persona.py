@@ -1,11 +1,15 @@
 #!/usr/bin/env python3
 import os
 import time
-import shutil
 import pandas as pd
 from pathlib import Path
 from clickhouse_driver import Client, errors
 from datetime import datetime
+from ingest_common import (
+    INGEST_WORKERS, append_csv_row, atomic_move, coerce_columns, ingest_csv, open_manifest,
+    run_workers, staged_files, write_metrics
+)
+from ingest_directo import DIRECT_CSV, DirectCsv, fetch_column_types
 
 # ========= Parámetros generales =========
 MAX_RETRIES     = int(os.getenv('MAX_RETRIES', 12))
@@ -131,33 +135,71 @@ def fetch_table_columns(client: Client, db: str, tbl: str):
         SELECT name, type, position
         FROM system.columns
         WHERE database = %(db)s AND table = %(tbl)s
+          AND default_kind NOT IN ('MATERIALIZED', 'ALIAS')
         ORDER BY position
         """,
         {'db': db, 'tbl': tbl}
     )
-    return [(name, dtype, dtype.startswith('Nullable(')) for name, dtype, _ in rows]
+    return [(name, dtype, 'Nullable(' in dtype) for name, dtype, _ in rows]
 
 def write_failed_row(file_base: str, header, values):
     out_path = Path(ERR_DIR) / f"{file_base}_failed_rows.csv"
-    write_header = not out_path.exists()
-    import csv
-    with out_path.open('a', newline='', encoding='utf-8') as f:
-        w = csv.writer(f, delimiter=';')
-        if write_header:
-            w.writerow(header)
-        w.writerow(values)
+    append_csv_row(out_path, header, values)
 
 def move_to_processed(path: Path):
-    dest = Path(PROCESSED_DIR) / path.name
-    shutil.move(str(path), str(dest))
+    atomic_move(path, Path(PROCESSED_DIR))
     log(f"→ Movido '{path.name}' a processed")
 
 def row_to_insert_values(row_dict, columns_meta):
     return [coerce_value(name, row_dict.get(name, None)) for name, _dtype, _ in columns_meta]
 
-
-# forzar lectura de string cols
-string_dtypes = { col: str for col in STRING_COLS }
+def coerce_frame(df: pd.DataFrame, col_names):
+    # Versión columnar de row_to_insert_values: una pasada por columna
+    return coerce_columns(df, col_names, FLOAT_COLS, INT_COLS, USE_SENTINELS)
+
+def process_files(files, col_names, client=None, stop=None, manifest=None, col_types=None) -> bool:
+    """
+    Ingesta secuencial de `files`; devuelve False si STOP_ON_ERROR cortó.
+    `manifest` y `col_types` los pasa quien ya los tiene (el demonio, una vez
+    por tabla); si faltan se abren aquí.
+    """
+    if client is None:
+        client = get_ch_client()
+    # Hash de contenido + tokens de deduplicación: reintentos sin duplicar filas
+    if manifest is None:
+        manifest = open_manifest(client, database, table)
+    # Modo directo: el servidor convierte los bytes del CSV; pandas solo
+    # procesa los trozos que rechace
+    direct = None
+    if DIRECT_CSV:
+        if col_types is None:
+            col_types = fetch_column_types(client, database, table)
+        direct = DirectCsv(database, table, col_names, col_types,
+                           FLOAT_COLS, INT_COLS, USE_SENTINELS)
+    for csv_path in files:
+        if stop is not None and stop.is_set():
+            return False
+        log(f"Procesando {csv_path.name} …")
+        # Lectura por trozos: cada trozo se convierte mientras se inserta el anterior
+        res = ingest_csv(
+            client, csv_path, database, table, col_names,
+            coerce=lambda df: coerce_frame(df, col_names),
+            on_failed_row=lambda values: write_failed_row(csv_path.stem, col_names, values),
+            stop_on_error=STOP_ON_ERROR, manifest=manifest, direct=direct, encoding='utf-8',
+        )
+        # Tiempos por etapa, filas y round trips → LOG_DIR (JSONL + textfile de Prometheus)
+        write_metrics(LOG_DIR, table, csv_path, res)
+        if res.stopped:
+            log("[STOP_ON_ERROR] Activado. Me detengo en el primer error.")
+            if stop is not None:
+                stop.set()
+            return False
+
+        # Solo se archiva cuando todos los trozos quedaron confirmados
+        # (o el archivo es ilegible desde el inicio, como antes)
+        if res.complete or res.unreadable:
+            move_to_processed(csv_path)
+    return True
 
 def main():
     ensure_dirs()
@@ -169,60 +211,13 @@ def main():
         raise RuntimeError("La tabla aún tiene la columna 'extra'.")
     log(f"Columnas en destino ({database}.{table}): {', '.join(col_names)}")
 
-    for csv_path in Path(DATA_DIR).glob('*.csv'):
-        log(f"Procesando {csv_path.name} …")
-        try:
-            df = pd.read_csv(
-                csv_path, sep=';', encoding='utf-8',
-                dtype=string_dtypes, low_memory=False, header=0
-            )
-        except Exception as e:
-            log(f"[ERROR] No pude leer el CSV {csv_path.name}: {e}")
-            move_to_processed(csv_path)
-            continue
-
-        df = df.where(pd.notnull(df), None)
-        header_out = col_names
-
-        # Preparamos el batch
-        batch_values = [
-            tuple(row_to_insert_values(row.to_dict(), columns_meta))
-            for _, row in df.iterrows()
-        ]
-        total = len(batch_values)
-        success = False
-
-        try:
-            client.execute(
-                f"INSERT INTO {database}.{table} ({', '.join(col_names)}) VALUES",
-                batch_values
-            )
-            log(f"→ Insertadas {total} filas en bloque exitosamente.")
-            success = True
-
-        except Exception as e:
-            log(f"[FAIL- BATCH] {csv_path.name}: {e}")
-            ok_cnt = 0
-            fail_cnt = 0
-            for idx, values in enumerate(batch_values, start=1):
-                try:
-                    client.execute(
-                        f"INSERT INTO {database}.{table} ({', '.join(col_names)}) VALUES",
-                        [values]
-                    )
-                    ok_cnt += 1
-                except Exception as e_row:
-                    fail_cnt += 1
-                    log(f"[FAIL] {csv_path.name} fila {idx}: {e_row}")
-                    write_failed_row(csv_path.stem, header_out, list(values))
-                    if STOP_ON_ERROR:
-                        log("[STOP_ON_ERROR] Activado. Me detengo en el primer error.")
-                        return
-            log(f"→ Tras fallback, {ok_cnt} filas OK, {fail_cnt} fallidas.")
-            success = True  # archivamos incluso con fallos parciales
-
-        if success:
-            move_to_processed(csv_path)
+    files = staged_files(DATA_DIR)
+    if INGEST_WORKERS > 1:
+        # Cada proceso abre su propia conexión con get_ch_client()
+        if not run_workers(process_files, files, INGEST_WORKERS, col_names):
+            return
+    elif not process_files(files, col_names, client):
+        return
 
     log("Proceso completado.")
 
@@ -1,11 +1,15 @@
 #!/usr/bin/env python3
 import os
 import time
-import shutil
 import pandas as pd
 from pathlib import Path
 from clickhouse_driver import Client, errors
 from datetime import datetime
+from ingest_common import (
+    INGEST_WORKERS, append_csv_row, atomic_move, coerce_columns, ingest_csv, open_manifest,
+    SOLO_INSERTABLES, run_workers, staged_files, write_metrics
+)
+from ingest_directo import DIRECT_CSV, DirectCsv, fetch_column_types
 
 # ========= Parámetros generales =========
 MAX_RETRIES     = int(os.getenv('MAX_RETRIES', 12))
@@ -22,8 +26,20 @@ DATABASE        = os.getenv('CH_DATABASE', 'indicadores')
 TABLE           = os.getenv('CH_TABLE', 'enemdu_vivienda')
 
 # Columnas por tipo
+# Preguntas vi* de la tabla destino (ver create_table.sql)
 questions = [
-    # … tu lista de preguntas aquí …
+    'vi01','vi02','vi03a','vi03b','vi04a','vi04b','vi05a','vi05b','vi06',
+    'vi07','vi07a','vi07b','vi08','vi09','vi09a','vi09b','vi10','vi101',
+    'vi102','vi10a','vi11','vi12','vi13','vi14','vi141','vi142','vi143',
+    'vi144','vi1511','vi1512','vi1521','vi1522','vi1531','vi1532','vi1533',
+    'vi1534','vi1541','vi1542','vi1543','vi1544','vi1551','vi1552','vi1553',
+    'vi1554','vi1561','vi1562','vi1563','vi1564','vi16','vi161','vi162',
+    'vi163','vi164','vi165','vi166','vi167','vi168','vi169','vi1610',
+    'vi1611','vi1612','vi1613','vi1614','vi17','vi171','vi172','vi173',
+    'vi174','vi175','vi176','vi177','vi178','vi179','vi1710','vi1711',
+    'vi1712','vi1713','vi1714','vi18','vi181','vi182','vi183','vi184',
+    'vi185','vi186','vi187','vi188','vi189','vi1810','vi1811','vi1812',
+    'vi1813','vi1814'
 ]
 STRING_COLS = {'area','ciudad','conglomerado','estrato','periodo','panelm'}
 FLOAT_COLS  = {'fexp'}
@@ -71,6 +87,10 @@ def coerce_value(col: str, raw):
         return s.strip()
     return SENTINEL_STRING if USE_SENTINELS else None
 
+def coerce_frame(df: pd.DataFrame, col_names):
+    # Versión columnar de coerce_value: una pasada por columna
+    return coerce_columns(df, col_names, FLOAT_COLS, INT_COLS, USE_SENTINELS, strip_strings=True)
+
 def get_ch_client():
     last_err = None
     for i in range(MAX_RETRIES):
@@ -93,19 +113,54 @@ def get_ch_client():
 
 def write_failed_row(base, header, values):
     out = Path(ERR_DIR) / f"{base}_failed.csv"
-    write_header = not out.exists()
-    import csv
-    with out.open('a', newline='', encoding='utf-8') as f:
-        w = csv.writer(f, delimiter=';')
-        if write_header:
-            w.writerow(header)
-        w.writerow(values)
+    append_csv_row(out, header, values)
 
 def move_to_processed(path: Path):
-    dest = Path(PROCESSED_DIR) / path.name
-    shutil.move(str(path), str(dest))
+    atomic_move(path, Path(PROCESSED_DIR))
     log(f"→ Movido '{path.name}' a processed")
 
+def process_files(files, col_names, client=None, stop=None, manifest=None, col_types=None) -> bool:
+    """
+    Ingesta secuencial de `files`; devuelve False si STOP_ON_ERROR cortó.
+    `manifest` y `col_types` los pasa quien ya los tiene (el demonio, una vez
+    por tabla); si faltan se abren aquí.
+    """
+    if client is None:
+        client = get_ch_client()
+    # Hash de contenido + tokens de deduplicación: reintentos sin duplicar filas
+    if manifest is None:
+        manifest = open_manifest(client, DATABASE, TABLE)
+    # Modo directo: el servidor convierte los bytes del CSV; pandas solo
+    # procesa los trozos que rechace
+    direct = None
+    if DIRECT_CSV:
+        if col_types is None:
+            col_types = fetch_column_types(client, DATABASE, TABLE)
+        direct = DirectCsv(DATABASE, TABLE, col_names, col_types,
+                           FLOAT_COLS, INT_COLS, USE_SENTINELS, strip_strings=True)
+    for csvf in files:
+        if stop is not None and stop.is_set():
+            return False
+        log(f"Procesando {csvf.name}...")
+        res = ingest_csv(
+            client, csvf, DATABASE, TABLE, col_names,
+            coerce=lambda df: coerce_frame(df, col_names),
+            on_failed_row=lambda vals: write_failed_row(f"{TABLE}_{csvf.stem}", col_names, vals),
+            stop_on_error=STOP_ON_ERROR, manifest=manifest, direct=direct,
+        )
+        # Tiempos por etapa, filas y round trips → LOG_DIR (JSONL + textfile de Prometheus)
+        write_metrics(LOG_DIR, TABLE, csvf, res)
+        if res.stopped:
+            if stop is not None:
+                stop.set()
+            return False
+
+        # Archivamos solo si todos los trozos se confirmaron (o si el CSV es
+        # ilegible desde el inicio, para no reintentarlo ciegamente)
+        if res.complete or res.unreadable:
+            move_to_processed(csvf)
+    return True
+
 # ========= Procesar CSVs =========
 def main():
     ensure_dirs()
@@ -117,54 +172,20 @@ def main():
     cols_meta = client.execute(
         "SELECT name FROM system.columns "
         "WHERE database=%(db)s AND table=%(tbl)s "
+        f"AND {SOLO_INSERTABLES} "
         "ORDER BY position",
         {'db': DATABASE, 'tbl': TABLE}
     )
     col_names = [r[0] for r in cols_meta]
     log(f"Columnas destino {TABLE}: {col_names}")
 
-    for csvf in Path(DATA_DIR).glob('*.csv'):
-        log(f"Procesando {csvf.name}...")
-        # Intento de lectura
-        try:
-            df = pd.read_csv(csvf, sep=';', dtype={c: str for c in STRING_COLS if c in col_names}, low_memory=False)
-        except Exception as e:
-            log(f"[ERROR] Lectura {csvf.name}: {e}")
-            move_to_processed(csvf)
-            continue
-
-        df = df.where(pd.notnull(df), None)
-        batch = [[coerce_value(c, row.get(c)) for c in col_names] for _, row in df.iterrows()]
-
-        success = False
-        try:
-            client.execute(
-                f"INSERT INTO {DATABASE}.{TABLE} ({','.join(col_names)}) VALUES",
-                batch
-            )
-            log(f"→ Insertadas {len(batch)} filas.")
-            success = True
-        except Exception as e:
-            log(f"[FAIL BATCH] {e}")
-            ok = fail = 0
-            for i, vals in enumerate(batch, 1):
-                try:
-                    client.execute(
-                        f"INSERT INTO {DATABASE}.{TABLE} ({','.join(col_names)}) VALUES",
-                        [vals]
-                    )
-                    ok += 1
-                except Exception as ex:
-                    fail += 1
-                    log(f"[FAIL fila {i}] {ex}")
-                    write_failed_row(f"{TABLE}_{csvf.stem}", col_names, vals)
-                    if STOP_ON_ERROR:
-                        return
-            log(f"→ {ok} OK, {fail} fallidas.")
-            success = True  # movemos aun con fallos parciales
-
-        if success:
-            move_to_processed(csvf)
+    files = staged_files(DATA_DIR)
+    if INGEST_WORKERS > 1:
+        # Cada proceso abre su propia conexión con get_ch_client()
+        if not run_workers(process_files, files, INGEST_WORKERS, col_names):
+            return
+    elif not process_files(files, col_names, client):
+        return
 
     log("Proceso completado vivienda_data.")
 
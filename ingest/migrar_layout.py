@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# ──────────────────────────────────────────────────────────────
+# Migración en línea de enemdu_persona y enemdu_vivienda al esquema
+# actual de create_table.sql (partición por año, LowCardinality,
+# columnas derivadas anio/periodo_num/provincia/canton):
+#   1) crea <tabla>_nueva con el DDL de create_table.sql
+#   2) copia año por año con INSERT ... SELECT; la tabla vieja sigue
+#      sirviendo lecturas e inserciones mientras tanto. Es retomable:
+#      los años que ya tienen las mismas filas se saltan y uno a medias
+#      se vacía y se vuelve a copiar
+#   3) informa filas y bytes leídos por consultas típicas, antes y después
+#   4) vuelve a copiar los años que cambiaron durante la copia, cambia las
+#      tablas con EXCHANGE TABLES (atómico) y recrea las vistas
+#      materializadas que leen de la tabla. La vieja queda como
+#      <tabla>_anterior hasta borrarla a mano.
+# El paso 4 tarda segundos, pero lo que se inserte justo en ese momento
+# puede no llegar a las vistas: conviene detener la ingesta solo para ese
+# paso (o correr primero con --solo-copia y después sin él).
+#
+#   docker-compose run --rm ingest python migrar_layout.py
+#   docker-compose run --rm ingest python migrar_layout.py --tablas enemdu_persona --solo-copia
+# ──────────────────────────────────────────────────────────────
+import argparse
+import os
+import re
+import time
+from pathlib import Path
+
+from clickhouse_driver import Client
+
+from ingest_common import SOLO_INSERTABLES, log
+
+DATABASE   = os.getenv('CH_DATABASE', 'indicadores')
+SCHEMA_SQL = Path(os.getenv('SCHEMA_SQL', '/schema/create_table.sql'))
+TABLAS     = ('enemdu_persona', 'enemdu_vivienda')
+
+# Mismo filtro expresado sobre el esquema viejo (sin columnas derivadas)
+# y sobre el nuevo; {p} = último periodo, {a} = su año, {c} = su cantón más poblado
+CONSULTAS = [
+    ('periodo',           "periodo = '{p}'",
+                          "periodo = '{p}'"),
+    ('año',               "substring(periodo, 1, 4) = '{a}'",
+                          "anio = {a}"),
+    ('cantón en periodo', "substring(ciudad, 1, 4) = '{c}' AND periodo = '{p}'",
+                          "canton = '{c}' AND periodo = '{p}'"),
+    ('área en año',       "area = '1' AND substring(periodo, 1, 4) = '{a}'",
+                          "area = '1' AND anio = {a}"),
+]
+
+
+def get_ch_client():
+    return Client(
+        host=os.getenv('CH_HOST', 'clickhouse'),
+        port=int(os.getenv('CH_PORT', 9000)),
+        user=os.getenv('CH_USER', 'admin'),
+        password=os.getenv('CH_PASSWORD', 'secret_pw'),
+        database=DATABASE,
+        send_receive_timeout=3600,
+    )
+
+
+def sentencias(sql: str):
+    """Sentencias de create_table.sql, sin comentarios de línea."""
+    sql = re.sub(r'--[^\n]*', '', sql)
+    return [s.strip() for s in sql.split(';') if s.strip()]
+
+
+def ddl_tabla(sql: str, tabla: str) -> str:
+    for s in sentencias(sql):
+        if re.match(rf'CREATE TABLE IF NOT EXISTS\s+{tabla}\s*\(', s):
+            return s
+    raise KeyError(f'{tabla} no está en {SCHEMA_SQL}')
+
+
+def vistas_de(sql: str, tabla: str):
+    """(nombre, DDL) de las vistas materializadas que leen de `tabla`."""
+    out = []
+    for s in sentencias(sql):
+        m = re.match(r'CREATE MATERIALIZED VIEW IF NOT EXISTS\s+(\w+)', s)
+        if m and re.search(rf'\bFROM\s+(?:{DATABASE}\.)?{tabla}\b', s):
+            out.append((m.group(1), s))
+    return out
+
+
+def columnas(client, tabla: str):
+    return [c for c, in client.execute(
+        'SELECT name FROM system.columns WHERE database = %(db)s AND table = %(tbl)s '
+        f'AND {SOLO_INSERTABLES} ORDER BY position', {'db': DATABASE, 'tbl': tabla})]
+
+
+def filas_por_anio(client, tabla: str, expr: str) -> dict:
+    return dict(client.execute(f'SELECT toString({expr}) AS a, count() FROM {tabla} GROUP BY a'))
+
+
+def copiar(client, vieja: str, nueva: str, solo_cambiados=False) -> int:
+    """Copia año por año los que faltan o difieren en `nueva`. Devuelve cuántos copió."""
+    cols = ', '.join(f'`{c}`' for c in columnas(client, nueva))
+    origen = filas_por_anio(client, vieja, 'toUInt16OrZero(substring(periodo, 1, 4))')
+    destino = filas_por_anio(client, nueva, 'anio')
+    pendientes = sorted(a for a, n in origen.items() if destino.get(a) != n)
+    pendientes += sorted(a for a in destino if a not in origen)
+    for i, anio in enumerate(pendientes, 1):
+        t0 = time.time()
+        # Un año a medias (corte anterior o inserciones durante la copia) se rehace entero
+        if anio in destino:
+            client.execute(f'ALTER TABLE {nueva} DROP PARTITION {anio}')
+        if anio in origen:
+            client.execute(
+                f'INSERT INTO {nueva} ({cols}) SELECT {cols} FROM {vieja} '
+                f'WHERE toUInt16OrZero(substring(periodo, 1, 4)) = {anio} '
+                # La tabla nueva deduplica por contenido los bloques sin token:
+                # un año recopiado tras DROP PARTITION podría perder bloques
+                'SETTINGS insert_deduplicate = 0')
+        log(f"{'  recopiado' if solo_cambiados else '  copiado'} {anio} "
+            f"({origen.get(anio, 0):,} filas, {time.time() - t0:.1f}s) [{i}/{len(pendientes)}]")
+    return len(pendientes)
+
+
+def leido(client, sql: str):
+    """(filas, bytes) que ClickHouse leyó para responder `sql`."""
+    client.execute(sql)
+    p = client.last_query.progress
+    return p.rows, p.bytes
+
+
+def reporte(client, vieja: str, nueva: str):
+    fila = client.execute(f'SELECT max(periodo) FROM {nueva}')
+    periodo = fila[0][0] if fila else ''
+    if not periodo:
+        log('  (tabla vacía, sin reporte)')
+        return
+    canton = client.execute(
+        f"SELECT canton FROM {nueva} WHERE periodo = '{periodo}' "
+        f"GROUP BY canton ORDER BY count() DESC LIMIT 1")[0][0]
+    valores = {'p': periodo, 'a': periodo[:4], 'c': canton}
+    log(f"  {'consulta':<18} {'filas antes':>12} {'MB antes':>9} {'filas después':>14} {'MB después':>11}")
+    for nombre, antes, despues in CONSULTAS:
+        f0, b0 = leido(client, f'SELECT count(), sum(fexp) FROM {vieja} WHERE {antes.format(**valores)}')
+        f1, b1 = leido(client, f'SELECT count(), sum(fexp) FROM {nueva} WHERE {despues.format(**valores)}')
+        log(f'  {nombre:<18} {f0:>12,} {b0 / 2**20:>9.1f} {f1:>14,} {b1 / 2**20:>11.1f}')
+
+
+def cambiar(client, tabla: str, nueva: str, sql: str):
+    """Último repaso de la copia, EXCHANGE TABLES y vistas materializadas nuevas."""
+    copiar(client, tabla, nueva, solo_cambiados=True)
+    vistas = vistas_de(sql, tabla)
+    client.execute(f'EXCHANGE TABLES {tabla} AND {nueva}')
+    client.execute(f'RENAME TABLE {nueva} TO {tabla}_anterior')
+    for nombre, ddl in vistas:
+        client.execute(f'DROP VIEW IF EXISTS {nombre}')
+        client.execute(ddl)
+    log(f'  {tabla} cambiada; la anterior quedó como {tabla}_anterior'
+        + (f"; vistas recreadas: {', '.join(n for n, _ in vistas)}" if vistas else ''))
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Migra las tablas ENEMDU al layout particionado')
+    ap.add_argument('--tablas', default=','.join(TABLAS), help='tablas a migrar, separadas por coma')
+    ap.add_argument('--solo-copia', action='store_true',
+                    help='copia e informa, sin cambiar las tablas (se puede repetir)')
+    args = ap.parse_args()
+
+    sql = SCHEMA_SQL.read_text(encoding='utf-8')
+    client = get_ch_client()
+    for tabla in [t for t in args.tablas.split(',') if t]:
+        nueva = f'{tabla}_nueva'
+        if client.execute(
+                "SELECT 1 FROM system.columns WHERE database = %(db)s AND table = %(tbl)s "
+                "AND name = 'anio'", {'db': DATABASE, 'tbl': tabla}):
+            log(f'▶ {tabla} ya tiene el layout nuevo')
+            continue
+        log(f'▶ {tabla} → {nueva}')
+        ddl = ddl_tabla(sql, tabla)
+        client.execute(ddl.replace(f'IF NOT EXISTS {tabla}', f'IF NOT EXISTS {nueva}', 1))
+        n = copiar(client, tabla, nueva)
+        log(f'  {n} años copiados' if n else '  nada que copiar: ya estaba al día')
+        reporte(client, tabla, nueva)
+        if not args.solo_copia:
+            cambiar(client, tabla, nueva, sql)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+# ──────────────────────────────────────────────────────────────
+# Recalcula las tablas de indicadores (*_estado detrás de
+# indicadores_persona_nacionales, indicadores_persona_canton e
+# indicadores_pobreza) desde lo que ya está en enemdu_persona, sin
+# volver a cargar los CSV. Sirve tras cambiar la definición de un
+# indicador (la vista materializada) o corregir datos.
+#
+# Cada tarea es un periodo de una tabla: corre el SELECT de la vista
+# materializada, tal como está en la base, filtrado a ese periodo, en una
+# tabla de carga con la misma estructura. Después cambia la partición
+# (anio, periodo_num) con REPLACE PARTITION: quien lee ve el periodo viejo
+# completo o el nuevo completo. Las tareas corren en REBUILD_WORKERS hilos,
+# cada uno con su conexión.
+#
+# Lo ya cambiado se anota en LOG_DIR/reconstruccion_indicadores.json. Si la
+# corrida se corta, la siguiente salta esos periodos, salvo con --desde-cero.
+# El archivo se borra cuando todo termina bien.
+#
+# Lo que se inserte en enemdu_persona para un periodo mientras se
+# reconstruye puede quedar fuera de sus indicadores: no reconstruir un
+# periodo que se está cargando.
+#
+#   docker-compose run --rm ingest python reconstruir_indicadores.py
+#   docker-compose run --rm ingest python reconstruir_indicadores.py --periodos 202312,202406
+#   docker-compose run --rm ingest python reconstruir_indicadores.py --tablas indicadores_pobreza --anios 2023
+# ──────────────────────────────────────────────────────────────
+import argparse
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+from clickhouse_driver import Client
+
+from ingest_common import log
+
+DATABASE = os.getenv('CH_DATABASE', 'indicadores')
+LOG_DIR  = os.getenv('LOG_DIR', '/ingest/logs')
+WORKERS  = int(os.getenv('REBUILD_WORKERS', 4))
+FUENTE   = 'enemdu_persona'
+ESTADO   = Path(LOG_DIR) / 'reconstruccion_indicadores.json'
+
+# vista de lectura → (vista materializada, tabla que llena)
+INDICADORES = {
+    'indicadores_persona_nacionales': ('mv_indicadores_persona_nacionales',
+                                       'indicadores_persona_nacionales_estado'),
+    'indicadores_persona_canton':     ('mv_indicadores_persona_canton',
+                                       'indicadores_persona_canton_estado'),
+    'indicadores_pobreza':            ('mv_indicadores_pobreza',
+                                       'indicadores_pobreza_estado'),
+}
+CLAVE_PARTICION = 'anio, periodo_num'
+
+
+def get_ch_client():
+    return Client(
+        host=os.getenv('CH_HOST', 'clickhouse'),
+        port=int(os.getenv('CH_PORT', 9000)),
+        user=os.getenv('CH_USER', 'admin'),
+        password=os.getenv('CH_PASSWORD', 'secret_pw'),
+        database=DATABASE,
+        send_receive_timeout=3600,
+    )
+
+
+_local = threading.local()
+
+def cliente_hilo():
+    """Una conexión por hilo: Client no se comparte entre hilos."""
+    if not hasattr(_local, 'client'):
+        _local.client = get_ch_client()
+    return _local.client
+
+
+# ========= Esquema =========
+def consulta_mv(client, mv: str) -> str:
+    """SELECT de la vista materializada `mv`, tal como está definida en la base."""
+    fila = client.execute(
+        'SELECT as_select FROM system.tables WHERE database = %(db)s AND name = %(mv)s',
+        {'db': DATABASE, 'mv': mv})
+    if not fila:
+        raise RuntimeError(f'No existe la vista materializada {DATABASE}.{mv}')
+    return fila[0][0]
+
+
+def columnas(client, tabla: str):
+    return [c for c, in client.execute(
+        'SELECT name FROM system.columns WHERE database = %(db)s AND table = %(tbl)s '
+        'ORDER BY position', {'db': DATABASE, 'tbl': tabla})]
+
+
+def revisar_particion(client, tabla: str):
+    fila = client.execute(
+        'SELECT partition_key FROM system.tables WHERE database = %(db)s AND name = %(tbl)s',
+        {'db': DATABASE, 'tbl': tabla})
+    clave = re.sub(r'[()\s]', '', fila[0][0]) if fila else ''
+    if clave != CLAVE_PARTICION.replace(' ', ''):
+        raise RuntimeError(
+            f'{tabla} no está particionada por ({CLAVE_PARTICION}); '
+            'correr antes init-scripts/clickhouse/migraciones/003_indicadores_por_periodo.sql')
+
+
+# ========= Plan =========
+def periodos_fuente(client) -> dict:
+    """(anio, periodo_num) → valores de `periodo` en enemdu_persona."""
+    return {(a, m): sorted(ps) for a, m, ps in client.execute(
+        f'SELECT anio, periodo_num, groupUniqArray(periodo) FROM {FUENTE} '
+        'GROUP BY anio, periodo_num')}
+
+
+def periodos_destino(client, tabla: str) -> set:
+    return set(client.execute(f'SELECT DISTINCT anio, periodo_num FROM {tabla}'))
+
+
+def clave(vista: str, anio: int, mes: int) -> str:
+    return f'{vista}|{anio}|{mes:02d}'
+
+
+def leer_hechas(desde_cero: bool) -> set:
+    if desde_cero or not ESTADO.exists():
+        return set()
+    return set(json.loads(ESTADO.read_text(encoding='utf-8')).get('hechas', []))
+
+
+def anotar_hechas(hechas: set):
+    ESTADO.parent.mkdir(parents=True, exist_ok=True)
+    tmp = ESTADO.with_suffix('.tmp')
+    tmp.write_text(json.dumps({'hechas': sorted(hechas)}, indent=1), encoding='utf-8')
+    os.replace(tmp, ESTADO)
+
+
+# ========= Reconstrucción =========
+def reconstruir(vista: str, mv: str, tabla: str, anio: int, mes: int, valores) -> int:
+    """Recalcula un periodo de `tabla` y lo cambia de una vez. Devuelve sus filas."""
+    client = cliente_hilo()
+    carga = f'{tabla}_rc_{anio}_{mes:02d}'
+    cols = ', '.join(f'`{c}`' for c in columnas(client, tabla))
+    # Filtro sobre la fuente sin tocar el SELECT de la vista: anio poda la
+    # partición y periodo (inicio del ORDER BY) los gránulos
+    filtro = f'anio = {anio} AND periodo_num = {mes}'
+    if valores:
+        filtro += ' AND periodo IN (' + ', '.join(f"'{p}'" for p in valores) + ')'
+    filtros = "{'%s.%s': '%s'}" % (DATABASE, FUENTE, filtro.replace("'", "\\'"))
+
+    # Una carga de una corrida cortada se descarta
+    client.execute(f'DROP TABLE IF EXISTS {carga}')
+    client.execute(f'CREATE TABLE {carga} AS {tabla}')
+    try:
+        client.execute(
+            f'INSERT INTO {carga} ({cols}) SELECT {cols} FROM ({consulta_mv(client, mv)}) '
+            f'SETTINGS additional_table_filters = {filtros}')
+        filas = client.execute(f'SELECT count() FROM {carga}')[0][0]
+        if filas:
+            client.execute(f'ALTER TABLE {tabla} REPLACE PARTITION ({anio}, {mes}) FROM {carga}')
+        else:
+            # Periodo que ya no está en la fuente: REPLACE desde una partición
+            # vacía no es uniforme entre versiones, se borra explícitamente
+            client.execute(f'ALTER TABLE {tabla} DROP PARTITION ({anio}, {mes})')
+    finally:
+        client.execute(f'DROP TABLE IF EXISTS {carga}')
+    return filas
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Recalcula los indicadores desde enemdu_persona')
+    ap.add_argument('--tablas', default=','.join(INDICADORES),
+                    help='vistas de indicadores a recalcular, separadas por coma')
+    ap.add_argument('--anios', default='', help='solo estos años (2023,2024)')
+    ap.add_argument('--periodos', default='', help='solo estos periodos AAAAMM (202312,202406)')
+    ap.add_argument('--workers', type=int, default=WORKERS, help='periodos en paralelo')
+    ap.add_argument('--desde-cero', action='store_true',
+                    help='ignora lo anotado por una corrida anterior cortada')
+    args = ap.parse_args()
+
+    vistas = [v for v in args.tablas.split(',') if v]
+    desconocidas = [v for v in vistas if v not in INDICADORES]
+    if desconocidas:
+        ap.error(f"tablas desconocidas: {', '.join(desconocidas)} (opciones: {', '.join(INDICADORES)})")
+    anios = {int(a) for a in args.anios.split(',') if a}
+    periodos = {(int(p[:4]), int(p[4:6])) for p in args.periodos.split(',') if p}
+
+    client = get_ch_client()
+    fuente = periodos_fuente(client)
+    tareas = []
+    for vista in vistas:
+        mv, tabla = INDICADORES[vista]
+        revisar_particion(client, tabla)
+        consulta_mv(client, mv)
+        # Periodos de la fuente y también los que solo quedan en el destino
+        # (se borran)
+        for anio, mes in sorted(set(fuente) | periodos_destino(client, tabla)):
+            if (anios and anio not in anios) or (periodos and (anio, mes) not in periodos):
+                continue
+            tareas.append((vista, mv, tabla, anio, mes, fuente.get((anio, mes), [])))
+
+    hechas = leer_hechas(args.desde_cero)
+    pendientes = [t for t in tareas if clave(t[0], t[3], t[4]) not in hechas]
+    if len(pendientes) < len(tareas):
+        log(f'Retomando: {len(tareas) - len(pendientes)} de {len(tareas)} periodos ya estaban hechos')
+    if not pendientes:
+        log('Nada que reconstruir')
+        ESTADO.unlink(missing_ok=True)
+        return
+    log(f'Reconstruyendo {len(pendientes)} periodos con {args.workers} hilos')
+
+    t0 = time.time()
+    errores = 0
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        futuros = {pool.submit(reconstruir, *t): t for t in pendientes}
+        for i, fut in enumerate(as_completed(futuros), 1):
+            vista, _, _, anio, mes, _ = futuros[fut]
+            try:
+                filas = fut.result()
+            except Exception as e:
+                errores += 1
+                log(f'[ERROR] {vista} {anio}-{mes:02d}: {e}')
+                continue
+            hechas.add(clave(vista, anio, mes))
+            anotar_hechas(hechas)
+            transcurrido = time.time() - t0
+            resta = transcurrido / i * (len(pendientes) - i)
+            log(f'[{i}/{len(pendientes)}] {vista} {anio}-{mes:02d}: {filas:,} filas '
+                f'({transcurrido:.0f}s, faltan ~{resta:.0f}s)')
+
+    if errores:
+        log(f'[WARN] {errores} periodos con error; volver a correr para retomarlos')
+        raise SystemExit(1)
+    ESTADO.unlink(missing_ok=True)
+    log(f'Reconstrucción completa en {time.time() - t0:.0f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# ──────────────────────────────────────────────────────────────
+# Qué consultas sobre enemdu_persona aprovechan las proyecciones
+# por_perfil y por_territorio (create_table.sql), según system.query_log:
+#   - sin argumentos: consultas de las últimas --horas agrupadas por la
+#     proyección que usaron, y las que más leyeron sin usar ninguna (las
+#     candidatas a reescribir o a una proyección nueva)
+#   - --probar "SQL": corre esa consulta y dice si usó una proyección
+#
+#   docker-compose run --rm ingest python uso_proyecciones.py --horas 24
+#   docker-compose run --rm ingest python uso_proyecciones.py --probar \
+#       "SELECT canton, sum(fexp) FROM enemdu_persona WHERE periodo = '202406' GROUP BY canton"
+# ──────────────────────────────────────────────────────────────
+import argparse
+import os
+import uuid
+
+from clickhouse_driver import Client
+
+from ingest_common import log
+
+DATABASE = os.getenv('CH_DATABASE', 'indicadores')
+TABLA    = 'enemdu_persona'
+
+
+def get_ch_client():
+    return Client(
+        host=os.getenv('CH_HOST', 'clickhouse'),
+        port=int(os.getenv('CH_PORT', 9000)),
+        user=os.getenv('CH_USER', 'admin'),
+        password=os.getenv('CH_PASSWORD', 'secret_pw'),
+        database=DATABASE,
+    )
+
+
+def mb(b) -> str:
+    return f'{b / 2**20:,.1f}'
+
+
+def resumen(client, horas: int, top: int):
+    # query_log se escribe cada pocos segundos: se vacía antes de leerlo
+    client.execute('SYSTEM FLUSH LOGS')
+    filtro = ("type = 'QueryFinish' AND query_kind = 'Select' "
+              "AND event_time >= now() - INTERVAL %(h)s HOUR AND has(tables, %(t)s)")
+    params = {'h': horas, 't': f'{DATABASE}.{TABLA}', 'n': top}
+
+    filas = client.execute(
+        "SELECT if(empty(projections), '(ninguna)', arrayStringConcat(projections, ', ')) AS proy, "
+        "count(), avg(query_duration_ms), sum(read_rows), sum(read_bytes) "
+        f"FROM system.query_log WHERE {filtro} GROUP BY proy ORDER BY count() DESC", params)
+    log(f'Consultas sobre {TABLA} en las últimas {horas} h, por proyección usada:')
+    if not filas:
+        log('  (ninguna)')
+        return
+    log(f"  {'proyección':<48} {'consultas':>9} {'ms prom.':>9} {'filas leídas':>14} {'MB leídos':>10}")
+    for proy, n, ms, filas_leidas, bytes_leidos in filas:
+        log(f'  {proy:<48} {n:>9,} {ms:>9.0f} {filas_leidas:>14,} {mb(bytes_leidos):>10}')
+
+    sin = client.execute(
+        "SELECT count(), sum(read_bytes), "
+        "substring(replaceRegexpAll(any(query), '\\\\s+', ' '), 1, 160) "
+        f"FROM system.query_log WHERE {filtro} AND empty(projections) "
+        "GROUP BY normalized_query_hash ORDER BY sum(read_bytes) DESC LIMIT %(n)s", params)
+    if sin:
+        log(f'Las {len(sin)} formas de consulta sin proyección que más leyeron:')
+        for n, bytes_leidos, query in sin:
+            log(f'  {n:>6,} veces, {mb(bytes_leidos):>10} MB: {query}')
+
+
+def probar(client, sql: str):
+    qid = f'uso_proyecciones_{uuid.uuid4().hex}'
+    client.execute(sql, query_id=qid)
+    client.execute('SYSTEM FLUSH LOGS')
+    fila = client.execute(
+        "SELECT projections, read_rows, read_bytes, query_duration_ms FROM system.query_log "
+        "WHERE query_id = %(q)s AND type = 'QueryFinish'", {'q': qid})
+    if not fila:
+        log('[WARN] La consulta no quedó en system.query_log (¿log_queries = 0?)')
+        return
+    proyecciones, filas_leidas, bytes_leidos, ms = fila[0]
+    usadas = ', '.join(proyecciones) if proyecciones else 'ninguna'
+    log(f'Proyección: {usadas}; {filas_leidas:,} filas y {mb(bytes_leidos)} MB leídos en {ms} ms')
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Uso de las proyecciones de enemdu_persona')
+    ap.add_argument('--horas', type=int, default=24, help='ventana de system.query_log')
+    ap.add_argument('--top', type=int, default=10, help='consultas sin proyección a listar')
+    ap.add_argument('--probar', metavar='SQL', help='corre SQL e informa si usó una proyección')
+    args = ap.parse_args()
+
+    client = get_ch_client()
+    if args.probar:
+        probar(client, args.probar)
+    else:
+        resumen(client, args.horas, args.top)
+
+
+if __name__ == '__main__':
+    main()
@@ -29,8 +29,8 @@ CREATE TABLE IF NOT EXISTS enemdu_persona (
     id_vivienda    Nullable(Int128),
 
     -- Localización
-    area           Nullable(String),
-    ciudad         String,
+    area           LowCardinality(Nullable(String)),
+    ciudad         LowCardinality(String),
     cod_inf        Nullable(String),
     panelm         Nullable(String),
 
@@ -97,17 +97,53 @@ CREATE TABLE IF NOT EXISTS enemdu_persona (
     p75            Nullable(Int32),
     p76            Nullable(Int32),
 
-    periodo        String -- Formato 'YYYYMM', usado como clave de partición y ordenamiento
+    periodo        LowCardinality(String), -- Formato 'YYYYMM'
+
+    -- Derivadas al insertar (los cargadores no las envían): filtrar por
+    -- ellas poda particiones y gránulos sin volver a cortar periodo/ciudad
+    anio           UInt16 MATERIALIZED toUInt16OrZero(substring(periodo, 1, 4)),
+    periodo_num    UInt8 MATERIALIZED toUInt8OrZero(substring(periodo, 5, 2)),
+    provincia      LowCardinality(String) MATERIALIZED substring(ciudad, 1, 2),
+    canton         LowCardinality(String) MATERIALIZED substring(ciudad, 1, 4),
+    -- Grupo quinquenal de edad (0, 5, ..., 95); NULL si p03 falta o es inválida
+    grupo_edad     Nullable(UInt8) MATERIALIZED if(p03 BETWEEN 0 AND 125, toUInt8(intDiv(p03, 5) * 5), NULL),
+
+    -- Sumas ponderadas precalculadas para las consultas frecuentes de
+    -- Superset y SQL Lab. ClickHouse las usa solo, sin cambiar la consulta,
+    -- cuando esta agrupa y filtra únicamente por columnas de la proyección y
+    -- pide sum(fexp) o count(). Se mantienen en cada inserción; ver
+    -- ingest/uso_proyecciones.py para saber qué consultas las aprovechan.
+    -- Perfil: series nacionales o por área, por sexo, edad, instrucción y rama
+    PROJECTION por_perfil (
+        SELECT anio, periodo_num, periodo, area, p02, grupo_edad, nnivins, rama1, condact,
+               sum(fexp), count()
+        GROUP BY anio, periodo_num, periodo, area, p02, grupo_edad, nnivins, rama1, condact
+    ),
+    -- Territorio: último periodo por cantón o parroquia, totales por provincia
+    PROJECTION por_territorio (
+        SELECT anio, periodo_num, periodo, area, provincia, canton, ciudad, p02, condact,
+               sum(fexp), count()
+        GROUP BY anio, periodo_num, periodo, area, provincia, canton, ciudad, p02, condact
+    )
 )
 ENGINE = MergeTree
-ORDER BY (periodo)
-SETTINGS index_granularity = 8192;
+-- Una partición por año; dentro, ordenado para filtrar por área y geografía
+PARTITION BY anio
+ORDER BY (periodo, area, provincia, canton, ciudad)
+-- Ventana de deduplicación: los reintentos de un bloque con el mismo
+-- insert_deduplication_token se descartan (ver ingest_manifest). Un INSERT
+-- sin token se deduplica por el hash del bloque: dos bloques idénticos
+-- legítimos pierden uno. Los cargadores siempre mandan token (único por
+-- corrida si USE_MANIFEST=false); otro INSERT a mano debe llevar token o
+-- insert_deduplicate = 0
+SETTINGS index_granularity = 8192, non_replicated_deduplication_window = 10000,
+         allow_nullable_key = 1;
 
 -- Tabla para ENEMDU Vivienda
 CREATE TABLE IF NOT EXISTS enemdu_vivienda (
     -- Columnas de texto
-    area            Nullable(String),
-    ciudad			Nullable(String),
+    area            LowCardinality(Nullable(String)),
+    ciudad			LowCardinality(Nullable(String)),
     conglomerado	Nullable(String),
     estrato			Nullable(String),
 	
@@ -121,7 +157,7 @@ CREATE TABLE IF NOT EXISTS enemdu_vivienda (
 	
     -- Columnas numéricas pequeñas
     panelm			Nullable(String),
-    periodo			String,
+    periodo			LowCardinality(String),
     sector			Nullable(Int32),
     upm				Nullable(Int128),
 	
@@ -218,9 +254,18 @@ CREATE TABLE IF NOT EXISTS enemdu_vivienda (
     vi1811			Nullable(Int32),
     vi1812			Nullable(Int32),
     vi1813			Nullable(Int32),
-    vi1814			Nullable(Int32)
+    vi1814			Nullable(Int32),
+
+    -- Derivadas al insertar, como en enemdu_persona
+    anio            UInt16 MATERIALIZED toUInt16OrZero(substring(periodo, 1, 4)),
+    periodo_num     UInt8 MATERIALIZED toUInt8OrZero(substring(periodo, 5, 2)),
+    provincia       LowCardinality(String) MATERIALIZED substring(ifNull(ciudad, ''), 1, 2),
+    canton          LowCardinality(String) MATERIALIZED substring(ifNull(ciudad, ''), 1, 4)
 ) ENGINE = MergeTree()
-ORDER BY (periodo);
+PARTITION BY anio
+ORDER BY (periodo, area, provincia, canton, ciudad)
+-- Misma deduplicación que enemdu_persona (ver arriba)
+SETTINGS non_replicated_deduplication_window = 10000, allow_nullable_key = 1;
 
 -- Tabla para los códigos de provincias/cantones
 DROP TABLE IF EXISTS diccionario_provincias;
@@ -233,164 +278,447 @@ CREATE TABLE diccionario_provincias (
     NombreParroquia   String
 )
 ENGINE = MergeTree()
-ORDER BY (CodigoProvincia, CodigoCanton, CodigoParroquia);
+ORDER BY (CodigoProvincia, CodigoCanton, CodigoParroquia)
+-- Misma deduplicación que enemdu_persona (ver arriba)
+SETTINGS non_replicated_deduplication_window = 10000;
 
--- Tablas de indicadores separadas:
--- 1) Indicadores nacionales persona
--- DROP TABLE IF EXISTS indicadores_persona_nacionales;
-CREATE TABLE IF NOT EXISTS indicadores_persona_nacionales (
+-- Nombres por código geográfico de 6 dígitos (provincia+cantón+parroquia,
+-- como en enemdu_persona.ciudad). Las vistas resuelven los nombres al leer
+-- con dictGet; ingest_codigos.py lo recarga (SYSTEM RELOAD DICTIONARY) tras
+-- cargar la tabla, así que una corrección de nombres no toca los indicadores.
+-- LIFETIME(0): sin recargas periódicas. Usuario y clave vienen de la
+-- colección fuente_diccionarios (config.d/fuente_diccionarios.xml), que los
+-- toma del entorno del servicio clickhouse.
+CREATE DICTIONARY IF NOT EXISTS diccionario_geo (
+    geo_code          String,
+    NombreProvincia   String DEFAULT '',
+    NombreCanton      String DEFAULT '',
+    NombreParroquia   String DEFAULT ''
+)
+PRIMARY KEY geo_code
+SOURCE(CLICKHOUSE(
+    NAME fuente_diccionarios
+    QUERY 'SELECT concat(CodigoProvincia, CodigoCanton, CodigoParroquia) AS geo_code, any(NombreProvincia) AS NombreProvincia, any(NombreCanton) AS NombreCanton, any(NombreParroquia) AS NombreParroquia FROM indicadores.diccionario_provincias GROUP BY geo_code'
+))
+LAYOUT(COMPLEX_KEY_HASHED())
+LIFETIME(0);
+
+-- Manifiesto de ingesta: un registro por archivo (hash de contenido) y
+-- tabla destino; la versión más reciente de cada archivo gana
+CREATE TABLE IF NOT EXISTS ingest_manifest (
+    file_name     String,
+    content_hash  String,                  -- blake2b-128 del archivo
+    target_table  String,
+    row_count     UInt64,                  -- filas confirmadas hasta ahora
+    chunk_rows    UInt32,                  -- filas por trozo usadas (para retomar)
+    chunks_done   UInt32,
+    status        LowCardinality(String),  -- 'en_curso' | 'completo'
+    updated_at    DateTime64(3)
+)
+ENGINE = ReplacingMergeTree(updated_at)
+ORDER BY (target_table, content_hash);
+
+-- Indicadores de calcular_indicadores.py (nacional y por ciudad). Una
+-- partición por periodo: cada corrida reemplaza la suya con REPLACE PARTITION
+CREATE TABLE IF NOT EXISTS indicadores_nacionales (
     anio                UInt16,
-    periodo_num         UInt8,
-    area                UInt8,
-    tpg                 Float32,
-    tpb                 Float32,
-    td                  Float32,
-    empleo_total        Float32,
-    formal              Float32,
-    informal            Float32,
-    adecuado            Float32,
-    subempleo           Float32,
-    no_remunerado       Float32,
-    otro_no_pleno       Float32,
-    brecha_adecuado_hm  Float32,
-    brecha_salarial_hm  Float32,
-    nini                Float32,
-    desempleo_juvenil   Float32,
-    trabajo_infantil    Float32,
-    manufactura_empleo  Float32
+    periodo             UInt8,
+    mes                 LowCardinality(String),
+    tpg                 Nullable(Float32),
+    tpb                 Nullable(Float32),
+    td                  Nullable(Float32),
+    empleo_total        Nullable(Float32),
+    formal              Nullable(Float32),
+    informal            Nullable(Float32),
+    adecuado            Nullable(Float32),
+    subempleo           Nullable(Float32),
+    no_remunerado       Nullable(Float32),
+    otro_no_pleno       Nullable(Float32),
+    brecha_adecuado_hm  Nullable(Float32),
+    brecha_salarial_hm  Nullable(Float32),
+    nini                Nullable(Float32),
+    desempleo_juvenil   Nullable(Float32),
+    trabajo_infantil    Nullable(Float32),
+    manufactura_empleo  Nullable(Float32),
+    -- Series entre periodos (pp = puntos porcentuales; NULL sin periodo de comparación)
+    tpg_var_anual                 Nullable(Float32),
+    tpb_var_anual                 Nullable(Float32),
+    td_var_anual                  Nullable(Float32),
+    empleo_total_var_anual        Nullable(Float32),
+    formal_var_anual              Nullable(Float32),
+    informal_var_anual            Nullable(Float32),
+    adecuado_var_anual            Nullable(Float32),
+    subempleo_var_anual           Nullable(Float32),
+    no_remunerado_var_anual       Nullable(Float32),
+    otro_no_pleno_var_anual       Nullable(Float32),
+    brecha_adecuado_hm_var_anual  Nullable(Float32),
+    brecha_salarial_hm_var_anual  Nullable(Float32),
+    nini_var_anual                Nullable(Float32),
+    desempleo_juvenil_var_anual   Nullable(Float32),
+    trabajo_infantil_var_anual    Nullable(Float32),
+    manufactura_empleo_var_anual  Nullable(Float32),
+    tpg_var_trim                  Nullable(Float32),
+    tpb_var_trim                  Nullable(Float32),
+    td_var_trim                   Nullable(Float32),
+    empleo_total_var_trim         Nullable(Float32),
+    formal_var_trim               Nullable(Float32),
+    informal_var_trim             Nullable(Float32),
+    adecuado_var_trim             Nullable(Float32),
+    subempleo_var_trim            Nullable(Float32),
+    no_remunerado_var_trim        Nullable(Float32),
+    otro_no_pleno_var_trim        Nullable(Float32),
+    brecha_adecuado_hm_var_trim   Nullable(Float32),
+    brecha_salarial_hm_var_trim   Nullable(Float32),
+    nini_var_trim                 Nullable(Float32),
+    desempleo_juvenil_var_trim    Nullable(Float32),
+    trabajo_infantil_var_trim     Nullable(Float32),
+    manufactura_empleo_var_trim   Nullable(Float32),
+    tpg_prom_12m                  Nullable(Float32),
+    tpb_prom_12m                  Nullable(Float32),
+    td_prom_12m                   Nullable(Float32),
+    empleo_total_prom_12m         Nullable(Float32),
+    formal_prom_12m               Nullable(Float32),
+    informal_prom_12m             Nullable(Float32),
+    adecuado_prom_12m             Nullable(Float32),
+    subempleo_prom_12m            Nullable(Float32),
+    no_remunerado_prom_12m        Nullable(Float32),
+    otro_no_pleno_prom_12m        Nullable(Float32),
+    brecha_adecuado_hm_prom_12m   Nullable(Float32),
+    brecha_salarial_hm_prom_12m   Nullable(Float32),
+    nini_prom_12m                 Nullable(Float32),
+    desempleo_juvenil_prom_12m    Nullable(Float32),
+    trabajo_infantil_prom_12m     Nullable(Float32),
+    manufactura_empleo_prom_12m   Nullable(Float32),
+    periodos_12m                  UInt8
 )
 ENGINE = MergeTree
-ORDER BY (anio, periodo_num, area);
+PARTITION BY (anio, periodo)
+ORDER BY (anio, periodo);
 
--- 3) Indicadores canton persona
--- DROP TABLE IF EXISTS indicadores_persona_canton;
-CREATE TABLE IF NOT EXISTS indicadores_persona_canton (
-    geo_code        String,
-    NombreProvincia String,
-    NombreCanton    String,
-    NombreParroquia String,
-    anio            UInt16,
-    periodo_num     UInt8,
-    area            UInt8,
-    tpg             Float32,
-    tpb             Float32,
-    td              Float32,
-    empleo_total    Float32,
-    formal          Float32,
-    informal        Float32,
-    adecuado        Float32,
-    subempleo       Float32,
-    no_remunerado   Float32,
-    otro_no_pleno   Float32,
-    brecha_adecuado_hm Float32,
-    brecha_salarial_hm Float32,
-    nini            Float32,
-    desempleo_juvenil Float32,
-    trabajo_infantil Float32,
-    manufactura_empleo Float32
+CREATE TABLE IF NOT EXISTS indicadores_por_ciudad (
+    anio                UInt16,
+    periodo             UInt8,
+    mes                 LowCardinality(String),
+    ciudad              String,
+    tpg                 Nullable(Float32),
+    tpb                 Nullable(Float32),
+    td                  Nullable(Float32),
+    empleo_total        Nullable(Float32),
+    formal              Nullable(Float32),
+    informal            Nullable(Float32),
+    adecuado            Nullable(Float32),
+    subempleo           Nullable(Float32),
+    no_remunerado       Nullable(Float32),
+    otro_no_pleno       Nullable(Float32),
+    brecha_adecuado_hm  Nullable(Float32),
+    brecha_salarial_hm  Nullable(Float32),
+    nini                Nullable(Float32),
+    desempleo_juvenil   Nullable(Float32),
+    trabajo_infantil    Nullable(Float32),
+    manufactura_empleo  Nullable(Float32),
+    -- Series entre periodos (pp = puntos porcentuales; NULL sin periodo de comparación)
+    tpg_var_anual                 Nullable(Float32),
+    tpb_var_anual                 Nullable(Float32),
+    td_var_anual                  Nullable(Float32),
+    empleo_total_var_anual        Nullable(Float32),
+    formal_var_anual              Nullable(Float32),
+    informal_var_anual            Nullable(Float32),
+    adecuado_var_anual            Nullable(Float32),
+    subempleo_var_anual           Nullable(Float32),
+    no_remunerado_var_anual       Nullable(Float32),
+    otro_no_pleno_var_anual       Nullable(Float32),
+    brecha_adecuado_hm_var_anual  Nullable(Float32),
+    brecha_salarial_hm_var_anual  Nullable(Float32),
+    nini_var_anual                Nullable(Float32),
+    desempleo_juvenil_var_anual   Nullable(Float32),
+    trabajo_infantil_var_anual    Nullable(Float32),
+    manufactura_empleo_var_anual  Nullable(Float32),
+    tpg_var_trim                  Nullable(Float32),
+    tpb_var_trim                  Nullable(Float32),
+    td_var_trim                   Nullable(Float32),
+    empleo_total_var_trim         Nullable(Float32),
+    formal_var_trim               Nullable(Float32),
+    informal_var_trim             Nullable(Float32),
+    adecuado_var_trim             Nullable(Float32),
+    subempleo_var_trim            Nullable(Float32),
+    no_remunerado_var_trim        Nullable(Float32),
+    otro_no_pleno_var_trim        Nullable(Float32),
+    brecha_adecuado_hm_var_trim   Nullable(Float32),
+    brecha_salarial_hm_var_trim   Nullable(Float32),
+    nini_var_trim                 Nullable(Float32),
+    desempleo_juvenil_var_trim    Nullable(Float32),
+    trabajo_infantil_var_trim     Nullable(Float32),
+    manufactura_empleo_var_trim   Nullable(Float32),
+    tpg_prom_12m                  Nullable(Float32),
+    tpb_prom_12m                  Nullable(Float32),
+    td_prom_12m                   Nullable(Float32),
+    empleo_total_prom_12m         Nullable(Float32),
+    formal_prom_12m               Nullable(Float32),
+    informal_prom_12m             Nullable(Float32),
+    adecuado_prom_12m             Nullable(Float32),
+    subempleo_prom_12m            Nullable(Float32),
+    no_remunerado_prom_12m        Nullable(Float32),
+    otro_no_pleno_prom_12m        Nullable(Float32),
+    brecha_adecuado_hm_prom_12m   Nullable(Float32),
+    brecha_salarial_hm_prom_12m   Nullable(Float32),
+    nini_prom_12m                 Nullable(Float32),
+    desempleo_juvenil_prom_12m    Nullable(Float32),
+    trabajo_infantil_prom_12m     Nullable(Float32),
+    manufactura_empleo_prom_12m   Nullable(Float32),
+    periodos_12m                  UInt8
 )
 ENGINE = MergeTree
-ORDER BY (geo_code, anio, periodo_num, area);
+PARTITION BY (anio, periodo)
+ORDER BY (anio, periodo, ciudad);
+
+-- Tablas de indicadores separadas. Cada vista materializada escribe, por
+-- bloque insertado, las sumas ponderadas (sumIf) detrás de cada indicador en
+-- una tabla AggregatingMergeTree (*_estado); las columnas
+-- SimpleAggregateFunction(sum, ...) se suman al fusionar partes, así que un
+-- periodo cargado en varios bloques termina con las mismas sumas que cargado
+-- de una vez. Los porcentajes salen de vistas comunes con los nombres de
+-- siempre, que vuelven a sumar al leer (las partes sin fusionar también).
+-- Cada periodo es una partición: ingest/reconstruir_indicadores.py recalcula
+-- un periodo desde enemdu_persona y lo cambia con REPLACE PARTITION.
+
+-- 1) Indicadores nacionales persona
+CREATE TABLE IF NOT EXISTS indicadores_persona_nacionales_estado (
+    anio             UInt16,
+    periodo_num      UInt8,
+    area             UInt8,
+    w_total          SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_pet            SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_pea_pet        SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_pea            SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_ocup           SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_desocup        SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_formal         SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_informal       SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_adecuado       SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_subempleo      SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_no_remunerado  SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_otro_no_pleno  SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_adecuado_h     SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_pea_h          SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_adecuado_m     SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_pea_m          SimpleAggregateFunction(sum, Nullable(Float64)),
+    wi_ingreso_h     SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_ingreso_h      SimpleAggregateFunction(sum, Nullable(Float64)),
+    wi_ingreso_m     SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_ingreso_m      SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_nini           SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_15_24          SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_desocup_18_29  SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_pea_18_29      SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_trab_infantil  SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_5_14           SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_manufactura    SimpleAggregateFunction(sum, Nullable(Float64))
+)
+ENGINE = AggregatingMergeTree
+PARTITION BY (anio, periodo_num)
+ORDER BY (anio, periodo_num, area);
 
--- Vistas materializadas:
--- MV indicadores nacionales persona
 CREATE MATERIALIZED VIEW IF NOT EXISTS mv_indicadores_persona_nacionales
-TO indicadores_persona_nacionales
+TO indicadores_persona_nacionales_estado
 AS
 SELECT
-    toUInt16(substring(p.periodo,1,4))                                       AS anio,
-    toUInt8(substring(p.periodo,5,2))                                        AS periodo_num,
-    toUInt8(p.area)                                                          AS area,
-    ifNull(100.0 * sumIf(p.fexp, p.p03 >= 15 AND p.condact BETWEEN 1 AND 8) / sumIf(p.fexp, p.p03 >= 15), 0)                    AS tpg,
-    ifNull(100.0 * sumIf(p.fexp, p.condact BETWEEN 1 AND 8) / sumIf(p.fexp, 1), 0)                                                AS tpb,
-    ifNull(100.0 * sumIf(p.fexp, p.condact IN (7,8)) / sumIf(p.fexp, p.condact BETWEEN 1 AND 8), 0)                              AS td,
-    ifNull(100.0 * sumIf(p.fexp, p.condact BETWEEN 1 AND 6) / sumIf(p.fexp, p.condact BETWEEN 1 AND 8), 0)                        AS empleo_total,
-    ifNull(100.0 * sumIf(p.fexp, p.secemp = 1) / sumIf(p.fexp, p.condact BETWEEN 1 AND 6), 0)                                    AS formal,
-    ifNull(100.0 * sumIf(p.fexp, p.secemp = 2) / sumIf(p.fexp, p.condact BETWEEN 1 AND 6), 0)                                    AS informal,
-    ifNull(100.0 * sumIf(p.fexp, p.condact = 1) / sumIf(p.fexp, p.condact BETWEEN 1 AND 8), 0)                                    AS adecuado,
-    ifNull(100.0 * sumIf(p.fexp, p.condact IN (2,3)) / sumIf(p.fexp, p.condact BETWEEN 1 AND 8), 0)                              AS subempleo,
-    ifNull(100.0 * sumIf(p.fexp, p.condact = 5) / sumIf(p.fexp, p.condact BETWEEN 1 AND 8), 0)                                    AS no_remunerado,
-    ifNull(100.0 * sumIf(p.fexp, p.condact = 4) / sumIf(p.fexp, p.condact BETWEEN 1 AND 8), 0)                                    AS otro_no_pleno,
-    ifNull((100.0 * sumIf(p.fexp, p.p02 = 1 AND p.condact = 1) / sumIf(p.fexp, p.p02 = 1 AND p.condact BETWEEN 1 AND 8)
-         - 100.0 * sumIf(p.fexp, p.p02 = 2 AND p.condact = 1) / sumIf(p.fexp, p.p02 = 2 AND p.condact BETWEEN 1 AND 8)), 0)      AS brecha_adecuado_hm,
-    ifNull(((sumIf(p.fexp * p.ingrl, p.p02 = 1 AND p.ingrl > 0) / sumIf(p.fexp, p.p02 = 1 AND p.ingrl > 0))
-         - (sumIf(p.fexp * p.ingrl, p.p02 = 2 AND p.ingrl > 0) / sumIf(p.fexp, p.p02 = 2 AND p.ingrl > 0)))
-         / (sumIf(p.fexp * p.ingrl, p.p02 = 1 AND p.ingrl > 0) / sumIf(p.fexp, p.p02 = 1 AND p.ingrl > 0)) * 100.0, 0)           AS brecha_salarial_hm,
-    ifNull(100.0 * sumIf(p.fexp, p.p03 BETWEEN 15 AND 24 AND (p.p07 = 2 OR p.p07 IS NULL)) / sumIf(p.fexp, p.p03 BETWEEN 15 AND 24), 0) AS nini,
-    ifNull(100.0 * sumIf(p.fexp, p.p03 BETWEEN 18 AND 29 AND p.condact IN (7,8)) / sumIf(p.fexp, p.p03 BETWEEN 18 AND 29 AND p.condact BETWEEN 1 AND 8), 0) AS desempleo_juvenil,
-    ifNull(100.0 * sumIf(p.fexp, p.p03 BETWEEN 5 AND 14 AND (p.condact BETWEEN 1 AND 6 OR p.p24 > 0)) / sumIf(p.fexp, p.p03 BETWEEN 5 AND 14), 0) AS trabajo_infantil,
-    ifNull(100.0 * sumIf(p.fexp, p.rama1 = 3) / sumIf(p.fexp, p.condact BETWEEN 1 AND 6), 0)                                         AS manufactura_empleo
-FROM enemdu_persona AS p
+    p.anio                                                                                 AS anio,
+    p.periodo_num                                                                          AS periodo_num,
+    toUInt8(p.area)                                                                        AS area,
+    sumIf(p.fexp, 1)                                                                       AS w_total,
+    sumIf(p.fexp, p.p03 >= 15)                                                             AS w_pet,
+    sumIf(p.fexp, p.p03 >= 15 AND p.condact BETWEEN 1 AND 8)                               AS w_pea_pet,
+    sumIf(p.fexp, p.condact BETWEEN 1 AND 8)                                               AS w_pea,
+    sumIf(p.fexp, p.condact BETWEEN 1 AND 6)                                               AS w_ocup,
+    sumIf(p.fexp, p.condact IN (7,8))                                                      AS w_desocup,
+    sumIf(p.fexp, p.secemp = 1)                                                            AS w_formal,
+    sumIf(p.fexp, p.secemp = 2)                                                            AS w_informal,
+    sumIf(p.fexp, p.condact = 1)                                                           AS w_adecuado,
+    sumIf(p.fexp, p.condact IN (2,3))                                                      AS w_subempleo,
+    sumIf(p.fexp, p.condact = 5)                                                           AS w_no_remunerado,
+    sumIf(p.fexp, p.condact = 4)                                                           AS w_otro_no_pleno,
+    sumIf(p.fexp, p.p02 = 1 AND p.condact = 1)                                             AS w_adecuado_h,
+    sumIf(p.fexp, p.p02 = 1 AND p.condact BETWEEN 1 AND 8)                                 AS w_pea_h,
+    sumIf(p.fexp, p.p02 = 2 AND p.condact = 1)                                             AS w_adecuado_m,
+    sumIf(p.fexp, p.p02 = 2 AND p.condact BETWEEN 1 AND 8)                                 AS w_pea_m,
+    sumIf(p.fexp * p.ingrl, p.p02 = 1 AND p.ingrl > 0)                                     AS wi_ingreso_h,
+    sumIf(p.fexp, p.p02 = 1 AND p.ingrl > 0)                                               AS w_ingreso_h,
+    sumIf(p.fexp * p.ingrl, p.p02 = 2 AND p.ingrl > 0)                                     AS wi_ingreso_m,
+    sumIf(p.fexp, p.p02 = 2 AND p.ingrl > 0)                                               AS w_ingreso_m,
+    sumIf(p.fexp, p.p03 BETWEEN 15 AND 24 AND (p.p07 = 2 OR p.p07 IS NULL))                AS w_nini,
+    sumIf(p.fexp, p.p03 BETWEEN 15 AND 24)                                                 AS w_15_24,
+    sumIf(p.fexp, p.p03 BETWEEN 18 AND 29 AND p.condact IN (7,8))                          AS w_desocup_18_29,
+    sumIf(p.fexp, p.p03 BETWEEN 18 AND 29 AND p.condact BETWEEN 1 AND 8)                   AS w_pea_18_29,
+    sumIf(p.fexp, p.p03 BETWEEN 5 AND 14 AND (p.condact BETWEEN 1 AND 6 OR p.p24 > 0))     AS w_trab_infantil,
+    sumIf(p.fexp, p.p03 BETWEEN 5 AND 14)                                                  AS w_5_14,
+    sumIf(p.fexp, p.rama1 = 3)                                                             AS w_manufactura
+FROM indicadores.enemdu_persona AS p
+GROUP BY anio, periodo_num, area;
+
+CREATE VIEW IF NOT EXISTS indicadores_persona_nacionales AS
+SELECT
+    anio,
+    periodo_num,
+    area,
+    toFloat32(ifNull(100.0 * sum(w_pea_pet) / sum(w_pet), 0))                              AS tpg,
+    toFloat32(ifNull(100.0 * sum(w_pea) / sum(w_total), 0))                                AS tpb,
+    toFloat32(ifNull(100.0 * sum(w_desocup) / sum(w_pea), 0))                              AS td,
+    toFloat32(ifNull(100.0 * sum(w_ocup) / sum(w_pea), 0))                                 AS empleo_total,
+    toFloat32(ifNull(100.0 * sum(w_formal) / sum(w_ocup), 0))                              AS formal,
+    toFloat32(ifNull(100.0 * sum(w_informal) / sum(w_ocup), 0))                            AS informal,
+    toFloat32(ifNull(100.0 * sum(w_adecuado) / sum(w_pea), 0))                             AS adecuado,
+    toFloat32(ifNull(100.0 * sum(w_subempleo) / sum(w_pea), 0))                            AS subempleo,
+    toFloat32(ifNull(100.0 * sum(w_no_remunerado) / sum(w_pea), 0))                        AS no_remunerado,
+    toFloat32(ifNull(100.0 * sum(w_otro_no_pleno) / sum(w_pea), 0))                        AS otro_no_pleno,
+    toFloat32(ifNull(100.0 * sum(w_adecuado_h) / sum(w_pea_h)
+         - 100.0 * sum(w_adecuado_m) / sum(w_pea_m), 0))                                   AS brecha_adecuado_hm,
+    toFloat32(ifNull((sum(wi_ingreso_h) / sum(w_ingreso_h) - sum(wi_ingreso_m) / sum(w_ingreso_m))
+         / (sum(wi_ingreso_h) / sum(w_ingreso_h)) * 100.0, 0))                             AS brecha_salarial_hm,
+    toFloat32(ifNull(100.0 * sum(w_nini) / sum(w_15_24), 0))                               AS nini,
+    toFloat32(ifNull(100.0 * sum(w_desocup_18_29) / sum(w_pea_18_29), 0))                  AS desempleo_juvenil,
+    toFloat32(ifNull(100.0 * sum(w_trab_infantil) / sum(w_5_14), 0))                       AS trabajo_infantil,
+    toFloat32(ifNull(100.0 * sum(w_manufactura) / sum(w_ocup), 0))                         AS manufactura_empleo
+FROM indicadores_persona_nacionales_estado
 GROUP BY anio, periodo_num, area;
 
--- MV indicadores canton persona
+-- 2) Indicadores canton persona
+CREATE TABLE IF NOT EXISTS indicadores_persona_canton_estado (
+    geo_code         String,
+    anio             UInt16,
+    periodo_num      UInt8,
+    area             UInt8,
+    w_total          SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_pet            SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_pea_pet        SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_pea            SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_ocup           SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_desocup        SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_formal         SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_informal       SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_adecuado       SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_subempleo      SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_no_remunerado  SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_otro_no_pleno  SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_adecuado_h     SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_pea_h          SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_adecuado_m     SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_pea_m          SimpleAggregateFunction(sum, Nullable(Float64)),
+    wi_ingreso_h     SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_ingreso_h      SimpleAggregateFunction(sum, Nullable(Float64)),
+    wi_ingreso_m     SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_ingreso_m      SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_nini           SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_15_24          SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_desocup_18_29  SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_pea_18_29      SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_trab_infantil  SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_5_14           SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_manufactura    SimpleAggregateFunction(sum, Nullable(Float64))
+)
+ENGINE = AggregatingMergeTree
+PARTITION BY (anio, periodo_num)
+ORDER BY (geo_code, anio, periodo_num, area);
+
 CREATE MATERIALIZED VIEW IF NOT EXISTS mv_indicadores_persona_canton
-TO indicadores_persona_canton
+TO indicadores_persona_canton_estado
 AS
 SELECT
-    concat(substr(p.ciudad,1,2),substr(p.ciudad,3,2),substr(p.ciudad,5,2))     AS geo_code,
-    dic.NombreProvincia,
-    dic.NombreCanton,
-    dic.NombreParroquia,
-    toUInt16(substr(p.periodo,1,4))                                           AS anio,
-    toUInt8(substr(p.periodo,5,2))                                            AS periodo_num,
-    toUInt8(p.area)                                                            AS area,
-    ifNull(100.0 * sumIf(p.fexp, p.p03 >= 15 AND p.condact BETWEEN 1 AND 8) / sumIf(p.fexp, p.p03 >= 15), 0)                    AS tpg,
-    ifNull(100.0 * sumIf(p.fexp, p.condact BETWEEN 1 AND 8) / sumIf(p.fexp,1), 0)                                                AS tpb,
-    ifNull(100.0 * sumIf(p.fexp, p.condact IN (7,8)) / sumIf(p.fexp, p.condact BETWEEN 1 AND 8), 0)                              AS td,
-    ifNull(100.0 * sumIf(p.fexp, p.condact BETWEEN 1 AND 6) / sumIf(p.fexp, p.condact BETWEEN 1 AND 8), 0)                        AS empleo_total,
-    ifNull(100.0 * sumIf(p.fexp, p.secemp = 1) / sumIf(p.fexp, p.condact BETWEEN 1 AND 6), 0)                                    AS formal,
-    ifNull(100.0 * sumIf(p.fexp, p.secemp = 2) / sumIf(p.fexp, p.condact BETWEEN 1 AND 6), 0)                                    AS informal,
-    ifNull(100.0 * sumIf(p.fexp, p.condact = 1) / sumIf(p.fexp, p.condact BETWEEN 1 AND 8), 0)                                    AS adecuado,
-    ifNull(100.0 * sumIf(p.fexp, p.condact IN (2,3)) / sumIf(p.fexp, p.condact BETWEEN 1 AND 8), 0)                              AS subempleo,
-    ifNull(100.0 * sumIf(p.fexp, p.condact = 5) / sumIf(p.fexp, p.condact BETWEEN 1 AND 8), 0)                                    AS no_remunerado,
-    ifNull(100.0 * sumIf(p.fexp, p.condact = 4) / sumIf(p.fexp, p.condact BETWEEN 1 AND 8), 0)                                    AS otro_no_pleno,
-    ifNull((100.0 * sumIf(p.fexp, p.p02 = 1 AND p.condact = 1) / sumIf(p.fexp, p.p02 = 1 AND p.condact BETWEEN 1 AND 8)
-         - 100.0 * sumIf(p.fexp, p.p02 = 2 AND p.condact = 1) / sumIf(p.fexp, p.p02 = 2 AND p.condact BETWEEN 1 AND 8)), 0)      AS brecha_adecuado_hm,
-    ifNull(((sumIf(p.fexp * p.ingrl, p.p02 = 1 AND p.ingrl > 0) / sumIf(p.fexp, p.p02 = 1 AND p.ingrl > 0))
-         - (sumIf(p.fexp * p.ingrl, p.p02 = 2 AND p.ingrl > 0) / sumIf(p.fexp, p.p02 = 2 AND p.ingrl > 0)))
-         / (sumIf(p.fexp * p.ingrl, p.p02 = 1 AND p.ingrl > 0) / sumIf(p.fexp, p.p02 = 1 AND p.ingrl > 0)) * 100.0, 0)           AS brecha_salarial_hm,
-    ifNull(100.0 * sumIf(p.fexp, p.p03 BETWEEN 15 AND 24 AND (p.p07 = 2 OR p.p07 IS NULL)) / sumIf(p.fexp, p.p03 BETWEEN 15 AND 24), 0) AS nini,
-    ifNull(100.0 * sumIf(p.fexp, p.p03 BETWEEN 18 AND 29 AND p.condact IN (7,8)) / sumIf(p.fexp, p.p03 BETWEEN 18 AND 29 AND p.condact BETWEEN 1 AND 8), 0) AS desempleo_juvenil,
-    ifNull(100.0 * sumIf(p.fexp, p.p03 BETWEEN 5 AND 14 AND (p.condact BETWEEN 1 AND 6 OR p.p24 > 0)) / sumIf(p.fexp, p.p03 BETWEEN 5 AND 14), 0) AS trabajo_infantil,
-    ifNull(100.0 * sumIf(p.fexp, p.rama1 = 3) / sumIf(p.fexp, p.condact BETWEEN 1 AND 6), 0)                                         AS manufactura_empleo
-FROM enemdu_persona AS p
-LEFT JOIN diccionario_provincias AS dic
-  ON dic.CodigoProvincia = substr(p.ciudad,1,2)
- AND dic.CodigoCanton    = substr(p.ciudad,3,2)
- AND dic.CodigoParroquia = substr(p.ciudad,5,2)
-GROUP BY geo_code, NombreProvincia, NombreCanton, NombreParroquia, anio, periodo_num, area;
+    substring(p.ciudad, 1, 6)                                                              AS geo_code,
+    p.anio                                                                                 AS anio,
+    p.periodo_num                                                                          AS periodo_num,
+    toUInt8(p.area)                                                                        AS area,
+    sumIf(p.fexp, 1)                                                                       AS w_total,
+    sumIf(p.fexp, p.p03 >= 15)                                                             AS w_pet,
+    sumIf(p.fexp, p.p03 >= 15 AND p.condact BETWEEN 1 AND 8)                               AS w_pea_pet,
+    sumIf(p.fexp, p.condact BETWEEN 1 AND 8)                                               AS w_pea,
+    sumIf(p.fexp, p.condact BETWEEN 1 AND 6)                                               AS w_ocup,
+    sumIf(p.fexp, p.condact IN (7,8))                                                      AS w_desocup,
+    sumIf(p.fexp, p.secemp = 1)                                                            AS w_formal,
+    sumIf(p.fexp, p.secemp = 2)                                                            AS w_informal,
+    sumIf(p.fexp, p.condact = 1)                                                           AS w_adecuado,
+    sumIf(p.fexp, p.condact IN (2,3))                                                      AS w_subempleo,
+    sumIf(p.fexp, p.condact = 5)                                                           AS w_no_remunerado,
+    sumIf(p.fexp, p.condact = 4)                                                           AS w_otro_no_pleno,
+    sumIf(p.fexp, p.p02 = 1 AND p.condact = 1)                                             AS w_adecuado_h,
+    sumIf(p.fexp, p.p02 = 1 AND p.condact BETWEEN 1 AND 8)                                 AS w_pea_h,
+    sumIf(p.fexp, p.p02 = 2 AND p.condact = 1)                                             AS w_adecuado_m,
+    sumIf(p.fexp, p.p02 = 2 AND p.condact BETWEEN 1 AND 8)                                 AS w_pea_m,
+    sumIf(p.fexp * p.ingrl, p.p02 = 1 AND p.ingrl > 0)                                     AS wi_ingreso_h,
+    sumIf(p.fexp, p.p02 = 1 AND p.ingrl > 0)                                               AS w_ingreso_h,
+    sumIf(p.fexp * p.ingrl, p.p02 = 2 AND p.ingrl > 0)                                     AS wi_ingreso_m,
+    sumIf(p.fexp, p.p02 = 2 AND p.ingrl > 0)                                               AS w_ingreso_m,
+    sumIf(p.fexp, p.p03 BETWEEN 15 AND 24 AND (p.p07 = 2 OR p.p07 IS NULL))                AS w_nini,
+    sumIf(p.fexp, p.p03 BETWEEN 15 AND 24)                                                 AS w_15_24,
+    sumIf(p.fexp, p.p03 BETWEEN 18 AND 29 AND p.condact IN (7,8))                          AS w_desocup_18_29,
+    sumIf(p.fexp, p.p03 BETWEEN 18 AND 29 AND p.condact BETWEEN 1 AND 8)                   AS w_pea_18_29,
+    sumIf(p.fexp, p.p03 BETWEEN 5 AND 14 AND (p.condact BETWEEN 1 AND 6 OR p.p24 > 0))     AS w_trab_infantil,
+    sumIf(p.fexp, p.p03 BETWEEN 5 AND 14)                                                  AS w_5_14,
+    sumIf(p.fexp, p.rama1 = 3)                                                             AS w_manufactura
+FROM indicadores.enemdu_persona AS p
+GROUP BY geo_code, anio, periodo_num, area;
+
+CREATE VIEW IF NOT EXISTS indicadores_persona_canton AS
+SELECT
+    geo_code,
+    dictGet('indicadores.diccionario_geo', 'NombreProvincia', tuple(geo_code))             AS NombreProvincia,
+    dictGet('indicadores.diccionario_geo', 'NombreCanton', tuple(geo_code))                AS NombreCanton,
+    dictGet('indicadores.diccionario_geo', 'NombreParroquia', tuple(geo_code))             AS NombreParroquia,
+    anio,
+    periodo_num,
+    area,
+    toFloat32(ifNull(100.0 * sum(w_pea_pet) / sum(w_pet), 0))                              AS tpg,
+    toFloat32(ifNull(100.0 * sum(w_pea) / sum(w_total), 0))                                AS tpb,
+    toFloat32(ifNull(100.0 * sum(w_desocup) / sum(w_pea), 0))                              AS td,
+    toFloat32(ifNull(100.0 * sum(w_ocup) / sum(w_pea), 0))                                 AS empleo_total,
+    toFloat32(ifNull(100.0 * sum(w_formal) / sum(w_ocup), 0))                              AS formal,
+    toFloat32(ifNull(100.0 * sum(w_informal) / sum(w_ocup), 0))                            AS informal,
+    toFloat32(ifNull(100.0 * sum(w_adecuado) / sum(w_pea), 0))                             AS adecuado,
+    toFloat32(ifNull(100.0 * sum(w_subempleo) / sum(w_pea), 0))                            AS subempleo,
+    toFloat32(ifNull(100.0 * sum(w_no_remunerado) / sum(w_pea), 0))                        AS no_remunerado,
+    toFloat32(ifNull(100.0 * sum(w_otro_no_pleno) / sum(w_pea), 0))                        AS otro_no_pleno,
+    toFloat32(ifNull(100.0 * sum(w_adecuado_h) / sum(w_pea_h)
+         - 100.0 * sum(w_adecuado_m) / sum(w_pea_m), 0))                                   AS brecha_adecuado_hm,
+    toFloat32(ifNull((sum(wi_ingreso_h) / sum(w_ingreso_h) - sum(wi_ingreso_m) / sum(w_ingreso_m))
+         / (sum(wi_ingreso_h) / sum(w_ingreso_h)) * 100.0, 0))                             AS brecha_salarial_hm,
+    toFloat32(ifNull(100.0 * sum(w_nini) / sum(w_15_24), 0))                               AS nini,
+    toFloat32(ifNull(100.0 * sum(w_desocup_18_29) / sum(w_pea_18_29), 0))                  AS desempleo_juvenil,
+    toFloat32(ifNull(100.0 * sum(w_trab_infantil) / sum(w_5_14), 0))                       AS trabajo_infantil,
+    toFloat32(ifNull(100.0 * sum(w_manufactura) / sum(w_ocup), 0))                         AS manufactura_empleo
+FROM indicadores_persona_canton_estado
+GROUP BY geo_code, anio, periodo_num, area;
 
--- 1) Tabla de indicadores de pobreza por ingresos
--- DROP TABLE IF EXISTS indicadores_pobreza;
-CREATE TABLE IF NOT EXISTS indicadores_pobreza (
-    anio                  UInt16,
-    periodo_num           UInt8,
-    area                  UInt8,
-    tasa_pobreza_ingresos Float32,
-    tasa_pobreza_extrema_ingresos Float32
+-- 3) Indicadores de pobreza por ingresos (líneas de pobreza: varían cada año)
+CREATE TABLE IF NOT EXISTS indicadores_pobreza_estado (
+    anio             UInt16,
+    periodo_num      UInt8,
+    area             UInt8,
+    w_total          SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_pobre          SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_pobre_extremo  SimpleAggregateFunction(sum, Nullable(Float64))
 )
-ENGINE = MergeTree
+ENGINE = AggregatingMergeTree
+PARTITION BY (anio, periodo_num)
 ORDER BY (anio, periodo_num, area);
 
--- 2) Vista materializada que llena automáticamente indicadores_pobreza
 CREATE MATERIALIZED VIEW IF NOT EXISTS mv_indicadores_pobreza
-TO indicadores_pobreza
+TO indicadores_pobreza_estado
 AS
 SELECT
-    toUInt16(substr(p.periodo, 1, 4))                                                       AS anio,
-    toUInt8(substr(p.periodo, 5, 2))                                                        AS periodo_num,
-    toUInt8(p.area)                                                                         AS area,
-    -- Porcentaje ponderado de personas con ingreso per cápita por debajo de la línea de pobreza (Varía cada año)
-    ifNull(
-        100.0 * sumIf(p.fexp, p.ingpc < 91.43 AND p.ingpc > 0)
-              / sum(p.fexp),
-        0
-    )                                                                                       AS tasa_pobreza_ingresos,
-    ifNull(
-        100.0 * sumIf(p.fexp, p.ingpc < 51.53 AND p.ingpc > 0)
-              / sum(p.fexp),
-        0
-    )                                                                                       AS tasa_pobreza_extrema_ingresos
+    p.anio                                                                                 AS anio,
+    p.periodo_num                                                                          AS periodo_num,
+    toUInt8(p.area)                                                                        AS area,
+    sumIf(p.fexp, 1)                                                                       AS w_total,
+    sumIf(p.fexp, p.ingpc < 91.43 AND p.ingpc > 0)                                         AS w_pobre,
+    sumIf(p.fexp, p.ingpc < 51.53 AND p.ingpc > 0)                                         AS w_pobre_extremo
 FROM indicadores.enemdu_persona AS p
 GROUP BY anio, periodo_num, area;
+
+CREATE VIEW IF NOT EXISTS indicadores_pobreza AS
+SELECT
+    anio,
+    periodo_num,
+    area,
+    toFloat32(ifNull(100.0 * sum(w_pobre) / sum(w_total), 0))                              AS tasa_pobreza_ingresos,
+    toFloat32(ifNull(100.0 * sum(w_pobre_extremo) / sum(w_total), 0))                      AS tasa_pobreza_extrema_ingresos
+FROM indicadores_pobreza_estado
+GROUP BY anio, periodo_num, area;
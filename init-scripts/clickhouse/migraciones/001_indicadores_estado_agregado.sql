@@ -0,0 +1,376 @@
+-- ──────────────────────────────────────────────────────────────
+-- Migración: indicadores con ratios por bloque (MergeTree) → sumas
+-- en AggregatingMergeTree + vistas que calculan los porcentajes.
+-- Las tablas viejas guardan ratios parciales que no se pueden
+-- combinar, así que las sumas se recalculan desde enemdu_persona.
+-- Correr una sola vez, con la ingesta detenida (lo que se inserte
+-- entre el CREATE de las vistas materializadas y el INSERT de abajo
+-- quedaría contado dos veces):
+--
+--   docker exec -i clickhouse clickhouse-client -u admin --password secret_pw \
+--       -d indicadores --multiquery < init-scripts/clickhouse/migraciones/001_indicadores_estado_agregado.sql
+-- ──────────────────────────────────────────────────────────────
+
+-- 1) Las vistas materializadas viejas dejan de escribir
+DROP VIEW IF EXISTS mv_indicadores_persona_nacionales;
+DROP VIEW IF EXISTS mv_indicadores_persona_canton;
+DROP VIEW IF EXISTS mv_indicadores_pobreza;
+
+-- 2) Las tablas viejas quedan aparte hasta que termine el recálculo
+RENAME TABLE
+    indicadores_persona_nacionales TO indicadores_persona_nacionales_anterior,
+    indicadores_persona_canton TO indicadores_persona_canton_anterior,
+    indicadores_pobreza TO indicadores_pobreza_anterior;
+
+-- 3) Esquema nuevo (igual que create_table.sql)
+-- Tablas de indicadores separadas. Cada vista materializada escribe, por
+-- bloque insertado, las sumas ponderadas (sumIf) detrás de cada indicador en
+-- una tabla AggregatingMergeTree (*_estado); las columnas
+-- SimpleAggregateFunction(sum, ...) se suman al fusionar partes, así que un
+-- periodo cargado en varios bloques termina con las mismas sumas que cargado
+-- de una vez. Los porcentajes salen de vistas comunes con los nombres de
+-- siempre, que vuelven a sumar al leer (las partes sin fusionar también).
+
+-- 1) Indicadores nacionales persona
+CREATE TABLE IF NOT EXISTS indicadores_persona_nacionales_estado (
+    anio             UInt16,
+    periodo_num      UInt8,
+    area             UInt8,
+    w_total          SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_pet            SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_pea_pet        SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_pea            SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_ocup           SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_desocup        SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_formal         SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_informal       SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_adecuado       SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_subempleo      SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_no_remunerado  SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_otro_no_pleno  SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_adecuado_h     SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_pea_h          SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_adecuado_m     SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_pea_m          SimpleAggregateFunction(sum, Nullable(Float64)),
+    wi_ingreso_h     SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_ingreso_h      SimpleAggregateFunction(sum, Nullable(Float64)),
+    wi_ingreso_m     SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_ingreso_m      SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_nini           SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_15_24          SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_desocup_18_29  SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_pea_18_29      SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_trab_infantil  SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_5_14           SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_manufactura    SimpleAggregateFunction(sum, Nullable(Float64))
+)
+ENGINE = AggregatingMergeTree
+ORDER BY (anio, periodo_num, area);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_indicadores_persona_nacionales
+TO indicadores_persona_nacionales_estado
+AS
+SELECT
+    toUInt16(substr(p.periodo,1,4))                                                        AS anio,
+    toUInt8(substr(p.periodo,5,2))                                                         AS periodo_num,
+    toUInt8(p.area)                                                                        AS area,
+    sumIf(p.fexp, 1)                                                                       AS w_total,
+    sumIf(p.fexp, p.p03 >= 15)                                                             AS w_pet,
+    sumIf(p.fexp, p.p03 >= 15 AND p.condact BETWEEN 1 AND 8)                               AS w_pea_pet,
+    sumIf(p.fexp, p.condact BETWEEN 1 AND 8)                                               AS w_pea,
+    sumIf(p.fexp, p.condact BETWEEN 1 AND 6)                                               AS w_ocup,
+    sumIf(p.fexp, p.condact IN (7,8))                                                      AS w_desocup,
+    sumIf(p.fexp, p.secemp = 1)                                                            AS w_formal,
+    sumIf(p.fexp, p.secemp = 2)                                                            AS w_informal,
+    sumIf(p.fexp, p.condact = 1)                                                           AS w_adecuado,
+    sumIf(p.fexp, p.condact IN (2,3))                                                      AS w_subempleo,
+    sumIf(p.fexp, p.condact = 5)                                                           AS w_no_remunerado,
+    sumIf(p.fexp, p.condact = 4)                                                           AS w_otro_no_pleno,
+    sumIf(p.fexp, p.p02 = 1 AND p.condact = 1)                                             AS w_adecuado_h,
+    sumIf(p.fexp, p.p02 = 1 AND p.condact BETWEEN 1 AND 8)                                 AS w_pea_h,
+    sumIf(p.fexp, p.p02 = 2 AND p.condact = 1)                                             AS w_adecuado_m,
+    sumIf(p.fexp, p.p02 = 2 AND p.condact BETWEEN 1 AND 8)                                 AS w_pea_m,
+    sumIf(p.fexp * p.ingrl, p.p02 = 1 AND p.ingrl > 0)                                     AS wi_ingreso_h,
+    sumIf(p.fexp, p.p02 = 1 AND p.ingrl > 0)                                               AS w_ingreso_h,
+    sumIf(p.fexp * p.ingrl, p.p02 = 2 AND p.ingrl > 0)                                     AS wi_ingreso_m,
+    sumIf(p.fexp, p.p02 = 2 AND p.ingrl > 0)                                               AS w_ingreso_m,
+    sumIf(p.fexp, p.p03 BETWEEN 15 AND 24 AND (p.p07 = 2 OR p.p07 IS NULL))                AS w_nini,
+    sumIf(p.fexp, p.p03 BETWEEN 15 AND 24)                                                 AS w_15_24,
+    sumIf(p.fexp, p.p03 BETWEEN 18 AND 29 AND p.condact IN (7,8))                          AS w_desocup_18_29,
+    sumIf(p.fexp, p.p03 BETWEEN 18 AND 29 AND p.condact BETWEEN 1 AND 8)                   AS w_pea_18_29,
+    sumIf(p.fexp, p.p03 BETWEEN 5 AND 14 AND (p.condact BETWEEN 1 AND 6 OR p.p24 > 0))     AS w_trab_infantil,
+    sumIf(p.fexp, p.p03 BETWEEN 5 AND 14)                                                  AS w_5_14,
+    sumIf(p.fexp, p.rama1 = 3)                                                             AS w_manufactura
+FROM indicadores.enemdu_persona AS p
+GROUP BY anio, periodo_num, area;
+
+CREATE VIEW IF NOT EXISTS indicadores_persona_nacionales AS
+SELECT
+    anio,
+    periodo_num,
+    area,
+    toFloat32(ifNull(100.0 * sum(w_pea_pet) / sum(w_pet), 0))                              AS tpg,
+    toFloat32(ifNull(100.0 * sum(w_pea) / sum(w_total), 0))                                AS tpb,
+    toFloat32(ifNull(100.0 * sum(w_desocup) / sum(w_pea), 0))                              AS td,
+    toFloat32(ifNull(100.0 * sum(w_ocup) / sum(w_pea), 0))                                 AS empleo_total,
+    toFloat32(ifNull(100.0 * sum(w_formal) / sum(w_ocup), 0))                              AS formal,
+    toFloat32(ifNull(100.0 * sum(w_informal) / sum(w_ocup), 0))                            AS informal,
+    toFloat32(ifNull(100.0 * sum(w_adecuado) / sum(w_pea), 0))                             AS adecuado,
+    toFloat32(ifNull(100.0 * sum(w_subempleo) / sum(w_pea), 0))                            AS subempleo,
+    toFloat32(ifNull(100.0 * sum(w_no_remunerado) / sum(w_pea), 0))                        AS no_remunerado,
+    toFloat32(ifNull(100.0 * sum(w_otro_no_pleno) / sum(w_pea), 0))                        AS otro_no_pleno,
+    toFloat32(ifNull(100.0 * sum(w_adecuado_h) / sum(w_pea_h)
+         - 100.0 * sum(w_adecuado_m) / sum(w_pea_m), 0))                                   AS brecha_adecuado_hm,
+    toFloat32(ifNull((sum(wi_ingreso_h) / sum(w_ingreso_h) - sum(wi_ingreso_m) / sum(w_ingreso_m))
+         / (sum(wi_ingreso_h) / sum(w_ingreso_h)) * 100.0, 0))                             AS brecha_salarial_hm,
+    toFloat32(ifNull(100.0 * sum(w_nini) / sum(w_15_24), 0))                               AS nini,
+    toFloat32(ifNull(100.0 * sum(w_desocup_18_29) / sum(w_pea_18_29), 0))                  AS desempleo_juvenil,
+    toFloat32(ifNull(100.0 * sum(w_trab_infantil) / sum(w_5_14), 0))                       AS trabajo_infantil,
+    toFloat32(ifNull(100.0 * sum(w_manufactura) / sum(w_ocup), 0))                         AS manufactura_empleo
+FROM indicadores_persona_nacionales_estado
+GROUP BY anio, periodo_num, area;
+
+-- 2) Indicadores canton persona
+CREATE TABLE IF NOT EXISTS indicadores_persona_canton_estado (
+    geo_code         String,
+    NombreProvincia  SimpleAggregateFunction(any, String),
+    NombreCanton     SimpleAggregateFunction(any, String),
+    NombreParroquia  SimpleAggregateFunction(any, String),
+    anio             UInt16,
+    periodo_num      UInt8,
+    area             UInt8,
+    w_total          SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_pet            SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_pea_pet        SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_pea            SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_ocup           SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_desocup        SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_formal         SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_informal       SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_adecuado       SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_subempleo      SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_no_remunerado  SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_otro_no_pleno  SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_adecuado_h     SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_pea_h          SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_adecuado_m     SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_pea_m          SimpleAggregateFunction(sum, Nullable(Float64)),
+    wi_ingreso_h     SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_ingreso_h      SimpleAggregateFunction(sum, Nullable(Float64)),
+    wi_ingreso_m     SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_ingreso_m      SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_nini           SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_15_24          SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_desocup_18_29  SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_pea_18_29      SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_trab_infantil  SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_5_14           SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_manufactura    SimpleAggregateFunction(sum, Nullable(Float64))
+)
+ENGINE = AggregatingMergeTree
+ORDER BY (geo_code, anio, periodo_num, area);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_indicadores_persona_canton
+TO indicadores_persona_canton_estado
+AS
+SELECT
+    concat(substr(p.ciudad,1,2),substr(p.ciudad,3,2),substr(p.ciudad,5,2))                 AS geo_code,
+    dic.NombreProvincia,
+    dic.NombreCanton,
+    dic.NombreParroquia,
+    toUInt16(substr(p.periodo,1,4))                                                        AS anio,
+    toUInt8(substr(p.periodo,5,2))                                                         AS periodo_num,
+    toUInt8(p.area)                                                                        AS area,
+    sumIf(p.fexp, 1)                                                                       AS w_total,
+    sumIf(p.fexp, p.p03 >= 15)                                                             AS w_pet,
+    sumIf(p.fexp, p.p03 >= 15 AND p.condact BETWEEN 1 AND 8)                               AS w_pea_pet,
+    sumIf(p.fexp, p.condact BETWEEN 1 AND 8)                                               AS w_pea,
+    sumIf(p.fexp, p.condact BETWEEN 1 AND 6)                                               AS w_ocup,
+    sumIf(p.fexp, p.condact IN (7,8))                                                      AS w_desocup,
+    sumIf(p.fexp, p.secemp = 1)                                                            AS w_formal,
+    sumIf(p.fexp, p.secemp = 2)                                                            AS w_informal,
+    sumIf(p.fexp, p.condact = 1)                                                           AS w_adecuado,
+    sumIf(p.fexp, p.condact IN (2,3))                                                      AS w_subempleo,
+    sumIf(p.fexp, p.condact = 5)                                                           AS w_no_remunerado,
+    sumIf(p.fexp, p.condact = 4)                                                           AS w_otro_no_pleno,
+    sumIf(p.fexp, p.p02 = 1 AND p.condact = 1)                                             AS w_adecuado_h,
+    sumIf(p.fexp, p.p02 = 1 AND p.condact BETWEEN 1 AND 8)                                 AS w_pea_h,
+    sumIf(p.fexp, p.p02 = 2 AND p.condact = 1)                                             AS w_adecuado_m,
+    sumIf(p.fexp, p.p02 = 2 AND p.condact BETWEEN 1 AND 8)                                 AS w_pea_m,
+    sumIf(p.fexp * p.ingrl, p.p02 = 1 AND p.ingrl > 0)                                     AS wi_ingreso_h,
+    sumIf(p.fexp, p.p02 = 1 AND p.ingrl > 0)                                               AS w_ingreso_h,
+    sumIf(p.fexp * p.ingrl, p.p02 = 2 AND p.ingrl > 0)                                     AS wi_ingreso_m,
+    sumIf(p.fexp, p.p02 = 2 AND p.ingrl > 0)                                               AS w_ingreso_m,
+    sumIf(p.fexp, p.p03 BETWEEN 15 AND 24 AND (p.p07 = 2 OR p.p07 IS NULL))                AS w_nini,
+    sumIf(p.fexp, p.p03 BETWEEN 15 AND 24)                                                 AS w_15_24,
+    sumIf(p.fexp, p.p03 BETWEEN 18 AND 29 AND p.condact IN (7,8))                          AS w_desocup_18_29,
+    sumIf(p.fexp, p.p03 BETWEEN 18 AND 29 AND p.condact BETWEEN 1 AND 8)                   AS w_pea_18_29,
+    sumIf(p.fexp, p.p03 BETWEEN 5 AND 14 AND (p.condact BETWEEN 1 AND 6 OR p.p24 > 0))     AS w_trab_infantil,
+    sumIf(p.fexp, p.p03 BETWEEN 5 AND 14)                                                  AS w_5_14,
+    sumIf(p.fexp, p.rama1 = 3)                                                             AS w_manufactura
+FROM indicadores.enemdu_persona AS p
+LEFT JOIN diccionario_provincias AS dic
+  ON dic.CodigoProvincia = substr(p.ciudad,1,2)
+ AND dic.CodigoCanton    = substr(p.ciudad,3,2)
+ AND dic.CodigoParroquia = substr(p.ciudad,5,2)
+GROUP BY geo_code, NombreProvincia, NombreCanton, NombreParroquia, anio, periodo_num, area;
+
+CREATE VIEW IF NOT EXISTS indicadores_persona_canton AS
+SELECT
+    geo_code,
+    any(NombreProvincia)                                                     AS NombreProvincia,
+    any(NombreCanton)                                                                      AS NombreCanton,
+    any(NombreParroquia)                                                                   AS NombreParroquia,
+    anio,
+    periodo_num,
+    area,
+    toFloat32(ifNull(100.0 * sum(w_pea_pet) / sum(w_pet), 0))                              AS tpg,
+    toFloat32(ifNull(100.0 * sum(w_pea) / sum(w_total), 0))                                AS tpb,
+    toFloat32(ifNull(100.0 * sum(w_desocup) / sum(w_pea), 0))                              AS td,
+    toFloat32(ifNull(100.0 * sum(w_ocup) / sum(w_pea), 0))                                 AS empleo_total,
+    toFloat32(ifNull(100.0 * sum(w_formal) / sum(w_ocup), 0))                              AS formal,
+    toFloat32(ifNull(100.0 * sum(w_informal) / sum(w_ocup), 0))                            AS informal,
+    toFloat32(ifNull(100.0 * sum(w_adecuado) / sum(w_pea), 0))                             AS adecuado,
+    toFloat32(ifNull(100.0 * sum(w_subempleo) / sum(w_pea), 0))                            AS subempleo,
+    toFloat32(ifNull(100.0 * sum(w_no_remunerado) / sum(w_pea), 0))                        AS no_remunerado,
+    toFloat32(ifNull(100.0 * sum(w_otro_no_pleno) / sum(w_pea), 0))                        AS otro_no_pleno,
+    toFloat32(ifNull(100.0 * sum(w_adecuado_h) / sum(w_pea_h)
+         - 100.0 * sum(w_adecuado_m) / sum(w_pea_m), 0))                                   AS brecha_adecuado_hm,
+    toFloat32(ifNull((sum(wi_ingreso_h) / sum(w_ingreso_h) - sum(wi_ingreso_m) / sum(w_ingreso_m))
+         / (sum(wi_ingreso_h) / sum(w_ingreso_h)) * 100.0, 0))                             AS brecha_salarial_hm,
+    toFloat32(ifNull(100.0 * sum(w_nini) / sum(w_15_24), 0))                               AS nini,
+    toFloat32(ifNull(100.0 * sum(w_desocup_18_29) / sum(w_pea_18_29), 0))                  AS desempleo_juvenil,
+    toFloat32(ifNull(100.0 * sum(w_trab_infantil) / sum(w_5_14), 0))                       AS trabajo_infantil,
+    toFloat32(ifNull(100.0 * sum(w_manufactura) / sum(w_ocup), 0))                         AS manufactura_empleo
+FROM indicadores_persona_canton_estado
+GROUP BY geo_code, anio, periodo_num, area;
+
+-- 3) Indicadores de pobreza por ingresos (líneas de pobreza: varían cada año)
+CREATE TABLE IF NOT EXISTS indicadores_pobreza_estado (
+    anio             UInt16,
+    periodo_num      UInt8,
+    area             UInt8,
+    w_total          SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_pobre          SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_pobre_extremo  SimpleAggregateFunction(sum, Nullable(Float64))
+)
+ENGINE = AggregatingMergeTree
+ORDER BY (anio, periodo_num, area);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_indicadores_pobreza
+TO indicadores_pobreza_estado
+AS
+SELECT
+    toUInt16(substr(p.periodo,1,4))                                                        AS anio,
+    toUInt8(substr(p.periodo,5,2))                                                         AS periodo_num,
+    toUInt8(p.area)                                                                        AS area,
+    sumIf(p.fexp, 1)                                                                       AS w_total,
+    sumIf(p.fexp, p.ingpc < 91.43 AND p.ingpc > 0)                                         AS w_pobre,
+    sumIf(p.fexp, p.ingpc < 51.53 AND p.ingpc > 0)                                         AS w_pobre_extremo
+FROM indicadores.enemdu_persona AS p
+GROUP BY anio, periodo_num, area;
+
+CREATE VIEW IF NOT EXISTS indicadores_pobreza AS
+SELECT
+    anio,
+    periodo_num,
+    area,
+    toFloat32(ifNull(100.0 * sum(w_pobre) / sum(w_total), 0))                              AS tasa_pobreza_ingresos,
+    toFloat32(ifNull(100.0 * sum(w_pobre_extremo) / sum(w_total), 0))                      AS tasa_pobreza_extrema_ingresos
+FROM indicadores_pobreza_estado
+GROUP BY anio, periodo_num, area;
+
+-- 4) Sumas de los periodos ya cargados
+INSERT INTO indicadores_persona_nacionales_estado
+SELECT
+    toUInt16(substr(p.periodo,1,4))                                                        AS anio,
+    toUInt8(substr(p.periodo,5,2))                                                         AS periodo_num,
+    toUInt8(p.area)                                                                        AS area,
+    sumIf(p.fexp, 1)                                                                       AS w_total,
+    sumIf(p.fexp, p.p03 >= 15)                                                             AS w_pet,
+    sumIf(p.fexp, p.p03 >= 15 AND p.condact BETWEEN 1 AND 8)                               AS w_pea_pet,
+    sumIf(p.fexp, p.condact BETWEEN 1 AND 8)                                               AS w_pea,
+    sumIf(p.fexp, p.condact BETWEEN 1 AND 6)                                               AS w_ocup,
+    sumIf(p.fexp, p.condact IN (7,8))                                                      AS w_desocup,
+    sumIf(p.fexp, p.secemp = 1)                                                            AS w_formal,
+    sumIf(p.fexp, p.secemp = 2)                                                            AS w_informal,
+    sumIf(p.fexp, p.condact = 1)                                                           AS w_adecuado,
+    sumIf(p.fexp, p.condact IN (2,3))                                                      AS w_subempleo,
+    sumIf(p.fexp, p.condact = 5)                                                           AS w_no_remunerado,
+    sumIf(p.fexp, p.condact = 4)                                                           AS w_otro_no_pleno,
+    sumIf(p.fexp, p.p02 = 1 AND p.condact = 1)                                             AS w_adecuado_h,
+    sumIf(p.fexp, p.p02 = 1 AND p.condact BETWEEN 1 AND 8)                                 AS w_pea_h,
+    sumIf(p.fexp, p.p02 = 2 AND p.condact = 1)                                             AS w_adecuado_m,
+    sumIf(p.fexp, p.p02 = 2 AND p.condact BETWEEN 1 AND 8)                                 AS w_pea_m,
+    sumIf(p.fexp * p.ingrl, p.p02 = 1 AND p.ingrl > 0)                                     AS wi_ingreso_h,
+    sumIf(p.fexp, p.p02 = 1 AND p.ingrl > 0)                                               AS w_ingreso_h,
+    sumIf(p.fexp * p.ingrl, p.p02 = 2 AND p.ingrl > 0)                                     AS wi_ingreso_m,
+    sumIf(p.fexp, p.p02 = 2 AND p.ingrl > 0)                                               AS w_ingreso_m,
+    sumIf(p.fexp, p.p03 BETWEEN 15 AND 24 AND (p.p07 = 2 OR p.p07 IS NULL))                AS w_nini,
+    sumIf(p.fexp, p.p03 BETWEEN 15 AND 24)                                                 AS w_15_24,
+    sumIf(p.fexp, p.p03 BETWEEN 18 AND 29 AND p.condact IN (7,8))                          AS w_desocup_18_29,
+    sumIf(p.fexp, p.p03 BETWEEN 18 AND 29 AND p.condact BETWEEN 1 AND 8)                   AS w_pea_18_29,
+    sumIf(p.fexp, p.p03 BETWEEN 5 AND 14 AND (p.condact BETWEEN 1 AND 6 OR p.p24 > 0))     AS w_trab_infantil,
+    sumIf(p.fexp, p.p03 BETWEEN 5 AND 14)                                                  AS w_5_14,
+    sumIf(p.fexp, p.rama1 = 3)                                                             AS w_manufactura
+FROM indicadores.enemdu_persona AS p
+GROUP BY anio, periodo_num, area;
+
+INSERT INTO indicadores_persona_canton_estado
+SELECT
+    concat(substr(p.ciudad,1,2),substr(p.ciudad,3,2),substr(p.ciudad,5,2))                 AS geo_code,
+    dic.NombreProvincia,
+    dic.NombreCanton,
+    dic.NombreParroquia,
+    toUInt16(substr(p.periodo,1,4))                                                        AS anio,
+    toUInt8(substr(p.periodo,5,2))                                                         AS periodo_num,
+    toUInt8(p.area)                                                                        AS area,
+    sumIf(p.fexp, 1)                                                                       AS w_total,
+    sumIf(p.fexp, p.p03 >= 15)                                                             AS w_pet,
+    sumIf(p.fexp, p.p03 >= 15 AND p.condact BETWEEN 1 AND 8)                               AS w_pea_pet,
+    sumIf(p.fexp, p.condact BETWEEN 1 AND 8)                                               AS w_pea,
+    sumIf(p.fexp, p.condact BETWEEN 1 AND 6)                                               AS w_ocup,
+    sumIf(p.fexp, p.condact IN (7,8))                                                      AS w_desocup,
+    sumIf(p.fexp, p.secemp = 1)                                                            AS w_formal,
+    sumIf(p.fexp, p.secemp = 2)                                                            AS w_informal,
+    sumIf(p.fexp, p.condact = 1)                                                           AS w_adecuado,
+    sumIf(p.fexp, p.condact IN (2,3))                                                      AS w_subempleo,
+    sumIf(p.fexp, p.condact = 5)                                                           AS w_no_remunerado,
+    sumIf(p.fexp, p.condact = 4)                                                           AS w_otro_no_pleno,
+    sumIf(p.fexp, p.p02 = 1 AND p.condact = 1)                                             AS w_adecuado_h,
+    sumIf(p.fexp, p.p02 = 1 AND p.condact BETWEEN 1 AND 8)                                 AS w_pea_h,
+    sumIf(p.fexp, p.p02 = 2 AND p.condact = 1)                                             AS w_adecuado_m,
+    sumIf(p.fexp, p.p02 = 2 AND p.condact BETWEEN 1 AND 8)                                 AS w_pea_m,
+    sumIf(p.fexp * p.ingrl, p.p02 = 1 AND p.ingrl > 0)                                     AS wi_ingreso_h,
+    sumIf(p.fexp, p.p02 = 1 AND p.ingrl > 0)                                               AS w_ingreso_h,
+    sumIf(p.fexp * p.ingrl, p.p02 = 2 AND p.ingrl > 0)                                     AS wi_ingreso_m,
+    sumIf(p.fexp, p.p02 = 2 AND p.ingrl > 0)                                               AS w_ingreso_m,
+    sumIf(p.fexp, p.p03 BETWEEN 15 AND 24 AND (p.p07 = 2 OR p.p07 IS NULL))                AS w_nini,
+    sumIf(p.fexp, p.p03 BETWEEN 15 AND 24)                                                 AS w_15_24,
+    sumIf(p.fexp, p.p03 BETWEEN 18 AND 29 AND p.condact IN (7,8))                          AS w_desocup_18_29,
+    sumIf(p.fexp, p.p03 BETWEEN 18 AND 29 AND p.condact BETWEEN 1 AND 8)                   AS w_pea_18_29,
+    sumIf(p.fexp, p.p03 BETWEEN 5 AND 14 AND (p.condact BETWEEN 1 AND 6 OR p.p24 > 0))     AS w_trab_infantil,
+    sumIf(p.fexp, p.p03 BETWEEN 5 AND 14)                                                  AS w_5_14,
+    sumIf(p.fexp, p.rama1 = 3)                                                             AS w_manufactura
+FROM indicadores.enemdu_persona AS p
+LEFT JOIN diccionario_provincias AS dic
+  ON dic.CodigoProvincia = substr(p.ciudad,1,2)
+ AND dic.CodigoCanton    = substr(p.ciudad,3,2)
+ AND dic.CodigoParroquia = substr(p.ciudad,5,2)
+GROUP BY geo_code, NombreProvincia, NombreCanton, NombreParroquia, anio, periodo_num, area;
+
+INSERT INTO indicadores_pobreza_estado
+SELECT
+    toUInt16(substr(p.periodo,1,4))                                                        AS anio,
+    toUInt8(substr(p.periodo,5,2))                                                         AS periodo_num,
+    toUInt8(p.area)                                                                        AS area,
+    sumIf(p.fexp, 1)                                                                       AS w_total,
+    sumIf(p.fexp, p.ingpc < 91.43 AND p.ingpc > 0)                                         AS w_pobre,
+    sumIf(p.fexp, p.ingpc < 51.53 AND p.ingpc > 0)                                         AS w_pobre_extremo
+FROM indicadores.enemdu_persona AS p
+GROUP BY anio, periodo_num, area;
+
+-- 5) Sin las tablas viejas
+DROP TABLE IF EXISTS indicadores_persona_nacionales_anterior;
+DROP TABLE IF EXISTS indicadores_persona_canton_anterior;
+DROP TABLE IF EXISTS indicadores_pobreza_anterior;
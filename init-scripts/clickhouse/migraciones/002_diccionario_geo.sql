@@ -0,0 +1,106 @@
+-- ──────────────────────────────────────────────────────────────
+-- Migración: nombres de provincia/cantón/parroquia resueltos al leer con
+-- el diccionario diccionario_geo, en lugar de un LEFT JOIN con
+-- diccionario_provincias en mv_indicadores_persona_canton que los dejaba
+-- fijos en indicadores_persona_canton_estado. Las sumas no cambian.
+-- Entre el DROP y el CREATE de la vista materializada (paso 3) lo que se
+-- inserte en enemdu_persona no llega a los indicadores por cantón:
+-- correr con la ingesta detenida.
+--
+--   docker exec -i clickhouse clickhouse-client -u admin --password secret_pw \
+--       -d indicadores --multiquery < init-scripts/clickhouse/migraciones/002_diccionario_geo.sql
+-- ──────────────────────────────────────────────────────────────
+
+-- 1) Diccionario (igual que create_table.sql; requiere montar
+--    config.d/fuente_diccionarios.xml, ver docker-compose.yml)
+CREATE DICTIONARY IF NOT EXISTS diccionario_geo (
+    geo_code          String,
+    NombreProvincia   String DEFAULT '',
+    NombreCanton      String DEFAULT '',
+    NombreParroquia   String DEFAULT ''
+)
+PRIMARY KEY geo_code
+SOURCE(CLICKHOUSE(
+    NAME fuente_diccionarios
+    QUERY 'SELECT concat(CodigoProvincia, CodigoCanton, CodigoParroquia) AS geo_code, any(NombreProvincia) AS NombreProvincia, any(NombreCanton) AS NombreCanton, any(NombreParroquia) AS NombreParroquia FROM indicadores.diccionario_provincias GROUP BY geo_code'
+))
+LAYOUT(COMPLEX_KEY_HASHED())
+LIFETIME(0);
+
+-- 2) La vista de lectura toma los nombres del diccionario
+CREATE OR REPLACE VIEW indicadores_persona_canton AS
+SELECT
+    geo_code,
+    dictGet('indicadores.diccionario_geo', 'NombreProvincia', tuple(geo_code))             AS NombreProvincia,
+    dictGet('indicadores.diccionario_geo', 'NombreCanton', tuple(geo_code))                AS NombreCanton,
+    dictGet('indicadores.diccionario_geo', 'NombreParroquia', tuple(geo_code))             AS NombreParroquia,
+    anio,
+    periodo_num,
+    area,
+    toFloat32(ifNull(100.0 * sum(w_pea_pet) / sum(w_pet), 0))                              AS tpg,
+    toFloat32(ifNull(100.0 * sum(w_pea) / sum(w_total), 0))                                AS tpb,
+    toFloat32(ifNull(100.0 * sum(w_desocup) / sum(w_pea), 0))                              AS td,
+    toFloat32(ifNull(100.0 * sum(w_ocup) / sum(w_pea), 0))                                 AS empleo_total,
+    toFloat32(ifNull(100.0 * sum(w_formal) / sum(w_ocup), 0))                              AS formal,
+    toFloat32(ifNull(100.0 * sum(w_informal) / sum(w_ocup), 0))                            AS informal,
+    toFloat32(ifNull(100.0 * sum(w_adecuado) / sum(w_pea), 0))                             AS adecuado,
+    toFloat32(ifNull(100.0 * sum(w_subempleo) / sum(w_pea), 0))                            AS subempleo,
+    toFloat32(ifNull(100.0 * sum(w_no_remunerado) / sum(w_pea), 0))                        AS no_remunerado,
+    toFloat32(ifNull(100.0 * sum(w_otro_no_pleno) / sum(w_pea), 0))                        AS otro_no_pleno,
+    toFloat32(ifNull(100.0 * sum(w_adecuado_h) / sum(w_pea_h)
+         - 100.0 * sum(w_adecuado_m) / sum(w_pea_m), 0))                                   AS brecha_adecuado_hm,
+    toFloat32(ifNull((sum(wi_ingreso_h) / sum(w_ingreso_h) - sum(wi_ingreso_m) / sum(w_ingreso_m))
+         / (sum(wi_ingreso_h) / sum(w_ingreso_h)) * 100.0, 0))                             AS brecha_salarial_hm,
+    toFloat32(ifNull(100.0 * sum(w_nini) / sum(w_15_24), 0))                               AS nini,
+    toFloat32(ifNull(100.0 * sum(w_desocup_18_29) / sum(w_pea_18_29), 0))                  AS desempleo_juvenil,
+    toFloat32(ifNull(100.0 * sum(w_trab_infantil) / sum(w_5_14), 0))                       AS trabajo_infantil,
+    toFloat32(ifNull(100.0 * sum(w_manufactura) / sum(w_ocup), 0))                         AS manufactura_empleo
+FROM indicadores_persona_canton_estado
+GROUP BY geo_code, anio, periodo_num, area;
+
+-- 3) La vista materializada deja de cruzar con diccionario_provincias
+DROP VIEW IF EXISTS mv_indicadores_persona_canton;
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_indicadores_persona_canton
+TO indicadores_persona_canton_estado
+AS
+SELECT
+    substring(p.ciudad, 1, 6)                                                              AS geo_code,
+    p.anio                                                                                 AS anio,
+    p.periodo_num                                                                          AS periodo_num,
+    toUInt8(p.area)                                                                        AS area,
+    sumIf(p.fexp, 1)                                                                       AS w_total,
+    sumIf(p.fexp, p.p03 >= 15)                                                             AS w_pet,
+    sumIf(p.fexp, p.p03 >= 15 AND p.condact BETWEEN 1 AND 8)                               AS w_pea_pet,
+    sumIf(p.fexp, p.condact BETWEEN 1 AND 8)                                               AS w_pea,
+    sumIf(p.fexp, p.condact BETWEEN 1 AND 6)                                               AS w_ocup,
+    sumIf(p.fexp, p.condact IN (7,8))                                                      AS w_desocup,
+    sumIf(p.fexp, p.secemp = 1)                                                            AS w_formal,
+    sumIf(p.fexp, p.secemp = 2)                                                            AS w_informal,
+    sumIf(p.fexp, p.condact = 1)                                                           AS w_adecuado,
+    sumIf(p.fexp, p.condact IN (2,3))                                                      AS w_subempleo,
+    sumIf(p.fexp, p.condact = 5)                                                           AS w_no_remunerado,
+    sumIf(p.fexp, p.condact = 4)                                                           AS w_otro_no_pleno,
+    sumIf(p.fexp, p.p02 = 1 AND p.condact = 1)                                             AS w_adecuado_h,
+    sumIf(p.fexp, p.p02 = 1 AND p.condact BETWEEN 1 AND 8)                                 AS w_pea_h,
+    sumIf(p.fexp, p.p02 = 2 AND p.condact = 1)                                             AS w_adecuado_m,
+    sumIf(p.fexp, p.p02 = 2 AND p.condact BETWEEN 1 AND 8)                                 AS w_pea_m,
+    sumIf(p.fexp * p.ingrl, p.p02 = 1 AND p.ingrl > 0)                                     AS wi_ingreso_h,
+    sumIf(p.fexp, p.p02 = 1 AND p.ingrl > 0)                                               AS w_ingreso_h,
+    sumIf(p.fexp * p.ingrl, p.p02 = 2 AND p.ingrl > 0)                                     AS wi_ingreso_m,
+    sumIf(p.fexp, p.p02 = 2 AND p.ingrl > 0)                                               AS w_ingreso_m,
+    sumIf(p.fexp, p.p03 BETWEEN 15 AND 24 AND (p.p07 = 2 OR p.p07 IS NULL))                AS w_nini,
+    sumIf(p.fexp, p.p03 BETWEEN 15 AND 24)                                                 AS w_15_24,
+    sumIf(p.fexp, p.p03 BETWEEN 18 AND 29 AND p.condact IN (7,8))                          AS w_desocup_18_29,
+    sumIf(p.fexp, p.p03 BETWEEN 18 AND 29 AND p.condact BETWEEN 1 AND 8)                   AS w_pea_18_29,
+    sumIf(p.fexp, p.p03 BETWEEN 5 AND 14 AND (p.condact BETWEEN 1 AND 6 OR p.p24 > 0))     AS w_trab_infantil,
+    sumIf(p.fexp, p.p03 BETWEEN 5 AND 14)                                                  AS w_5_14,
+    sumIf(p.fexp, p.rama1 = 3)                                                             AS w_manufactura
+FROM indicadores.enemdu_persona AS p
+GROUP BY geo_code, anio, periodo_num, area;
+
+-- 4) Los nombres guardados ya no se leen
+ALTER TABLE indicadores_persona_canton_estado
+    DROP COLUMN IF EXISTS NombreProvincia,
+    DROP COLUMN IF EXISTS NombreCanton,
+    DROP COLUMN IF EXISTS NombreParroquia;
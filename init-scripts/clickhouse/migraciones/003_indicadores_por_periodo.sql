@@ -0,0 +1,215 @@
+-- ──────────────────────────────────────────────────────────────
+-- Migración: tablas *_estado particionadas por (anio, periodo_num), para
+-- que ingest/reconstruir_indicadores.py pueda recalcular y cambiar un
+-- periodo a la vez con REPLACE PARTITION. Las sumas guardadas se copian
+-- tal cual. Correr después de 002_diccionario_geo.sql y con la ingesta
+-- detenida (lo que se inserte mientras tanto no llega a los indicadores):
+--
+--   docker exec -i clickhouse clickhouse-client -u admin --password secret_pw \
+--       -d indicadores --multiquery < init-scripts/clickhouse/migraciones/003_indicadores_por_periodo.sql
+-- ──────────────────────────────────────────────────────────────
+
+-- 1) Las vistas materializadas dejan de escribir
+DROP VIEW IF EXISTS mv_indicadores_persona_nacionales;
+DROP VIEW IF EXISTS mv_indicadores_persona_canton;
+DROP VIEW IF EXISTS mv_indicadores_pobreza;
+
+-- 2) Las tablas actuales quedan aparte hasta terminar la copia
+RENAME TABLE
+    indicadores_persona_nacionales_estado TO indicadores_persona_nacionales_estado_anterior,
+    indicadores_persona_canton_estado TO indicadores_persona_canton_estado_anterior,
+    indicadores_pobreza_estado TO indicadores_pobreza_estado_anterior;
+
+-- 3) Tablas particionadas (igual que create_table.sql) con las sumas de antes
+
+CREATE TABLE IF NOT EXISTS indicadores_persona_nacionales_estado (
+    anio             UInt16,
+    periodo_num      UInt8,
+    area             UInt8,
+    w_total          SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_pet            SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_pea_pet        SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_pea            SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_ocup           SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_desocup        SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_formal         SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_informal       SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_adecuado       SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_subempleo      SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_no_remunerado  SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_otro_no_pleno  SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_adecuado_h     SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_pea_h          SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_adecuado_m     SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_pea_m          SimpleAggregateFunction(sum, Nullable(Float64)),
+    wi_ingreso_h     SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_ingreso_h      SimpleAggregateFunction(sum, Nullable(Float64)),
+    wi_ingreso_m     SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_ingreso_m      SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_nini           SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_15_24          SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_desocup_18_29  SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_pea_18_29      SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_trab_infantil  SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_5_14           SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_manufactura    SimpleAggregateFunction(sum, Nullable(Float64))
+)
+ENGINE = AggregatingMergeTree
+PARTITION BY (anio, periodo_num)
+ORDER BY (anio, periodo_num, area);
+
+INSERT INTO indicadores_persona_nacionales_estado (anio, periodo_num, area, w_total, w_pet, w_pea_pet, w_pea, w_ocup, w_desocup, w_formal, w_informal, w_adecuado, w_subempleo, w_no_remunerado, w_otro_no_pleno, w_adecuado_h, w_pea_h, w_adecuado_m, w_pea_m, wi_ingreso_h, w_ingreso_h, wi_ingreso_m, w_ingreso_m, w_nini, w_15_24, w_desocup_18_29, w_pea_18_29, w_trab_infantil, w_5_14, w_manufactura)
+SELECT anio, periodo_num, area, w_total, w_pet, w_pea_pet, w_pea, w_ocup, w_desocup, w_formal, w_informal, w_adecuado, w_subempleo, w_no_remunerado, w_otro_no_pleno, w_adecuado_h, w_pea_h, w_adecuado_m, w_pea_m, wi_ingreso_h, w_ingreso_h, wi_ingreso_m, w_ingreso_m, w_nini, w_15_24, w_desocup_18_29, w_pea_18_29, w_trab_infantil, w_5_14, w_manufactura
+FROM indicadores_persona_nacionales_estado_anterior;
+
+CREATE TABLE IF NOT EXISTS indicadores_persona_canton_estado (
+    geo_code         String,
+    anio             UInt16,
+    periodo_num      UInt8,
+    area             UInt8,
+    w_total          SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_pet            SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_pea_pet        SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_pea            SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_ocup           SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_desocup        SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_formal         SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_informal       SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_adecuado       SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_subempleo      SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_no_remunerado  SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_otro_no_pleno  SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_adecuado_h     SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_pea_h          SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_adecuado_m     SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_pea_m          SimpleAggregateFunction(sum, Nullable(Float64)),
+    wi_ingreso_h     SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_ingreso_h      SimpleAggregateFunction(sum, Nullable(Float64)),
+    wi_ingreso_m     SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_ingreso_m      SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_nini           SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_15_24          SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_desocup_18_29  SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_pea_18_29      SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_trab_infantil  SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_5_14           SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_manufactura    SimpleAggregateFunction(sum, Nullable(Float64))
+)
+ENGINE = AggregatingMergeTree
+PARTITION BY (anio, periodo_num)
+ORDER BY (geo_code, anio, periodo_num, area);
+
+INSERT INTO indicadores_persona_canton_estado (geo_code, anio, periodo_num, area, w_total, w_pet, w_pea_pet, w_pea, w_ocup, w_desocup, w_formal, w_informal, w_adecuado, w_subempleo, w_no_remunerado, w_otro_no_pleno, w_adecuado_h, w_pea_h, w_adecuado_m, w_pea_m, wi_ingreso_h, w_ingreso_h, wi_ingreso_m, w_ingreso_m, w_nini, w_15_24, w_desocup_18_29, w_pea_18_29, w_trab_infantil, w_5_14, w_manufactura)
+SELECT geo_code, anio, periodo_num, area, w_total, w_pet, w_pea_pet, w_pea, w_ocup, w_desocup, w_formal, w_informal, w_adecuado, w_subempleo, w_no_remunerado, w_otro_no_pleno, w_adecuado_h, w_pea_h, w_adecuado_m, w_pea_m, wi_ingreso_h, w_ingreso_h, wi_ingreso_m, w_ingreso_m, w_nini, w_15_24, w_desocup_18_29, w_pea_18_29, w_trab_infantil, w_5_14, w_manufactura
+FROM indicadores_persona_canton_estado_anterior;
+
+CREATE TABLE IF NOT EXISTS indicadores_pobreza_estado (
+    anio             UInt16,
+    periodo_num      UInt8,
+    area             UInt8,
+    w_total          SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_pobre          SimpleAggregateFunction(sum, Nullable(Float64)),
+    w_pobre_extremo  SimpleAggregateFunction(sum, Nullable(Float64))
+)
+ENGINE = AggregatingMergeTree
+PARTITION BY (anio, periodo_num)
+ORDER BY (anio, periodo_num, area);
+
+INSERT INTO indicadores_pobreza_estado (anio, periodo_num, area, w_total, w_pobre, w_pobre_extremo)
+SELECT anio, periodo_num, area, w_total, w_pobre, w_pobre_extremo
+FROM indicadores_pobreza_estado_anterior;
+
+-- 4) Vistas materializadas (igual que create_table.sql)
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_indicadores_persona_nacionales
+TO indicadores_persona_nacionales_estado
+AS
+SELECT
+    p.anio                                                                                 AS anio,
+    p.periodo_num                                                                          AS periodo_num,
+    toUInt8(p.area)                                                                        AS area,
+    sumIf(p.fexp, 1)                                                                       AS w_total,
+    sumIf(p.fexp, p.p03 >= 15)                                                             AS w_pet,
+    sumIf(p.fexp, p.p03 >= 15 AND p.condact BETWEEN 1 AND 8)                               AS w_pea_pet,
+    sumIf(p.fexp, p.condact BETWEEN 1 AND 8)                                               AS w_pea,
+    sumIf(p.fexp, p.condact BETWEEN 1 AND 6)                                               AS w_ocup,
+    sumIf(p.fexp, p.condact IN (7,8))                                                      AS w_desocup,
+    sumIf(p.fexp, p.secemp = 1)                                                            AS w_formal,
+    sumIf(p.fexp, p.secemp = 2)                                                            AS w_informal,
+    sumIf(p.fexp, p.condact = 1)                                                           AS w_adecuado,
+    sumIf(p.fexp, p.condact IN (2,3))                                                      AS w_subempleo,
+    sumIf(p.fexp, p.condact = 5)                                                           AS w_no_remunerado,
+    sumIf(p.fexp, p.condact = 4)                                                           AS w_otro_no_pleno,
+    sumIf(p.fexp, p.p02 = 1 AND p.condact = 1)                                             AS w_adecuado_h,
+    sumIf(p.fexp, p.p02 = 1 AND p.condact BETWEEN 1 AND 8)                                 AS w_pea_h,
+    sumIf(p.fexp, p.p02 = 2 AND p.condact = 1)                                             AS w_adecuado_m,
+    sumIf(p.fexp, p.p02 = 2 AND p.condact BETWEEN 1 AND 8)                                 AS w_pea_m,
+    sumIf(p.fexp * p.ingrl, p.p02 = 1 AND p.ingrl > 0)                                     AS wi_ingreso_h,
+    sumIf(p.fexp, p.p02 = 1 AND p.ingrl > 0)                                               AS w_ingreso_h,
+    sumIf(p.fexp * p.ingrl, p.p02 = 2 AND p.ingrl > 0)                                     AS wi_ingreso_m,
+    sumIf(p.fexp, p.p02 = 2 AND p.ingrl > 0)                                               AS w_ingreso_m,
+    sumIf(p.fexp, p.p03 BETWEEN 15 AND 24 AND (p.p07 = 2 OR p.p07 IS NULL))                AS w_nini,
+    sumIf(p.fexp, p.p03 BETWEEN 15 AND 24)                                                 AS w_15_24,
+    sumIf(p.fexp, p.p03 BETWEEN 18 AND 29 AND p.condact IN (7,8))                          AS w_desocup_18_29,
+    sumIf(p.fexp, p.p03 BETWEEN 18 AND 29 AND p.condact BETWEEN 1 AND 8)                   AS w_pea_18_29,
+    sumIf(p.fexp, p.p03 BETWEEN 5 AND 14 AND (p.condact BETWEEN 1 AND 6 OR p.p24 > 0))     AS w_trab_infantil,
+    sumIf(p.fexp, p.p03 BETWEEN 5 AND 14)                                                  AS w_5_14,
+    sumIf(p.fexp, p.rama1 = 3)                                                             AS w_manufactura
+FROM indicadores.enemdu_persona AS p
+GROUP BY anio, periodo_num, area;
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_indicadores_persona_canton
+TO indicadores_persona_canton_estado
+AS
+SELECT
+    substring(p.ciudad, 1, 6)                                                              AS geo_code,
+    p.anio                                                                                 AS anio,
+    p.periodo_num                                                                          AS periodo_num,
+    toUInt8(p.area)                                                                        AS area,
+    sumIf(p.fexp, 1)                                                                       AS w_total,
+    sumIf(p.fexp, p.p03 >= 15)                                                             AS w_pet,
+    sumIf(p.fexp, p.p03 >= 15 AND p.condact BETWEEN 1 AND 8)                               AS w_pea_pet,
+    sumIf(p.fexp, p.condact BETWEEN 1 AND 8)                                               AS w_pea,
+    sumIf(p.fexp, p.condact BETWEEN 1 AND 6)                                               AS w_ocup,
+    sumIf(p.fexp, p.condact IN (7,8))                                                      AS w_desocup,
+    sumIf(p.fexp, p.secemp = 1)                                                            AS w_formal,
+    sumIf(p.fexp, p.secemp = 2)                                                            AS w_informal,
+    sumIf(p.fexp, p.condact = 1)                                                           AS w_adecuado,
+    sumIf(p.fexp, p.condact IN (2,3))                                                      AS w_subempleo,
+    sumIf(p.fexp, p.condact = 5)                                                           AS w_no_remunerado,
+    sumIf(p.fexp, p.condact = 4)                                                           AS w_otro_no_pleno,
+    sumIf(p.fexp, p.p02 = 1 AND p.condact = 1)                                             AS w_adecuado_h,
+    sumIf(p.fexp, p.p02 = 1 AND p.condact BETWEEN 1 AND 8)                                 AS w_pea_h,
+    sumIf(p.fexp, p.p02 = 2 AND p.condact = 1)                                             AS w_adecuado_m,
+    sumIf(p.fexp, p.p02 = 2 AND p.condact BETWEEN 1 AND 8)                                 AS w_pea_m,
+    sumIf(p.fexp * p.ingrl, p.p02 = 1 AND p.ingrl > 0)                                     AS wi_ingreso_h,
+    sumIf(p.fexp, p.p02 = 1 AND p.ingrl > 0)                                               AS w_ingreso_h,
+    sumIf(p.fexp * p.ingrl, p.p02 = 2 AND p.ingrl > 0)                                     AS wi_ingreso_m,
+    sumIf(p.fexp, p.p02 = 2 AND p.ingrl > 0)                                               AS w_ingreso_m,
+    sumIf(p.fexp, p.p03 BETWEEN 15 AND 24 AND (p.p07 = 2 OR p.p07 IS NULL))                AS w_nini,
+    sumIf(p.fexp, p.p03 BETWEEN 15 AND 24)                                                 AS w_15_24,
+    sumIf(p.fexp, p.p03 BETWEEN 18 AND 29 AND p.condact IN (7,8))                          AS w_desocup_18_29,
+    sumIf(p.fexp, p.p03 BETWEEN 18 AND 29 AND p.condact BETWEEN 1 AND 8)                   AS w_pea_18_29,
+    sumIf(p.fexp, p.p03 BETWEEN 5 AND 14 AND (p.condact BETWEEN 1 AND 6 OR p.p24 > 0))     AS w_trab_infantil,
+    sumIf(p.fexp, p.p03 BETWEEN 5 AND 14)                                                  AS w_5_14,
+    sumIf(p.fexp, p.rama1 = 3)                                                             AS w_manufactura
+FROM indicadores.enemdu_persona AS p
+GROUP BY geo_code, anio, periodo_num, area;
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_indicadores_pobreza
+TO indicadores_pobreza_estado
+AS
+SELECT
+    p.anio                                                                                 AS anio,
+    p.periodo_num                                                                          AS periodo_num,
+    toUInt8(p.area)                                                                        AS area,
+    sumIf(p.fexp, 1)                                                                       AS w_total,
+    sumIf(p.fexp, p.ingpc < 91.43 AND p.ingpc > 0)                                         AS w_pobre,
+    sumIf(p.fexp, p.ingpc < 51.53 AND p.ingpc > 0)                                         AS w_pobre_extremo
+FROM indicadores.enemdu_persona AS p
+GROUP BY anio, periodo_num, area;
+
+-- 5) Tablas viejas
+DROP TABLE indicadores_persona_nacionales_estado_anterior;
+DROP TABLE indicadores_persona_canton_estado_anterior;
+DROP TABLE indicadores_pobreza_estado_anterior;
@@ -0,0 +1,35 @@
+-- ──────────────────────────────────────────────────────────────
+-- Migración: columna grupo_edad y proyecciones por_perfil y
+-- por_territorio en enemdu_persona (igual que create_table.sql). Las
+-- inserciones nuevas ya las llenan; MATERIALIZE las construye para las
+-- partes existentes como mutaciones en segundo plano, sin detener la
+-- ingesta. Con mutations_sync = 1 el script espera a que terminen; en una
+-- base grande puede tardar (el avance se ve en system.mutations).
+--
+--   docker exec -i clickhouse clickhouse-client -u admin --password secret_pw \
+--       -d indicadores --multiquery < init-scripts/clickhouse/migraciones/004_proyecciones_persona.sql
+-- ──────────────────────────────────────────────────────────────
+SET mutations_sync = 1;
+
+-- 1) Grupo quinquenal de edad
+ALTER TABLE enemdu_persona
+    ADD COLUMN IF NOT EXISTS grupo_edad Nullable(UInt8) MATERIALIZED if(p03 BETWEEN 0 AND 125, toUInt8(intDiv(p03, 5) * 5), NULL) AFTER canton;
+ALTER TABLE enemdu_persona MATERIALIZE COLUMN grupo_edad;
+
+-- 2) Proyecciones
+-- Perfil: series nacionales o por área, por sexo, edad, instrucción y rama
+ALTER TABLE enemdu_persona ADD PROJECTION IF NOT EXISTS por_perfil (
+    SELECT anio, periodo_num, periodo, area, p02, grupo_edad, nnivins, rama1, condact,
+           sum(fexp), count()
+    GROUP BY anio, periodo_num, periodo, area, p02, grupo_edad, nnivins, rama1, condact
+);
+-- Territorio: último periodo por cantón o parroquia, totales por provincia
+ALTER TABLE enemdu_persona ADD PROJECTION IF NOT EXISTS por_territorio (
+    SELECT anio, periodo_num, periodo, area, provincia, canton, ciudad, p02, condact,
+           sum(fexp), count()
+    GROUP BY anio, periodo_num, periodo, area, provincia, canton, ciudad, p02, condact
+);
+
+-- 3) Proyecciones para las partes ya cargadas
+ALTER TABLE enemdu_persona MATERIALIZE PROJECTION por_perfil;
+ALTER TABLE enemdu_persona MATERIALIZE PROJECTION por_territorio;
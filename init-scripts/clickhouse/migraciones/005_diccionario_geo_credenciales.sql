@@ -0,0 +1,27 @@
+-- ──────────────────────────────────────────────────────────────
+-- Migración: diccionario_geo sin usuario ni clave escritos en el DDL.
+-- La fuente pasa a la colección fuente_diccionarios
+-- (config.d/fuente_diccionarios.xml), que los lee de CLICKHOUSE_USER y
+-- CLICKHOUSE_PASSWORD. Para bases creadas o migradas (002) con la versión
+-- anterior. Montar primero el XML (docker-compose.yml) y reiniciar el
+-- servicio clickhouse; no hace falta detener la ingesta.
+--
+--   docker exec -i clickhouse clickhouse-client -u admin --password secret_pw \
+--       -d indicadores --multiquery < init-scripts/clickhouse/migraciones/005_diccionario_geo_credenciales.sql
+-- ──────────────────────────────────────────────────────────────
+
+CREATE OR REPLACE DICTIONARY diccionario_geo (
+    geo_code          String,
+    NombreProvincia   String DEFAULT '',
+    NombreCanton      String DEFAULT '',
+    NombreParroquia   String DEFAULT ''
+)
+PRIMARY KEY geo_code
+SOURCE(CLICKHOUSE(
+    NAME fuente_diccionarios
+    QUERY 'SELECT concat(CodigoProvincia, CodigoCanton, CodigoParroquia) AS geo_code, any(NombreProvincia) AS NombreProvincia, any(NombreCanton) AS NombreCanton, any(NombreParroquia) AS NombreParroquia FROM indicadores.diccionario_provincias GROUP BY geo_code'
+))
+LAYOUT(COMPLEX_KEY_HASHED())
+LIFETIME(0);
+
+SYSTEM RELOAD DICTIONARY diccionario_geo;
@@ -4,13 +4,14 @@
 
 import os
 import re
-import shutil
 import zipfile
 import subprocess
 import tempfile
 import zlib
 from pathlib import Path
 
+from staging import copiar_a_staging, staged_name, ya_en_staging
+
 # ─── CONFIGURACIÓN vía ENV ───
 BASE_DIR = Path(os.getenv("ENEMDU_ROOT", "/data/raw/ANUAL"))
 UNPROCESSED_DIR = Path(os.getenv("PERSONA_UNPROC", "/data/enemdu_persona/unprocessed"))
@@ -74,13 +75,13 @@ for year_dir in sorted(BASE_DIR.iterdir()):
                 print(f"– Skip (ya en processed): {name}")
                 continue
             dst_name = f"{year}_{period.replace(' ','_')}_{name}"
-            dst_path = UNPROCESSED_DIR / dst_name
-            if dst_path.exists():
-                print(f"– Skip (ya en unprocessed): {dst_name}")
+            # Como CSV o como Parquet (STAGING_FORMAT), en cualquiera de las dos carpetas
+            if ya_en_staging(dst_name, UNPROCESSED_DIR, PROCESSED_DIR):
+                print(f"– Skip (ya en unprocessed o processed): {dst_name}")
                 continue
             if match_csv(name, year):
-                shutil.copy(candidate, dst_path)
-                print(f"✔ Copiado: {dst_name}")
+                copiar_a_staging(candidate, UNPROCESSED_DIR, dst_name, "enemdu_persona")
+                print(f"✔ Copiado: {staged_name(dst_name)}")
 
         # 2) Zips y su contenido
         for zip_file in period_dir.rglob("*.zip"):
@@ -93,11 +94,10 @@ for year_dir in sorted(BASE_DIR.iterdir()):
                     if name in processed_raw:
                         continue
                     dst_name = f"{year}_{period.replace(' ','_')}_{name}"
-                    dst_path = UNPROCESSED_DIR / dst_name
-                    if dst_path.exists():
+                    if ya_en_staging(dst_name, UNPROCESSED_DIR, PROCESSED_DIR):
                         continue
                     if match_csv(name, year):
-                        shutil.copy(extracted, dst_path)
-                        print(f"✔ Copiado desde ZIP: {dst_name}")
+                        copiar_a_staging(extracted, UNPROCESSED_DIR, dst_name, "enemdu_persona")
+                        print(f"✔ Copiado desde ZIP: {staged_name(dst_name)}")
 
 print("\n✅ limpieza_persona completada.")
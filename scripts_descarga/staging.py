@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# staging.py
+# Formato de staging entre las limpiezas y los cargadores. Con
+# STAGING_FORMAT=parquet, cada CSV de INEC se lee una sola vez y se deja
+# en unprocessed como Parquet tipado (zstd) según los tipos de
+# create_table.sql; con STAGING_FORMAT=csv (por defecto) se copia tal cual.
+
+import csv
+import os
+import re
+import shutil
+from pathlib import Path
+
+STAGING_FORMAT = os.getenv("STAGING_FORMAT", "csv").lower()
+SCHEMA_SQL = Path(os.getenv("SCHEMA_SQL", "/schema/create_table.sql"))
+PARQUET_COMPRESSION = os.getenv("PARQUET_COMPRESSION", "zstd")
+PARQUET_ROW_GROUP = int(os.getenv("PARQUET_ROW_GROUP", 100000))
+
+# Textos que pandas (y por tanto los cargadores) leen como nulo
+NA_TOKENS = ["", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan",
+             "1.#IND", "1.#QNAN", "<NA>", "N/A", "NA", "NULL", "NaN", "None",
+             "n/a", "nan", "null"]
+
+_TABLE_RX = re.compile(r"CREATE TABLE IF NOT EXISTS\s+(\w+)\s*\((.*?)\)\s*ENGINE", re.S)
+_COL_RX = re.compile(r"^\s*(\w+)\s+([A-Za-z0-9]+(?:\([A-Za-z0-9(), ]*?\))?)\s*,?\s*(?:--.*)?$")
+_DERIVADA_RX = re.compile(r"\b(?:MATERIALIZED|ALIAS)\b")
+_FLOAT_RX = r"^[+-]?(?:[0-9]+\.?[0-9]*|\.[0-9]+)(?:[eE][+-]?[0-9]+)?$"
+_INT_RX = r"^-?[0-9]+$"
+
+
+def staged_name(dst_name: str) -> str:
+    """Nombre final en unprocessed según el formato de staging."""
+    if STAGING_FORMAT == "parquet":
+        return str(Path(dst_name).with_suffix(".parquet"))
+    return dst_name
+
+
+def ya_en_staging(dst_name: str, *dirs: Path) -> bool:
+    """True si el archivo ya está en alguna carpeta, como CSV o como Parquet."""
+    stem = Path(dst_name).stem
+    return any((d / f"{stem}{suf}").exists() for d in dirs for suf in (".csv", ".parquet"))
+
+
+def leer_esquema(tabla: str, sql_path: Path = None) -> dict:
+    """Columnas → tipo ClickHouse de `tabla`, tomadas de create_table.sql."""
+    sql_path = sql_path or SCHEMA_SQL
+    sql = sql_path.read_text(encoding="utf-8")
+    for name, body in _TABLE_RX.findall(sql):
+        if name != tabla:
+            continue
+        cols = {}
+        for line in body.splitlines():
+            m = _COL_RX.match(line)
+            # Las MATERIALIZED/ALIAS las calcula ClickHouse, no van en el archivo
+            if m and not _DERIVADA_RX.search(line):
+                cols[m.group(1).lower()] = m.group(2)
+        return cols
+    raise KeyError(f"{tabla} no está en {sql_path}")
+
+
+def _tipo_base(ch_type: str) -> str:
+    m = re.match(r"^(?:(?:Nullable|LowCardinality)\()*(\w+)", ch_type)
+    return m.group(1) if m else "String"
+
+
+def tipo_arrow(ch_type: str):
+    """Tipo Arrow equivalente; Int128 (sin equivalente) se guarda como texto."""
+    import pyarrow as pa
+    base = _tipo_base(ch_type)
+    return {
+        "Int8": pa.int8(), "Int16": pa.int16(), "Int32": pa.int32(), "Int64": pa.int64(),
+        "UInt8": pa.uint8(), "UInt16": pa.uint16(), "UInt32": pa.uint32(), "UInt64": pa.uint64(),
+        "Float32": pa.float32(), "Float64": pa.float64(),
+    }.get(base, pa.string())
+
+
+def detectar_delimitador(path: Path) -> str:
+    """';' o ',' según las primeras líneas (como detect_delim en calcular_indicadores)."""
+    with path.open("rb") as f:
+        head = f.read(64 * 1024).decode("latin1")
+    sample = "\n".join(head.splitlines()[:3])
+    try:
+        return csv.Sniffer().sniff(sample, delimiters=";,").delimiter
+    except csv.Error:
+        return ";"
+
+
+def _convertir(col, ch_type):
+    """
+    Columna de texto → tipo destino; lo inválido queda nulo, como en los
+    cargadores. Una columna entera con algún valor fuera del rango de su tipo
+    queda como texto: el cargador rechaza esas filas (a errors/), igual que
+    desde el CSV.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    target = tipo_arrow(ch_type)
+    if pa.types.is_floating(target):
+        txt = pc.replace_substring(pc.replace_substring(col, " ", ""), ",", ".")
+        valid = pc.match_substring_regex(txt, _FLOAT_RX)
+        return pc.cast(pc.if_else(valid, txt, None), pa.float64()).cast(target)
+    if pa.types.is_integer(target) or _tipo_base(ch_type) in ("Int128", "UInt128"):
+        txt = pc.utf8_trim_whitespace(col)
+        valid = pc.match_substring_regex(txt, _INT_RX)
+        txt = pc.if_else(valid, txt, None)
+        if not pa.types.is_integer(target):
+            return txt  # Int128: dígitos validados, como texto
+        try:
+            # El cast de texto a entero falla si algún valor no cabe en `target`
+            return pc.cast(txt, target)
+        except pa.ArrowInvalid:
+            return txt
+    # Texto: sin recortar; ciudad y los espacios los resuelven los cargadores
+    return col
+
+
+def csv_a_parquet(src: Path, dst: Path, tabla: str):
+    """
+    Lee `src` una vez (todo como texto) y escribe `dst` como Parquet tipado.
+    Los nombres de columna quedan en minúsculas; las columnas que no están
+    en la tabla se conservan como texto (calcular_indicadores usa alias).
+    """
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+    import pyarrow.parquet as pq
+
+    delim = detectar_delimitador(src)
+    for encoding in ("utf-8", "latin1"):
+        try:
+            with src.open("r", encoding=encoding, newline="") as f:
+                header = [h.lstrip("\ufeff") for h in next(csv.reader(f, delimiter=delim))]
+            # Nombres fijados a mano: todo se lee como texto, sin inferencia
+            table = pacsv.read_csv(
+                src,
+                read_options=pacsv.ReadOptions(encoding=encoding, column_names=header,
+                                               skip_rows=1, block_size=16 << 20),
+                parse_options=pacsv.ParseOptions(delimiter=delim),
+                convert_options=pacsv.ConvertOptions(
+                    column_types={h: pa.string() for h in header},
+                    null_values=NA_TOKENS, strings_can_be_null=True,
+                ),
+            )
+            break
+        except (UnicodeDecodeError, pa.ArrowInvalid):
+            if encoding == "latin1":
+                raise
+
+    esquema = leer_esquema(tabla)
+    names, arrays = [], []
+    for name, col in zip(table.column_names, table.columns):
+        low = name.strip().lower()
+        if low in names:
+            continue  # columna repetida: gana la primera, como pick()
+        names.append(low)
+        arrays.append(_convertir(col, esquema[low]) if low in esquema else col)
+    out = pa.table(arrays, names=names)
+
+    # Escritura atómica: el cargador nunca ve un Parquet a medias
+    tmp = dst.with_name(f".{dst.name}.part")
+    pq.write_table(out, tmp, compression=PARQUET_COMPRESSION, row_group_size=PARQUET_ROW_GROUP)
+    os.replace(tmp, dst)
+    return out.num_rows
+
+
+def copiar_a_staging(src: Path, dst_dir: Path, dst_name: str, tabla: str) -> Path:
+    """Copia `src` a `dst_dir` como CSV o lo convierte a Parquet según STAGING_FORMAT."""
+    dst = dst_dir / staged_name(dst_name)
+    if STAGING_FORMAT == "parquet":
+        csv_a_parquet(src, dst, tabla)
+    else:
+        shutil.copy(src, dst)
+    return dst